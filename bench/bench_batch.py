@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Benchmark loading many XML files one by one against CustomXMLParser.loadFiles.
+"""
+
+from __future__ import print_function
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+
+def writeFiles(tmpdir, count, rows):
+    """ Write test files
+
+    @param tmpdir Directory to write to
+    @param count Number of files
+    @param rows Number of rows in every file
+    @returns List of file names
+    """
+    data = "<root>%s</root>" % ("<row a='1'><b>x</b><c d='2' /></row>" * rows)
+    names = []
+    for i in range(count):
+        name = os.path.join(tmpdir, "file%d.xml" % (i))
+        with open(name, "w") as f:
+            f.write(data)
+        names.append(name)
+    return names
+
+
+def main():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        names = writeFiles(tmpdir, 200, 2000)
+
+        start = time.time()
+        for name in names:
+            xmltreenode.CustomXMLParser().load(name)
+        serial_time = time.time() - start
+
+        print ("%10s %10s %12s" % ("processes", "files/s", "speedup"))
+        print ("%10s %10.1f %12.2f" % ("load", len(names) / serial_time, 1.0))
+        for processes in (1, 2, 4, multiprocessing.cpu_count()):
+            start = time.time()
+            for path, root, error in xmltreenode.CustomXMLParser().loadFiles(names, processes=processes):
+                pass
+            batch_time = time.time() - start
+            print ("%10d %10.1f %12.2f" % (processes, len(names) / batch_time, serial_time / batch_time))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Benchmark loading the same file repeatedly with and without document cache.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import doccache
+import xmltreenode
+from generators import mixed
+
+LOADS = 20
+
+
+def main():
+    print ("%8s %14s %14s %14s" % ("elements", "uncached ms", "cached ms", "miss ms"))
+    for count in (1000, 10000, 50000):
+        fd, name = tempfile.mkstemp(suffix='.xml')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(mixed(count))
+
+            start = time.time()
+            for i in range(LOADS):
+                xmltreenode.CustomXMLParser().load(name).getRoot().getChildren()[0].addAttrib('seen', '1')
+            uncached = (time.time() - start) / LOADS
+
+            # Cache miss parses the document and stores it, it should cost about the same as uncached load
+            cache = doccache.DocumentCache()
+            start = time.time()
+            for i in range(LOADS):
+                cache.clear()
+                xmltreenode.CustomXMLParser().load(name, cache=cache)
+            first = (time.time() - start) / LOADS
+
+            # Every load gets its own copy, modifying it copies only the touched path
+            start = time.time()
+            for i in range(LOADS):
+                xmltreenode.CustomXMLParser().load(name, cache=cache).getRoot().getChildren()[0].addAttrib('seen', '1')
+            cached = (time.time() - start) / LOADS
+        finally:
+            os.remove(name)
+
+        print ("%8d %14.2f %14.2f %14.2f" % (count, uncached * 1e3, cached * 1e3, first * 1e3))
+
+
+if __name__ == '__main__':
+    main()
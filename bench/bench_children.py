@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Benchmark adding and removing children of a wide XMLTreeNode.
+Children are removed both in order and in random order, so most of the
+removed children are in the middle. Time per child should stay flat
+while the number of children grows.
+"""
+
+from __future__ import print_function
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+
+def buildWide(count):
+    """ Build node with given number of children
+
+    @param count Number of children
+    @returns Tuple of root node and list of children
+    """
+    root = xmltreenode.XMLTreeNode("root")
+    children = [xmltreenode.XMLTreeNode("row") for i in range(count)]
+    for child in children:
+        root.addChild(child)
+    return root, children
+
+
+def benchRemove(count, shuffle):
+    """ Time removing all children of a wide node one by one
+
+    @param count Number of children
+    @param shuffle True to remove in random order, False in document order
+    @returns Time in seconds
+    """
+    root, children = buildWide(count)
+    if shuffle:
+        random.Random(count).shuffle(children)
+    start = time.time()
+    for child in children:
+        root.removeChild(child)
+    return time.time() - start
+
+
+def benchParse(count):
+    """ Time parsing of flat document with given number of rows
+
+    @param count Number of rows
+    @returns Time in seconds
+    """
+    data = "<root>%s</root>" % ("<row a='1'>x</row>" * count)
+    start = time.time()
+    xmltreenode.CustomXMLParser().load(data, sourceIsFile=False)
+    return time.time() - start
+
+
+def main():
+    print ("%10s %12s %12s %12s %12s" % (
+        "children", "add us/node", "del us/node", "rnd us/node", "parse us/row"))
+    for count in (10000, 20000, 40000, 80000, 160000):
+        start = time.time()
+        buildWide(count)
+        add_time = time.time() - start
+
+        del_time = benchRemove(count, False)
+        rnd_time = benchRemove(count, True)
+        parse_time = benchParse(count)
+
+        print ("%10d %12.3f %12.3f %12.3f %12.3f" % (
+            count,
+            add_time * 1e6 / count,
+            del_time * 1e6 / count,
+            rnd_time * 1e6 / count,
+            parse_time * 1e6 / count))
+
+
+if __name__ == '__main__':
+    main()
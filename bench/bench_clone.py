@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Benchmark producing documents from a template with deepcopy against copy-on-write clone.
+Also measures looking up a field by name from the copy before changing it.
+"""
+
+from __future__ import print_function
+import gc
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+import generators
+
+
+def produce(template, copy, count, serialize):
+    """ Copy template and change few fields in every copy
+
+    @param template Template XMLTreeNode
+    @param copy Function copying the template
+    @param count Number of documents
+    @param serialize If True, every document is serialized too
+    @returns Time in seconds
+    """
+    start = time.time()
+    for i in range(count):
+        doc = copy(template)
+        doc.find("header/id").setValue("%d" % (i))
+        doc.find("header/user").addAttrib("name", "user%d" % (i))
+        if serialize:
+            doc.toSimpleString()
+    return time.time() - start
+
+
+def lookupAndEdit(template, copy, count):
+    """ Copy template, look up nodes by name and change the last one
+
+    @param template Template XMLTreeNode
+    @param copy Function copying the template
+    @param count Number of documents
+    @returns Time in seconds
+    """
+    # Garbage left by the previous measurement would be collected during this one
+    gc.collect()
+    start = time.time()
+    for i in range(count):
+        doc = copy(template)
+        doc.getSubTreeNodesByName("item")[-1].setValue("%d" % (i))
+        doc.getTreeNodeByName("item").addAttrib("name", "item%d" % (i))
+    return time.time() - start
+
+
+def main():
+    count = 1000
+    print ("%8s %12s %12s %18s %18s" % ("rows", "deepcopy/s", "clone/s", "deepcopy+write/s", "clone+write/s"))
+    for rows in (10, 100, 1000):
+        data = "<doc><header><id>0</id><user /></header><body>%s</body></doc>" % (
+            "<row a='1'><b>x</b><c d='2' /></row>" * rows)
+        template = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+
+        deep_time = produce(template, lambda node: node.deepcopy(), count, False)
+        clone_time = produce(template, lambda node: node.clone(), count, False)
+        deep_write_time = produce(template, lambda node: node.deepcopy(), count, True)
+        clone_write_time = produce(template, lambda node: node.clone(), count, True)
+        print ("%8d %12.1f %12.1f %18.1f %18.1f" % (
+            rows, count / deep_time, count / clone_time, count / deep_write_time, count / clone_write_time))
+
+    count = 10
+    print ("")
+    print ("%8s %18s %18s" % ("nodes", "deepcopy+lookup/s", "clone+lookup/s"))
+    for nodes in (1000, 20000):
+        template = xmltreenode.CustomXMLParser().load(generators.mixed(nodes), sourceIsFile=False).getRoot()
+        # First clone takes the snapshot of the template, later ones share it
+        template.clone()
+        deep_time = lookupAndEdit(template, lambda node: node.deepcopy(), count)
+        clone_time = lookupAndEdit(template, lambda node: node.clone(), count)
+        print ("%8d %18.1f %18.1f" % (nodes, count / deep_time, count / clone_time))
+
+
+if __name__ == '__main__':
+    main()
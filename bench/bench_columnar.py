@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""Benchmark memory and searching of XMLTreeNode trees against columnar documents.
+Memory includes the strings, every distinct string object is counted once.
+"""
+
+from __future__ import print_function
+import gc
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+from generators import GENERATORS
+
+
+def sizeOf(obj, seen):
+    """ Size of object if not seen before
+
+    @param obj Any object
+    @param seen Set of ids of already counted objects
+    @returns Size in bytes
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    return sys.getsizeof(obj)
+
+
+def treeBytes(root):
+    """ Count memory used by tree
+
+    @param root Root XMLTreeNode
+    @returns Total bytes
+    """
+    seen = set()
+    total = 0
+    for node in root.iter():
+        total += sizeOf(node, seen) + sizeOf(node._attrib, seen) + sizeOf(node._children, seen)
+        for value in (node.tag, node.text, node.tail):
+            total += sizeOf(value, seen)
+        for key, value in node._attrib.items():
+            total += sizeOf(key, seen) + sizeOf(value, seen)
+    return total
+
+
+def documentBytes(doc):
+    """ Count memory used by columnar document
+
+    @param doc ColumnarDocument
+    @returns Total bytes
+    """
+    seen = set()
+    return doc.memoryUsage() + sum(sizeOf(value, seen) for value in doc._strings)
+
+
+def searchTime(root):
+    start = time.time()
+    for i in range(5):
+        root.getSubTreeNodesByName('item')
+    return (time.time() - start) / 5
+
+
+def main():
+    print ("%12s %8s %10s %12s %8s %10s %12s" % (
+        "generator", "nodes", "tree KB", "columnar KB", "ratio", "tree ms", "columnar ms"))
+    for name in sorted(GENERATORS):
+        data = GENERATORS[name](50000)
+        root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        doc = root.freeze()
+        tree = treeBytes(root)
+        frozen = documentBytes(doc)
+        treeSearch = searchTime(root)
+        # Garbage collection would scan the tree, it's not kept with the columnar document
+        del root
+        gc.collect()
+        print ("%12s %8d %10.0f %12.0f %7.1fx %10.1f %12.1f" % (
+            name, len(doc), tree / 1024.0, frozen / 1024.0, float(tree) / frozen,
+            treeSearch * 1e3, searchTime(doc.getRoot()) * 1e3))
+
+
+if __name__ == '__main__':
+    main()
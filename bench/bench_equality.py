@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Benchmark comparing trees with toRecursiveSortString against structural digests.
+"""
+
+from __future__ import print_function
+import gc
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+# Comparisons are repeated on fresh trees, the fastest run is reported
+RUNS = 5
+
+
+def uncached(data, compare):
+    """ Time comparison of two trees which have not been compared before
+
+    @param data XML string of both trees
+    @param compare Function comparing the roots, returning True if they are equal
+    @returns Fastest time in seconds
+    """
+    times = []
+    for i in range(RUNS):
+        first = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        second = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        # Garbage left by the previous run would be collected during this one
+        gc.collect()
+        start = time.time()
+        assert compare(first, second)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    print ("%8s %14s %14s %14s %14s" % ("rows", "sortstring ms", "digest ms", "cached ms", "1 change ms"))
+    for count in (1000, 10000, 50000):
+        data = "<root>%s</root>" % ("<row id='%d' kind='a'><name>item</name><value>1</value></row>" * count)
+        data = data % tuple(range(count))
+        sort_time = uncached(data, lambda a, b: a.toRecursiveSortString() == b.toRecursiveSortString())
+        digest_time = uncached(data, lambda a, b: a.isEqual(b, ordered=False))
+
+        first = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        second = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        first.isEqual(second, ordered=False)
+
+        start = time.time()
+        assert first.isEqual(second, ordered=False)
+        cached_time = time.time() - start
+
+        # Only the path from the modified node to the root is hashed again
+        start = time.time()
+        second.getChildren()[count // 2].addAttrib("kind", "b")
+        assert not first.isEqual(second, ordered=False)
+        change_time = time.time() - start
+
+        print ("%8d %14.1f %14.1f %14.3f %14.3f" % (
+            count, sort_time * 1e3, digest_time * 1e3, cached_time * 1e3, change_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""Benchmark extracting records from a loaded tree against extracting them straight from parser events.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import extract
+import xmltreenode
+from bench_filter import catalog
+
+FIELDS = [('id', '@id'), ('name', 'name'), ('price', 'price'), ('currency', 'price/@currency')]
+REPEAT = 3
+
+
+def fromTree(data):
+    """ Load the whole tree and read the fields from it
+
+    @param data XML document as string
+    @returns List of records as tuples
+    """
+    root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+    rows = []
+    for product in root.findall('product'):
+        price = product.find('price')
+        rows.append((product.getAttribSafe('id'), product.find('name').getValue(),
+                     price.getValue(), price.getAttribSafe('currency')))
+    return rows
+
+
+def best(func, data):
+    times = []
+    for i in range(REPEAT):
+        start = time.time()
+        rows = func(data)
+        times.append(time.time() - start)
+    return min(times), rows
+
+
+def main():
+    extractor = extract.RecordExtractor('product', FIELDS)
+    print ("%8s %10s %12s %10s" % ("products", "tree ms", "extract ms", "speedup"))
+    for count in (2000, 10000):
+        data = catalog(count)
+        tree, expected = best(fromTree, data)
+        direct, rows = best(lambda data: extractor.rows(data, sourceIsFile=False), data)
+        assert rows == expected
+        print ("%8d %10.1f %12.1f %9.2fx" % (count, tree * 1e3, direct * 1e3, tree / direct))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""Benchmark loading whole documents against pruning them while parsing.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+REVIEW = "<review stars='%d'><author>user%d</author><text>Good product, would buy again.</text></review>"
+PRODUCT = "<product id='%d'><name>product %d</name><price currency='EUR'>%d.95</price><reviews>%s</reviews></product>"
+
+FILTERS = [
+    ('whole document', None, None),
+    ('exclude reviews', None, ['reviews']),
+    ('include price', ['product/price'], None),
+]
+
+
+def catalog(count):
+    """ Catalog of products with reviews, most of the elements are in reviews
+
+    @param count Number of products
+    @returns XML document as string
+    """
+    reviews = "".join(REVIEW % (i % 5, i) for i in range(5))
+    return "<catalog>%s</catalog>" % ("".join(PRODUCT % (i, i, i % 100, reviews) for i in range(count)))
+
+
+def main():
+    print ("%8s %18s %10s %10s" % ("products", "filter", "ms", "nodes"))
+    for count in (2000, 10000):
+        data = catalog(count)
+        for name, include, exclude in FILTERS:
+            times = []
+            for i in range(3):
+                start = time.time()
+                root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False, include=include, exclude=exclude).getRoot()
+                times.append(time.time() - start)
+            nodes = sum(1 for node in root.iter())
+            print ("%8d %18s %10.1f %10d" % (count, name, min(times) * 1e3, nodes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Benchmark lookups interleaved with modifications of XMLTreeNode tree,
+with and without index. Index should stay faster even when the tree is modified
+between the lookups.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+import generators
+
+
+def interleave(root, rounds, lookup):
+    """ Add child to the last leaf and look up nodes after every addition
+
+    @param root Root XMLTreeNode
+    @param rounds Number of modifications
+    @param lookup Function doing lookup from the leaf and the root
+    @returns Time in seconds
+    """
+    leaf = root.getChildren()[-1].getChildren()[-1]
+    start = time.time()
+    for i in range(rounds):
+        leaf.addChild(xmltreenode.XMLTreeNode("item", id="%d" % (i)))
+        lookup(leaf, root)
+    return time.time() - start
+
+
+def main():
+    rounds = 50
+    print ("%8s %14s %14s %14s %14s" % ("nodes", "subtree", "subtree+idx", "root", "root+idx"))
+    for count in (1000, 10000, 40000):
+        data = generators.mixed(count)
+        times = []
+        for where in ("subtree", "root"):
+            if where == "subtree":
+                def lookup(leaf, root):
+                    leaf.getSubTreeNodesByName('item')
+                    leaf.getNodesByAttrib('id', '1')
+            else:
+                def lookup(leaf, root):
+                    root.getSubTreeNodesByName('item')
+                    root.getNodesByAttrib('id', '1')
+            for indexed in (False, True):
+                root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+                if indexed:
+                    root.enableIndex(attributes=["id"])
+                times.append(interleave(root, rounds, lookup))
+        print ("%8d %14.4f %14.4f %14.4f %14.4f" % tuple([count] + times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""Benchmark memory used by strings of trees loaded with and without shared intern table.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+
+def stringBytes(roots):
+    """ Count memory used by distinct tag, attribute key and value string objects
+
+    @param roots List of root nodes
+    @returns Tuple of total bytes and number of distinct objects
+    """
+    seen = set()
+    total = 0
+    for root in roots:
+        for node in root.iter():
+            strings = [node.getData()]
+            if node.attrib:
+                strings.extend(node.attrib.keys())
+                strings.extend(node.attrib.values())
+            for value in strings:
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+    return (total, len(seen))
+
+
+def loadAll(data, count, table, values):
+    """ Load same document several times, like a batch of similar files
+
+    @param data Document
+    @param count Number of times to load
+    @param table Intern table, or None
+    @param values Attributes whose values to intern
+    @returns List of root nodes
+    """
+    roots = []
+    for i in range(count):
+        parser = xmltreenode.CustomXMLParser(internTable=table, internValues=values)
+        roots.append(parser.load(data, sourceIsFile=False).getRoot())
+    return roots
+
+
+def main():
+    row = "<record status='active' category='category-%d'><field_name type='string'>x</field_name></record>"
+    data = "<records>%s</records>" % ("".join(row % (i % 5) for i in range(2000)))
+    count = 20
+
+    print ("%24s %12s %12s %12s" % ("mode", "KiB", "objects", "load ms"))
+    for name, table, values in (("no interning", None, ()),
+                                ("shared names", {}, ()),
+                                ("shared names+values", {}, ('status', 'category', 'type'))):
+        start = time.time()
+        roots = loadAll(data, count, table, values)
+        elapsed = time.time() - start
+        total, objects = stringBytes(roots)
+        print ("%24s %12.1f %12d %12.1f" % (name, total / 1024.0, objects, elapsed * 1e3))
+
+
+if __name__ == '__main__':
+    main()
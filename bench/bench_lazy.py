@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Benchmark lazy loading against full parsing, when only few sections are accessed.
+"""
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+
+def main():
+    section = "<section id='%d'>" + "<row a='1'><b>x</b><c d='2' /></row>" * 200 + "</section>"
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print ("%10s %12s %12s %12s" % ("sections", "load ms", "lazy ms", "access ms"))
+        for count in (100, 500, 2000):
+            name = os.path.join(tmpdir, "test.xml")
+            with open(name, "w") as f:
+                f.write("<root>%s</root>" % ("".join(section % i for i in range(count))))
+
+            start = time.time()
+            xmltreenode.CustomXMLParser().load(name)
+            load_time = time.time() - start
+
+            start = time.time()
+            root = xmltreenode.CustomXMLParser().loadLazy(name).getRoot()
+            lazy_time = time.time() - start
+
+            # Touch few sections, like typical sparse access does
+            start = time.time()
+            sections = root.getChildren()
+            for pos in (0, count // 2, count - 1):
+                sections[pos].getChildren()
+            access_time = time.time() - start
+
+            print ("%10d %12.1f %12.1f %12.1f" % (count, load_time * 1e3, lazy_time * 1e3, access_time * 1e3))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Benchmark memory used per XMLTreeNode.
+Compares current slotted nodes against the former __dict__ based layout.
+Shared objects, like the empty attribute and children placeholders, are counted once.
+Strings are not counted, they're the same for both layouts.
+"""
+
+from __future__ import print_function
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+
+
+class LegacyXMLTreeNode(object):
+    """ Node with the former per instance __dict__ layout
+    """
+    def __init__(self, tag=None, attrib={}):
+        self.tag = tag
+        self.attrib = attrib.copy()
+        self._children = []
+        self.text = ''
+        self.tail = ''
+        self.__parent = None
+        self.__nodeType = None
+
+    def addChild(self, child):
+        self._children.append(child)
+        child.__parent = self
+
+
+def sizeOf(obj, seen):
+    """ Size of object if not seen before
+
+    @param obj Any object
+    @param seen Set of ids of already counted objects
+    @returns Size in bytes
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    return sys.getsizeof(obj)
+
+
+def nodeBytes(nodes):
+    """ Count memory used by nodes, excluding strings
+
+    @param nodes List of nodes
+    @returns Total bytes
+    """
+    seen = set()
+    total = 0
+    for node in nodes:
+        total += sizeOf(node, seen)
+        if isinstance(node, LegacyXMLTreeNode):
+            total += sizeOf(node.__dict__, seen)
+            total += sizeOf(node.attrib, seen)
+        else:
+            total += sizeOf(node._attrib, seen)
+        total += sizeOf(node._children, seen)
+    return total
+
+
+def buildTree(cls, rows, fields):
+    """ Build tree similar to a flat table export
+
+    @param cls Node class
+    @param rows Number of rows
+    @param fields Number of fields per row
+    @returns List of all nodes
+    """
+    root = cls("table")
+    nodes = [root]
+    for i in range(rows):
+        row = cls("row", {"id": "%d" % i})
+        root.addChild(row)
+        nodes.append(row)
+        for j in range(fields):
+            field = cls("field")
+            row.addChild(field)
+            nodes.append(field)
+    return nodes
+
+
+def main():
+    rows = 10000
+    fields = 5
+    print ("%20s %12s" % ("layout", "bytes/node"))
+    for name, cls in (("legacy __dict__", LegacyXMLTreeNode), ("XMLTreeNode", xmltreenode.XMLTreeNode)):
+        nodes = buildTree(cls, rows, fields)
+        print ("%20s %12.1f" % (name, float(nodeBytes(nodes)) / len(nodes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Benchmark loading a tree from binary snapshot against parsing XML and pickle.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+if sys.version < '3':
+    import cPickle as pickle
+else:
+    import pickle
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+import snapshot
+
+
+def timeIt(func, repeat=3):
+    """ Best time of calling function
+
+    @param func Function to call
+    @param repeat Number of calls
+    @returns Time in seconds
+    """
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    print ("%8s %10s %10s %10s %12s %12s %12s %12s" % (
+        "rows", "xml KiB", "snap KiB", "pickle KiB", "parse ms", "snapshot ms", "no gc ms", "pickle ms"))
+    for count in (1000, 10000, 50000):
+        data = "<root>%s</root>" % ("<row id='%d' kind='a'><name>item</name><!-- note --><value>1</value></row>" * count)
+        data = data % tuple(range(count))
+        root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+
+        snap = snapshot.dumps(root)
+        pickled = pickle.dumps(root, pickle.HIGHEST_PROTOCOL)
+        assert snapshot.loads(snap).toSimpleString() == root.toSimpleString()
+
+        parse_time = timeIt(lambda: xmltreenode.CustomXMLParser().load(data, sourceIsFile=False))
+        snap_time = timeIt(lambda: snapshot.loads(snap))
+        nogc_time = timeIt(lambda: snapshot.loads(snap, disableGc=True))
+        pickle_time = timeIt(lambda: pickle.loads(pickled))
+
+        print ("%8d %10d %10d %10d %12.1f %12.1f %12.1f %12.1f" % (
+            count, len(data) / 1024, len(snap) / 1024, len(pickled) / 1024,
+            parse_time * 1e3, snap_time * 1e3, nogc_time * 1e3, pickle_time * 1e3))
+
+
+if __name__ == '__main__':
+    main()
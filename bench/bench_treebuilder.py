@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""Benchmark loading documents from parser events against building them with TreeBuilder.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import bulkbuild
+import xmltreenode
+from generators import GENERATORS
+
+REPEAT = 3
+
+
+def best(data, useTreeBuilder):
+    times = []
+    for i in range(REPEAT):
+        start = time.time()
+        xmltreenode.CustomXMLParser().load(data, sourceIsFile=False, useTreeBuilder=useTreeBuilder)
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    print ("%12s %8s %12s %14s %10s %8s" % ("generator", "size", "events ms", "treebuilder ms", "MB/s", "speedup"))
+    for name in sorted(GENERATORS):
+        for size in (10000, 50000):
+            data = GENERATORS[name](size)
+            events = best(data, False)
+            built = best(data, True)
+            # Documents which can't be converted exactly are parsed from events anyway
+            note = "" if bulkbuild.canBuild(data) else " (events used)"
+            print ("%12s %8d %12.1f %14.1f %10.1f %7.2fx%s" % (
+                name, size, events * 1e3, built * 1e3, len(data) / built / 1e6, events / built, note))
+
+
+if __name__ == '__main__':
+    main()
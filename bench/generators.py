@@ -0,0 +1,81 @@
+"""Synthetic XML documents for benchmarks.
+
+Every generator returns a document with the given number of elements below
+the root element. All those elements have tag item, so searches find all of them.
+"""
+
+import random
+
+
+def wide(count):
+    """ Root with lots of small children
+
+    @param count Number of elements
+    @returns XML document as string
+    """
+    return "<root>%s</root>" % ("".join("<item id='%d'>value %d</item>" % (i, i) for i in range(count)))
+
+
+def deep(count):
+    """ Elements nested in each other
+
+    @param count Number of elements, depth of the document
+    @returns XML document as string
+    """
+    return "<root>%s%s</root>" % ("".join("<item depth='%d'>" % (i) for i in range(count)), "</item>" * count)
+
+
+def attributes(count):
+    """ Records with many attributes, some having few distinct values
+
+    @param count Number of elements
+    @returns XML document as string
+    """
+    rnd = random.Random(count)
+    parts = []
+    for i in range(count):
+        parts.append("<item id='%d' kind='%s' status='%s' x='%d' y='%d' z='%d' name='name%d' flag='%s' />" % (
+            i, rnd.choice(("a", "b", "c")), rnd.choice(("new", "done")), rnd.randint(0, 1000),
+            rnd.randint(0, 1000), rnd.randint(0, 1000), i, rnd.choice(("true", "false"))))
+    return "<root>%s</root>" % ("".join(parts))
+
+
+def text(count):
+    """ Records with long text content including entities
+
+    @param count Number of elements
+    @returns XML document as string
+    """
+    body = "Lorem ipsum dolor sit amet &amp; consectetur &lt;adipiscing&gt; elit. " * 4
+    return "<root>%s</root>" % ("".join("<item>%d %s</item>" % (i, body) for i in range(count)))
+
+
+def comments(count):
+    """ Records interleaved with comments
+
+    @param count Number of elements
+    @returns XML document as string
+    """
+    return "<root>%s</root>" % ("".join("<!-- record %d --><item>%d</item>" % (i, i) for i in range(count)))
+
+
+def mixed(count):
+    """ Table like document with rows of fields, a typical export
+
+    @param count Number of elements
+    @returns XML document as string
+    """
+    rows = max(1, count // 4)
+    row = "<item id='%d'><item>name</item><item type='int'>%d</item><item /></item>"
+    return "<root>%s</root>" % ("".join(row % (i, i) for i in range(rows)))
+
+
+# Generators by name
+GENERATORS = {
+    'wide': wide,
+    'deep': deep,
+    'attributes': attributes,
+    'text': text,
+    'comments': comments,
+    'mixed': mixed,
+}
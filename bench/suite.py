@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+"""Benchmark suite of parser and tree operations.
+
+Runs every operation on synthetic documents of every size, see generators,
+and reports throughput, peak memory and time. Every case runs in its own
+process so cases do not affect each other. Results can be written as JSON
+and compared to results of an earlier run, for example from another commit:
+
+    python bench/suite.py --output new.json --compare old.json
+"""
+
+from __future__ import print_function
+import argparse
+import gc
+import json
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"))
+sys.path.append(os.path.dirname(__file__))
+
+import xmltreenode
+from generators import GENERATORS
+
+# Version of the result format
+FORMAT_VERSION = 1
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+
+
+def _load(data, root):
+    xmltreenode.CustomXMLParser().load(data, sourceIsFile=False)
+
+
+def _loadTreeBuilder(data, root):
+    xmltreenode.CustomXMLParser().load(data, sourceIsFile=False, useTreeBuilder=True)
+
+
+def _rebuild(data, root):
+    """ Build copy of the tree with addChild and appendValue
+    """
+    stack = [(root, None)]
+    while stack:
+        node, parent = stack.pop()
+        copied = xmltreenode.XMLTreeNode(node.getData(), node.getAttributes())
+        if node.text:
+            copied.appendValue(node.text)
+        if parent is not None:
+            parent.addChild(copied)
+        for child in reversed(node.getChildren()):
+            stack.append((child, copied))
+
+
+# Operations by name, called with the document and its parsed root
+OPERATIONS = {
+    'load': _load,
+    'load_treebuilder': _loadTreeBuilder,
+    'rebuild': _rebuild,
+    'iter': lambda data, root: sum(1 for node in root.iter()),
+    'iter_tag': lambda data, root: sum(1 for node in root.iter('item')),
+    'getSubTreeNodesByName': lambda data, root: root.getSubTreeNodesByName('item'),
+    'findall_path': lambda data, root: root.findall('.//item'),
+    'toSimpleString': lambda data, root: root.toSimpleString(),
+    'toString': lambda data, root: root.toString(),
+    'deepcopy': lambda data, root: root.deepcopy(),
+    'toRecursiveSortString': lambda data, root: root.toRecursiveSortString(),
+}
+
+
+def maxRss():
+    """ Peak resident memory of this process
+
+    @returns Peak memory in KiB, or None if not known
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return rss
+
+
+def runCase(generator, size, operation, repeat):
+    """ Run one benchmark case
+
+    @param generator Name of document generator
+    @param size Number of elements in document
+    @param operation Name of operation
+    @param repeat Number of timed runs
+    @returns Dictionary of results
+    """
+    data = GENERATORS[generator](size)
+    root = None
+    if not operation.startswith('load'):
+        root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+    func = OPERATIONS[operation]
+
+    gc.collect()
+    before = maxRss()
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func(data, root)
+        times.append(time.time() - start)
+    after = maxRss()
+
+    best = min(times)
+    return {
+        'generator': generator,
+        'size': size,
+        'operation': operation,
+        'bytes': len(data),
+        'seconds': best,
+        'mean_seconds': sum(times) / len(times),
+        'elements_per_second': size / best if best > 0 else None,
+        'mb_per_second': len(data) / best / 1e6 if best > 0 else None,
+        'peak_kib': after - before if before is not None else None,
+    }
+
+
+def _caseWorker(args):
+    return runCase(*args)
+
+
+def gitCommit():
+    """ Commit of the working tree, if run from git checkout
+
+    @returns Commit id or None
+    """
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                      stderr=open(os.devnull, 'w'))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.decode('ascii').strip()
+
+
+def runSuite(generators, sizes, operations, repeat, report=None):
+    """ Run all combinations of generators, sizes and operations
+
+    @param generators Names of generators
+    @param sizes Document sizes
+    @param operations Names of operations
+    @param repeat Number of timed runs per case
+    @param report Function called with result of every case when it's done
+    @returns Dictionary of metadata and results
+    """
+    results = []
+    for generator in generators:
+        for size in sizes:
+            for operation in operations:
+                # Fresh process per case, so peak memory is not hidden by earlier cases
+                pool = multiprocessing.Pool(1)
+                try:
+                    result = pool.apply(_caseWorker, ((generator, size, operation, repeat), ))
+                finally:
+                    pool.terminate()
+                    pool.join()
+                results.append(result)
+                if report is not None:
+                    report(result)
+
+    return {
+        'format': FORMAT_VERSION,
+        'scaling': scaling(results),
+        'commit': gitCommit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def scaling(results):
+    """ Estimate how time of every operation grows with document size.
+    Exponent is the slope of time against size on log-log scale between
+    the smallest and the largest size, 1 is linear and 2 quadratic growth.
+
+    @param results List of case results
+    @returns List of dictionaries of generator, operation, sizes, times and exponent
+    """
+    curves = {}
+    for item in results:
+        curves.setdefault((item['generator'], item['operation']), []).append((item['size'], item['seconds']))
+
+    res = []
+    for (generator, operation), points in sorted(curves.items()):
+        points.sort()
+        exponent = None
+        (small, first), (large, last) = points[0], points[-1]
+        if large > small and first > 0 and last > 0:
+            exponent = math.log(last / first) / math.log(float(large) / small)
+        res.append({
+            'generator': generator,
+            'operation': operation,
+            'sizes': [size for size, seconds in points],
+            'seconds': [seconds for size, seconds in points],
+            'exponent': exponent,
+        })
+    return res
+
+
+def compare(results, baseline, threshold):
+    """ Compare results to baseline results
+
+    @param results Results of runSuite
+    @param baseline Earlier results of runSuite
+    @param threshold Relative slowdown reported as regression
+    @returns List of tuples of generator, size, operation, old and new time, ratio and regression flag
+    """
+    old = dict(((item['generator'], item['size'], item['operation']), item) for item in baseline['results'])
+    rows = []
+    for item in results['results']:
+        key = (item['generator'], item['size'], item['operation'])
+        if key not in old or not old[key]['seconds']:
+            continue
+        ratio = item['seconds'] / old[key]['seconds']
+        rows.append(key + (old[key]['seconds'], item['seconds'], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def printResult(result):
+    print ("%12s %8d %22s %10.2f %14.0f %10.1f %10s" % (
+        result['generator'], result['size'], result['operation'], result['seconds'] * 1e3,
+        result['elements_per_second'] or 0, result['mb_per_second'] or 0,
+        result['peak_kib'] if result['peak_kib'] is not None else '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run benchmark suite of xmltreenode')
+    parser.add_argument('--generators', nargs='+', choices=sorted(GENERATORS), default=sorted(GENERATORS),
+                        help='Document generators to use')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help='Numbers of elements in the documents')
+    parser.add_argument('--operations', nargs='+', choices=sorted(OPERATIONS), default=sorted(OPERATIONS),
+                        help='Operations to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per case, best is reported')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Compare to results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown reported as regression when comparing')
+    args = parser.parse_args()
+
+    print ("%12s %8s %22s %10s %14s %10s %10s" % (
+        "generator", "size", "operation", "ms", "elements/s", "MB/s", "peak KiB"))
+    results = runSuite(args.generators, args.sizes, args.operations, args.repeat, printResult)
+
+    if len(args.sizes) > 1:
+        print ()
+        print ("%12s %22s %10s" % ("generator", "operation", "exponent"))
+        for curve in results['scaling']:
+            if curve['exponent'] is not None:
+                print ("%12s %22s %10.2f" % (curve['generator'], curve['operation'], curve['exponent']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold)
+        print ()
+        print ("%12s %8s %22s %10s %10s %8s" % ("generator", "size", "operation", "old ms", "new ms", "ratio"))
+        for generator, size, operation, old, new, ratio, regression in rows:
+            print ("%12s %8d %22s %10.2f %10.2f %8.2f%s" % (
+                generator, size, operation, old * 1e3, new * 1e3, ratio, " REGRESSION" if regression else ""))
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
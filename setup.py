@@ -1,6 +1,24 @@
 #!/usr/bin/env python
 
+import sys
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+# Modules using syntax of newer Python versions, by the version they require
+VERSION_MODULES = {
+    'asyncparser': (3, 6),
+}
+
+
+class BuildPy(build_py):
+    """ Leave out modules which can't be compiled with the running Python version
+    """
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        return [(pkg, module, filename) for pkg, module, filename in modules
+                if sys.version_info >= VERSION_MODULES.get(module, (0, ))]
+
 
 setup(
     name='xmltreenode',
@@ -10,4 +28,5 @@ setup(
     author_email='jroivas@iki.fi',
     url='https://github.com/jroivas/python-xmltreenode',
     packages=['xmltreenode'],
+    cmdclass={'build_py': BuildPy},
     install_requires=['setuptools'])
@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 import unittest
 import sys
 
@@ -104,6 +106,15 @@ class TestXmlparser(unittest.TestCase):
             </d>
         </root>
         """
+        # Text which the parser reports in several pieces
+        self.textXML = u"""<root>
+            <rec id="1"><first>John</first> <last>Smith</last>
+                <desc>line one
+                    line two &amp; three \u00e4\u00e4</desc></rec>
+            <rec id="2"><first> &lt; </first><last><![CDATA[ x ]]> y</last>
+                <desc><!-- note -->
+                    after comment</desc>tail of rec</rec>
+        </root>"""
 
     def test_xmlparser_CustomXMLParser_getRoot(self):
         iparse = xmlparser.CustomXMLParser()
@@ -315,7 +326,543 @@ class TestXmlparser(unittest.TestCase):
             __builtin__.open = orig_open
             sys.stdout = sys.__stdout__
 
+    def _writeTempFile(self, contents):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        name = os.path.join(tmpdir, 'test.xml')
+        with open(name, 'wb' if isinstance(contents, bytes) else 'w') as f:
+            f.write(contents)
+        return name
+
+    def test_xmlparser_load_useMmap(self):
+        name = self._writeTempFile(self.dummyXML)
+        expected = xmlparser.CustomXMLParser().load(self.dummyXML, sourceIsFile=False).getRoot().toString()
+
+        iparse = xmlparser.CustomXMLParser()
+        res = iparse.load(name, useMmap=True, chunkSize=7)
+        self.assertEqual(res, iparse)
+        self.assertEqual(iparse.getRoot().toString(), expected)
+
+        iparse = xmlparser.CustomXMLParser()
+        iparse.load(name, addDummy=True, useMmap=True)
+        self.assertEqual(iparse.getRoot().getData(), 'dummy')
+        self.assertEqual(iparse.getRoot().getChildren()[0].toString(), expected)
+
+    def test_xmlparser_load_useMmap_chunkSize(self):
+        data = self.textXML.encode('utf-8')
+        name = self._writeTempFile(data)
+        expected = xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot().toString()
+        self.assertTrue('line one                    line two &amp; three' in expected)
+        self.assertTrue('<first> &lt; </first>' in expected)
+
+        import columnar
+        flat = columnar.fromTree(xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot()).flatten()
+
+        for chunkSize in range(1, len(data) + 1):
+            res = xmlparser.CustomXMLParser().load(name, useMmap=True, chunkSize=chunkSize).getRoot()
+            self.assertEqual(res.toString(), expected)
+            self.assertEqual(columnar.load(name, useMmap=True, chunkSize=chunkSize).flatten(), flat)
+
+    def test_xmlparser_load_useMmap_invalid_file(self):
+        name = self._writeTempFile('')
+        iparse = xmlparser.CustomXMLParser()
+        self.assertRaisesRegexp(ValueError, 'Input is not valid XML: %s' % name, iparse.load, name, useMmap=True)
+
+        name = self._writeTempFile('<a><b></a>')
+        iparse = xmlparser.CustomXMLParser()
+        self.assertRaisesRegexp(ValueError, 'Input is not valid XML', iparse.load, name, useMmap=True)
+
+        missing = os.path.join(os.path.dirname(name), 'missing.xml')
+        self.assertRaisesRegexp(ValueError, 'File %s not found!' % missing, iparse.load, missing, useMmap=True)
+
+    def test_xmlparser_loadFiles(self):
+        names = [self._writeTempFile('<root%d a="%d"><!-- c --><x>text</x></root%d>' % (i, i, i)) for i in range(6)]
+        expected = [xmlparser.CustomXMLParser().load(name).getRoot().toString() for name in names]
+
+        iparse = xmlparser.CustomXMLParser()
+        res = list(iparse.loadFiles(names, processes=2))
+        self.assertEqual([path for path, root, error in res], names)
+        self.assertEqual([root.toString() for path, root, error in res], expected)
+        self.assertEqual([error for path, root, error in res], [None] * len(names))
+
+        res = dict((path, root) for path, root, error in iparse.loadFiles(names, processes=3, ordered=False, useMmap=True))
+        self.assertEqual(sorted(res.keys()), sorted(names))
+        self.assertEqual(res[names[2]].toString(), expected[2])
+        self.assertEqual(res[names[2]].getChildren()[1].getParent(), res[names[2]])
+
+        res = list(iparse.loadFiles(names[:2], processes=1, addDummy=True))
+        self.assertEqual(res[1][1].getData(), 'dummy')
+
+    def test_xmlparser_loadFiles_errors(self):
+        names = [self._writeTempFile('<a />'), self._writeTempFile('<a>'), self._writeTempFile('<b />')]
+        iparse = xmlparser.CustomXMLParser()
+        for useMmap in (False, True):
+            res = list(iparse.loadFiles(names, processes=2, useMmap=useMmap))
+            self.assertEqual([path for path, root, error in res], names)
+            self.assertEqual(res[0][1].getData(), 'a')
+            self.assertEqual(res[0][2], None)
+            self.assertEqual(res[1][1], None)
+            self.assertTrue(res[1][2].startswith('Input is not valid XML: %s' % names[1]))
+            self.assertEqual(res[2][1].getData(), 'b')
+
+        # Error is raised only after the files following the failed one are handled
+        res = []
+        try:
+            for item in iparse.loadFiles(names, processes=2, raiseErrors=True):
+                res.append(item)
+            self.fail('ValueError not raised')
+        except ValueError as e:
+            self.assertTrue(str(e).startswith('1 of 3 files failed to load, first: Input is not valid XML: %s' % names[1]))
+        self.assertEqual([path for path, root, error in res], names)
+        self.assertEqual(res[2][1].getData(), 'b')
+
+        # Any exception fails only its own file, nothing is printed
+        try:
+            sys.stdout = StringIO()
+            res = list(iparse.loadFiles(['invalid\0path', names[0]], processes=1))
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = sys.__stdout__
+        self.assertEqual(output, '')
+        self.assertEqual(res[0][1], None)
+        self.assertTrue(res[0][2].startswith('Failed to load invalid'))
+        self.assertTrue('TypeError' in res[0][2])
+        self.assertEqual(res[1][1].getData(), 'a')
+
+    def test_xmlparser_loadLazy(self):
+        name = self._writeTempFile(self.dummyXML)
+        expected = xmlparser.CustomXMLParser().load(self.dummyXML, sourceIsFile=False).getRoot().toSimpleString()
+
+        iparse = xmlparser.CustomXMLParser()
+        res = iparse.loadLazy(name)
+        self.assertEqual(res, iparse)
+        root = iparse.getRoot()
+        sections = root.getChildren()
+        self.assertEqual([node.getData() for node in sections], ['a', 'a', 'd'])
+        self.assertEqual([node.isMaterialized() for node in sections], [False, False, False])
+        self.assertEqual(sections[1].getAttrib('myattr'), 'c')
+        self.assertFalse(sections[1].isMaterialized())
+
+        self.assertEqual(len(sections[1].getChildren()), 3)
+        self.assertTrue(sections[1].isMaterialized())
+        self.assertEqual(sections[1].getChildren()[0].getParent(), sections[1])
+        self.assertFalse(sections[2].isMaterialized())
+        self.assertEqual(root['d'][0].numChildren(), 3)
+        self.assertTrue(sections[2].isMaterialized())
+        self.assertEqual([node.getValue() for node in sections[2].iter('e')], ['1', '2', '3'])
+
+        self.assertEqual(root.toSimpleString(), expected)
+
+        # Node factory set by user is kept, also when the input is not valid
+        class Node(xmlparser.XMLTreeNode):
+            pass
+
+        iparse = xmlparser.CustomXMLParser()
+        iparse.nodeFactory = Node
+        iparse.loadLazy(name)
+        self.assertTrue(iparse.nodeFactory is Node)
+        self.assertRaises(ValueError, iparse.loadLazy, '<a><b></a>', sourceIsFile=False)
+        self.assertTrue(iparse.nodeFactory is Node)
+
+    def test_xmlparser_loadLazy_depth_and_namespaces(self):
+        data = b"""<?xml version="1.0" encoding="iso-8859-1"?>
+        <!-- comment -->
+        <root xmlns="urn:default" xmlns:p="urn:p">
+            <p:a p:attr="1">
+                <b><p:c>\xe4</p:c><!-- c --></b>
+                tail
+                <b />
+            </p:a>
+        </root>
+        """
+        expected = xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot().toSimpleString()
+
+        for depth in (1, 2, 3):
+            iparse = xmlparser.CustomXMLParser()
+            iparse.loadLazy(data, sourceIsFile=False, depth=depth)
+            self.assertEqual(iparse.getRoot().toSimpleString(), expected)
+
+        iparse = xmlparser.CustomXMLParser().loadLazy(data, sourceIsFile=False, depth=2)
+        section = iparse.getRoot().getChildren()[1]
+        self.assertEqual(section.tag, '{urn:p}a')
+        self.assertFalse(hasattr(section, 'isMaterialized'))
+        self.assertFalse(section.getChildren()[0].isMaterialized())
+
+    def test_xmlparser_loadLazy_invalid(self):
+        iparse = xmlparser.CustomXMLParser()
+        self.assertRaisesRegexp(ValueError, 'Input is not valid XML', iparse.loadLazy, '<a><b></a>', sourceIsFile=False)
+        self.assertRaises(ValueError, iparse.loadLazy, '<a />', sourceIsFile=False, depth=0)
+
+    def test_xmlparser_internTable(self):
+        data = '<root><item kind="long-value-a" name="first-name" /><item kind="long-value-a" name="second" /></root>'
+        table = {}
+        root1 = xmlparser.CustomXMLParser(internTable=table, internValues=['kind']).load(data, sourceIsFile=False).getRoot()
+        root2 = xmlparser.CustomXMLParser(internTable=table, internValues=['kind']).load(data, sourceIsFile=False).getRoot()
+        item1 = root1.getChildren()[0]
+        item2 = root2.getChildren()[1]
+
+        self.assertEqual(root1.toSimpleString(), root2.toSimpleString())
+        self.assertTrue(item1.getData() is item2.getData())
+        self.assertTrue(item1.attrib['kind'] is item2.attrib['kind'])
+        self.assertEqual([k for k in item1.attrib if k == 'kind'][0], 'kind')
+        self.assertTrue([k for k in item1.attrib if k == 'name'][0] is [k for k in item2.attrib if k == 'name'][0])
+        self.assertFalse('first-name' in table)
+        self.assertTrue('long-value-a' in table)
+
+        # Values of all attributes
+        xmlparser.CustomXMLParser(internTable=table, internValues=True).load(data, sourceIsFile=False)
+        self.assertTrue('first-name' in table)
+
+        self.assertRaises(ValueError, xmlparser.CustomXMLParser, internValues=True)
+
     def test_xmlparser_len_empty_zero(self):
         iparse = xmlparser.CustomXMLParser()
 
         self.assertEqual(len(iparse), 0)
+
+    def test_xmlparser_iterLoad(self):
+        iparse = xmlparser.CustomXMLParser()
+        nodes = []
+        for node in iparse.iterLoad(self.dummyXML, 'e', sourceIsFile=False, chunkSize=16):
+            self.assertEqual(node.getParent().getData(), 'd')
+            nodes.append(node)
+
+        self.assertEqual([node.getValue() for node in nodes], ['1', '2', '3'])
+        self.assertEqual([node.getParent() for node in nodes], [None, None, None])
+        self.assertEqual(iparse.getRoot().getTreeNodeByName('d').numChildren(), 0)
+        self.assertEqual(iparse.getRoot().numChildren(), 3)
+
+    def test_xmlparser_iterLoad_no_detach(self):
+        iparse = xmlparser.CustomXMLParser()
+        nodes = list(iparse.iterLoad(self.dummyXML, 'a', sourceIsFile=False, detach=False))
+
+        self.assertEqual(len(nodes), 2)
+        self.assertEqual(nodes[1].getAttrib('myattr'), 'c')
+        self.assertEqual(nodes[1].getParent(), iparse.getRoot())
+        self.assertEqual(iparse.getRoot().numChildren(), 3)
+
+    def test_xmlparser_iterLoad_nested(self):
+        data = '<root><rec id="1"><rec id="2"><rec id="3" /></rec><x /></rec><rec id="4" /></root>'
+        iparse = xmlparser.CustomXMLParser()
+        nodes = []
+        for node in iparse.iterLoad(data, 'rec', sourceIsFile=False, chunkSize=8):
+            nodes.append((node.getAttrib('id'), node.toSimpleString()))
+
+        # Inner elements are yielded first, outer ones still contain them
+        self.assertEqual([key for key, xml in nodes], ['3', '2', '1', '4'])
+        self.assertEqual(nodes[2][1], '<rec id="1"><rec id="2"><rec id="3" /></rec><x /></rec>')
+        self.assertEqual(iparse.getRoot().numChildren(), 0)
+
+    def test_xmlparser_iterLoad_invalid_xml_raise_ValueError(self):
+        iparse = xmlparser.CustomXMLParser()
+        self.assertRaisesRegexp(ValueError, 'Input is not valid XML', list, iparse.iterLoad('<a><b></a>', 'b', sourceIsFile=False))
+
+    def test_xmlparser_streamLoad(self):
+        iparse = xmlparser.CustomXMLParser()
+        nodes = []
+        res = iparse.streamLoad(self.dummyXML, 'c', nodes.append, sourceIsFile=False)
+
+        self.assertEqual(res, iparse)
+        self.assertEqual(len(nodes), 2)
+        self.assertEqual(iparse.getRoot().getChildren()[1].numChildren(), 1)
+
+    def test_xmlparser_feed(self):
+        iparse = xmlparser.CustomXMLParser()
+        iparse.setStreamTag('e')
+        self.assertEqual(iparse.readNodes(), [])
+
+        data = self.dummyXML
+        nodes = []
+        for pos in range(0, len(data), 50):
+            iparse.feed(data[pos:pos + 50])
+            nodes.extend(iparse.readNodes())
+        self.assertEqual(iparse.close(), iparse)
+        nodes.extend(iparse.readNodes())
+
+        self.assertEqual([node.getValue() for node in nodes], ['1', '2', '3'])
+        self.assertEqual(nodes[0].getParent(), None)
+        self.assertEqual(iparse.getRoot().getChildren()[2].numChildren(), 0)
+        self.assertEqual(iparse.getRoot().getChildren()[1].numChildren(), 3)
+
+    def test_xmlparser_stream_chunkSize(self):
+        data = self.textXML.encode('utf-8')
+        root = xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        expected = [node.toString() for node in root.getChildren()]
+        self.assertEqual(len(expected), 2)
+
+        for chunkSize in range(1, len(data) + 1):
+            iparse = xmlparser.CustomXMLParser()
+            nodes = [node.toString() for node in iparse.iterLoad(data, 'rec', sourceIsFile=False, chunkSize=chunkSize)]
+            self.assertEqual(nodes, expected)
+            self.assertEqual(iparse.getRoot().getValue(), root.getValue())
+
+            nodes = []
+            iparse = xmlparser.CustomXMLParser()
+            iparse.streamLoad(data, 'rec', lambda node: nodes.append(node.toString()), sourceIsFile=False,
+                              detach=False, chunkSize=chunkSize)
+            self.assertEqual(nodes, expected)
+            self.assertEqual(iparse.getRoot().toString(), root.toString())
+
+            iparse = xmlparser.CustomXMLParser()
+            iparse.setStreamTag('rec')
+            nodes = []
+            for pos in range(0, len(data), chunkSize):
+                iparse.feed(data[pos:pos + chunkSize])
+                nodes.extend(iparse.readNodes(detach=False))
+            iparse.close()
+            self.assertEqual([node.toString() for node in nodes], expected)
+            self.assertEqual(iparse.getRoot().toString(), root.toString())
+
+    def test_xmlparser_feed_invalid(self):
+        iparse = xmlparser.CustomXMLParser()
+        self.assertRaisesRegexp(ValueError, 'Input is not valid XML', iparse.feed, '<a></b>')
+
+        iparse = xmlparser.CustomXMLParser()
+        iparse.feed('<a><b>')
+        self.assertRaisesRegexp(ValueError, 'Input is not valid XML', iparse.close)
+
+    def test_xmlparser_cache(self):
+        import doccache
+
+        cache = doccache.DocumentCache()
+        name = self._writeTempFile('<a x="1"><b>text</b><c /></a>')
+        first = xmlparser.CustomXMLParser().load(name, cache=cache).getRoot()
+        second = xmlparser.CustomXMLParser().load(name, cache=cache).getRoot()
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertTrue(first is not second)
+        self.assertEqual(second.toString(), first.toString())
+
+        # Loaded trees are independent of each other
+        first.getChildren()[0].appendValue('more')
+        first.addChild(xmlparser.XMLTreeNode('d'))
+        self.assertEqual(second.toSimpleString(), '<a x="1"><b>text</b><c /></a>')
+        self.assertEqual(xmlparser.CustomXMLParser().load(name, cache=cache).getRoot().toSimpleString(),
+                         '<a x="1"><b>text</b><c /></a>')
+
+        # Changed file is parsed again
+        with open(name, 'w') as f:
+            f.write('<a x="2" />')
+        os.utime(name, (0, 0))
+        self.assertEqual(xmlparser.CustomXMLParser().load(name, cache=cache).getRoot().toSimpleString(),
+                         '<a x="2" />')
+        self.assertEqual(cache.stats()['misses'], 2)
+
+        self.assertEqual(xmlparser.CustomXMLParser().load('<a />', sourceIsFile=False, cache=cache).getRoot().getData(), 'a')
+        self.assertEqual(xmlparser.CustomXMLParser().load(b'<a />', sourceIsFile=False, cache=cache).getRoot().getData(), 'a')
+        self.assertEqual(cache.stats()['hits'], 3)
+        self.assertEqual(cache.stats()['entries'], 3)
+        self.assertRaises(ValueError, xmlparser.CustomXMLParser().load, '<a>', sourceIsFile=False, cache=cache)
+
+        # Least recently used documents are evicted
+        cache.maxEntries = 2
+        xmlparser.CustomXMLParser().load('<b />', sourceIsFile=False, cache=cache)
+        self.assertEqual(cache.stats()['entries'], 2)
+        self.assertEqual(cache.stats()['evictions'], 2)
+        cache.maxBytes = cache.stats()['bytes'] - 1
+        xmlparser.CustomXMLParser().load('<c />', sourceIsFile=False, cache=cache)
+        self.assertEqual(len(cache), 1)
+        cache.maxBytes = 0
+        xmlparser.CustomXMLParser().load('<d />', sourceIsFile=False, cache=cache)
+        self.assertEqual(len(cache), 1)
+
+        cache.clear()
+        self.assertEqual(cache.stats()['bytes'], 0)
+        self.assertEqual(len(cache), 0)
+
+    def test_xmlparser_cache_parser_settings(self):
+        import doccache
+
+        class CustomNode(xmlparser.XMLTreeNode):
+            pass
+
+        cache = doccache.DocumentCache()
+        data = '<a x="1">%s</a>' % ('<b y="2">text</b>' * 100)
+        root = xmlparser.CustomXMLParser().load(data, sourceIsFile=False, cache=cache).getRoot()
+        size = cache.stats()['bytes']
+        estimate = doccache.estimateSize(xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot())
+        self.assertTrue(estimate / 2 < size < estimate * 2)
+
+        # Nodes of custom factory can't be cloned from the cache
+        parser = xmlparser.CustomXMLParser()
+        parser.nodeFactory = CustomNode
+        res = parser.load(data, sourceIsFile=False, cache=cache).getRoot()
+        self.assertTrue(type(res) is CustomNode)
+        self.assertTrue(type(res.getChildren()[0]) is CustomNode)
+        self.assertEqual(res.toString(), root.toString())
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(len(cache), 1)
+
+        # Documents of other intern tables are cached separately
+        table = {}
+        res = xmlparser.CustomXMLParser(internTable=table, internValues=True).load(
+            data, sourceIsFile=False, cache=cache).getRoot()
+        self.assertTrue(res.getChildren()[0].getAttrib('y') is table['2'])
+        self.assertEqual(cache.stats()['hits'], 0)
+        res = xmlparser.CustomXMLParser(internTable=table, internValues=True).load(
+            data, sourceIsFile=False, cache=cache).getRoot()
+        self.assertTrue(res.getChildren()[0].getAttrib('y') is table['2'])
+        self.assertEqual(cache.stats()['hits'], 1)
+        xmlparser.CustomXMLParser(internTable={}).load(data, sourceIsFile=False, cache=cache)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(len(cache), 3)
+
+    def test_xmlparser_useTreeBuilder(self):
+        import bulkbuild
+
+        docs = [
+            self.dummyXML,
+            '<a>x\n  y \n<b>t</b>\n  tail\n  <c x="1" y="&amp;" />\n</a>',
+            '<a>x &amp; y<b>&lt;b&gt;</b></a>',
+            '<a>\n  &amp; y</a>',
+            '<a>&#32;<b/>&#32;x</a>',
+            '<a><![CDATA[ x ]]> <b/></a>',
+            '<a><!--c-->\n  <b/>\n</a>',
+            '<!--pre--><a>\n<!--in--> </a><!--post-->',
+        ]
+
+        def dump(root):
+            return [(tag, attrib, text, tail) for parent, tag, attrib, text, tail in root.flatten()]
+
+        for doc in docs:
+            for addDummy in (False, True):
+                expected = xmlparser.CustomXMLParser().load(doc, sourceIsFile=False, addDummy=addDummy).getRoot()
+                res = xmlparser.CustomXMLParser().load(doc, sourceIsFile=False, addDummy=addDummy,
+                                                       useTreeBuilder=True).getRoot()
+                self.assertEqual(dump(res), dump(expected))
+                for child in res.getChildren():
+                    self.assertEqual(child.getParent(), res)
+
+        for doc in docs[2:6]:
+            self.assertTrue(bulkbuild.canBuild(doc))
+        self.assertEqual(bulkbuild.canBuild(docs[6]), bulkbuild.COMMENTS_SUPPORTED)
+
+        doc = b'<?xml version="1.0" encoding="ISO-8859-1"?>\n<a>t\xe4 &amp; \n x<b/> \xe4</a>'
+        self.assertEqual(dump(xmlparser.CustomXMLParser().load(doc, sourceIsFile=False, useTreeBuilder=True).getRoot()),
+                         dump(xmlparser.CustomXMLParser().load(doc, sourceIsFile=False).getRoot()))
+
+        name = self._writeTempFile(docs[1])
+        table = {}
+        res = xmlparser.CustomXMLParser(internTable=table, internValues=True).load(
+            name, useMmap=True, useTreeBuilder=True).getRoot()
+        self.assertEqual(dump(res), dump(xmlparser.CustomXMLParser().load(name).getRoot()))
+        self.assertTrue(res.getChildren()[1].getAttrib('x') is table['1'])
+
+        self.assertRaises(ValueError, xmlparser.CustomXMLParser().load, '<a>', sourceIsFile=False, useTreeBuilder=True)
+
+    def test_xmlparser_include_exclude(self):
+        data = """<!-- pre --><root>
+            <a x="1">text<b>1</b><!-- c --> <c><b>2</b></c>tail</a>
+            <d>3<b>4</b></d>
+        </root>"""
+
+        def load(data, **options):
+            return xmlparser.CustomXMLParser().load(data, sourceIsFile=False, **options).getRoot()
+
+        self.assertEqual(load(data, exclude=['b', 'root/d']).toSimpleString(),
+                         '<root><!-- pre --><a x="1">text tail<!-- c --><c /></a></root>')
+
+        root = load(data, include=['b'])
+        self.assertEqual(root.toSimpleString(),
+                         '<root><a x="1"><b>1</b><c><b>2</b></c></a><d><b>4</b></d></root>')
+        b = root.getChildren()[0].getChildren()[1].getChildren()[0]
+        self.assertEqual(b.getParent().getParent().getParent(), root)
+
+        self.assertEqual(load(data, include=['/root/a/*'], exclude=['c/b']).toSimpleString(),
+                         '<root><a x="1"><b>1</b><c /></a></root>')
+        self.assertEqual(load(data, include=['root']).toSimpleString(), load(data).toSimpleString())
+        self.assertEqual(load(data, include=['x']).toSimpleString(), '<root />')
+        self.assertEqual(load(data, exclude=['root']), None)
+
+        root = load('<n:a xmlns:n="http://x/y"><n:b /><c /></n:a>', exclude=['{http://x/y}a/{http://x/y}b'])
+        self.assertEqual([child.getData() for child in root.getChildren()], ['c'])
+        self.assertRaises(ValueError, load, data, include=['/'])
+
+    def test_xmlparser_extract(self):
+        import extract
+
+        data = """<catalog>
+            <product id="1"><name>first</name><price currency="EUR">1.5</price><!-- c --> <tags><tag>x</tag><tag>y</tag></tags></product>
+            <product id="2">text<name /><tags /><product id="3"><name>nested</name></product>tail</product>
+            <group><product><name>a &amp; b</name><price>2</price></product></group>
+        </catalog>"""
+        fields = [('id', '@id'), ('name', 'name'), ('currency', 'price/@currency'), ('tag', 'tags/tag'), ('text', '.')]
+        extractor = extract.RecordExtractor('product', fields, default='-')
+
+        def value(record, path):
+            path, sep, attrib = path.partition('@')
+            path = path.rstrip('/')
+            node = record if path in ('', '.') else record.find(path)
+            if node is None:
+                return '-'
+            if sep:
+                return node.getAttribSafe(attrib) or '-'
+            return node.getValue()
+
+        root = xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        expected = [tuple(value(record, path) for name, path in fields)
+                    for record in root.findall('product') + root.findall('group/product')]
+        self.assertEqual(expected[1], ('2', '', '-', '-', 'texttail'))
+
+        self.assertEqual(extractor.rows(data, sourceIsFile=False), expected)
+        self.assertEqual(extractor.rows(data, sourceIsFile=False, chunkSize=7), expected)
+        self.assertEqual(extractor.rows(data, sourceIsFile=False, asDict=True)[0],
+                         dict(zip([name for name, path in fields], expected[0])))
+        self.assertEqual(list(extractor.columns(data, sourceIsFile=False).items())[0], ('id', ['1', '2', '-']))
+        self.assertEqual(extract.RecordExtractor('/catalog/product', {'id': '@id'}).rows(data, sourceIsFile=False),
+                         [('1', ), ('2', )])
+
+        data = self.textXML.encode('utf-8')
+        fields = [('first', 'first'), ('last', 'last'), ('desc', 'desc'), ('text', '.')]
+        root = xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        expected = [tuple(record.find(path).getValue() for name, path in fields) for record in root.findall('rec')]
+        self.assertEqual(expected[0][:2], ('John', 'Smith'))
+        extractor = extract.RecordExtractor('rec', fields)
+        for chunkSize in range(1, len(data) + 1):
+            self.assertEqual(extractor.rows(data, sourceIsFile=False, chunkSize=chunkSize), expected)
+
+        self.assertRaises(ValueError, extract.RecordExtractor, 'product', [('x', '*/name')])
+        self.assertRaises(ValueError, extractor.rows, '<a><product></a>', sourceIsFile=False)
+
+    @unittest.skipIf(sys.version_info < (3, 6), 'Requires Python 3.6')
+    def test_xmlparser_asyncparser(self):
+        import asyncio
+        import asyncparser
+
+        def reader(data):
+            stream = asyncio.StreamReader()
+            stream.feed_data(data)
+            stream.feed_eof()
+            return stream
+
+        async_gen = asyncparser.iterStream(reader(self.dummyXML.encode('utf-8')), 'e', readSize=10)
+        values = []
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    node = loop.run_until_complete(async_gen.__anext__())
+                except StopAsyncIteration:  # NOQA
+                    break
+                values.append(node.getValue())
+            iparse = loop.run_until_complete(asyncparser.parseStream(reader(self.dummyXML.encode('utf-8'))))
+
+            # Nested elements with the same tag stay in the outer one
+            async_gen = asyncparser.iterStream(reader(b'<r><e><e /></e></r>'), 'e')
+            nested = [loop.run_until_complete(async_gen.__anext__()) for i in range(2)]
+
+            # Text is the same when the stream is received one byte at a time
+            data = self.textXML.encode('utf-8')
+            whole = loop.run_until_complete(asyncparser.parseStream(reader(data), readSize=1))
+            async_gen = asyncparser.iterStream(reader(data), 'rec', readSize=1)
+            records = [loop.run_until_complete(async_gen.__anext__()).toString() for i in range(2)]
+        finally:
+            loop.close()
+
+        root = xmlparser.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+        self.assertEqual(whole.getRoot().toString(), root.toString())
+        self.assertEqual(records, [node.toString() for node in root.getChildren()])
+
+        self.assertEqual(values, ['1', '2', '3'])
+        self.assertEqual(nested[1].numChildren(), 1)
+        self.assertEqual(iparse.getRoot().getChildren()[2].numChildren(), 3)
@@ -1,6 +1,9 @@
+import io
 import os
+import struct
 import unittest
 import sys
+import xml.etree.ElementTree
 
 # Make sure we'll find the required files...
 sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir))
@@ -8,6 +11,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), os.pardir, "xmltreenode"
 sys.path.append(os.path.dirname(__file__))
 
 import xmltreenode
+import snapshot
 
 
 class TestTreenode(unittest.TestCase):
@@ -605,3 +609,752 @@ class TestTreenode(unittest.TestCase):
 
         items = node.getSelfAndSubTreeNodesByName('root')
         self.assertEqual(len(items), 1)
+
+    def test_xmltreenode_wide_node_children(self):
+        node = xmltreenode.XMLTreeNode("root")
+        children = [xmltreenode.XMLTreeNode("c%s" % i) for i in range(100)]
+        for child in children:
+            node.addChild(child)
+        node.addChild(children[10])
+        node.insertChild(0, children[20])
+        node.insertAfterChild(children[0], children[30])
+
+        self.assertEqual(node.numChildren(), 100)
+        self.assertEqual(node.getChildren(), children)
+        self.assertIn(children[50], node.getChildrenRef())
+        self.assertNotIn(xmltreenode.XMLTreeNode("c50"), node.getChildrenRef())
+
+        self.assertTrue(node.removeChild(children[99]))
+        self.assertTrue(node.removeChild(children[50]))
+        self.assertFalse(node.removeChild(children[50]))
+        self.assertEqual(node.numChildren(), 98)
+        self.assertNotIn(children[50], node.getChildrenRef())
+
+        node.addChild(children[50])
+        self.assertEqual(node.getChildrenRef()[-1], children[50])
+
+    def test_xmltreenode_XMLTreeNodeChildren(self):
+        children = xmltreenode.XMLTreeNodeChildren()
+        items = [xmltreenode.XMLTreeNode("c%s" % i) for i in range(20)]
+        for item in items:
+            children.append(item)
+
+        self.assertIn(items[5], children)
+        self.assertEqual(children.pop(5), items[5])
+        self.assertNotIn(items[5], children)
+
+        children[0] = items[5]
+        self.assertIn(items[5], children)
+        self.assertNotIn(items[0], children)
+
+        children.append(items[5])
+        children.remove(items[5])
+        self.assertIn(items[5], children)
+
+        del children[:]
+        self.assertNotIn(items[5], children)
+        self.assertRaises(ValueError, children.remove, items[5])
+
+    def test_xmltreenode_XMLTreeNodeChildren_removed(self):
+        items = [xmltreenode.XMLTreeNode("c%s" % i) for i in range(40)]
+        children = xmltreenode.XMLTreeNodeChildren(items)
+        expected = list(items)
+
+        def check():
+            self.assertEqual(len(children), len(expected))
+            self.assertEqual(children[0], expected[0])
+            self.assertEqual(children[-1], expected[-1])
+            self.assertListEqual(expected, children)
+            self.assertEqual(children, expected)
+            for item in items:
+                self.assertEqual(item in children, item in expected)
+
+        for item in (items[0], items[1], items[20], items[38], items[39], items[10]):
+            children.remove(item)
+            expected.remove(item)
+            self.assertEqual(len(children), len(expected))
+            self.assertEqual(children[0], expected[0])
+            self.assertEqual(children[-1], expected[-1])
+        check()
+
+        children.remove(items[5])
+        expected.remove(items[5])
+        children.insert(0, items[1])
+        expected.insert(0, items[1])
+        children.append(items[20])
+        expected.append(items[20])
+        self.assertEqual(children.pop(0), expected.pop(0))
+        self.assertEqual(children.pop(), expected.pop())
+        check()
+
+        children.remove(items[30])
+        expected.remove(items[30])
+        self.assertEqual(children[2:5], expected[2:5])
+        self.assertEqual(children.index(items[31]), expected.index(items[31]))
+        self.assertEqual(tuple(children), tuple(expected))
+        self.assertEqual([None] + children, [None] + expected)
+        check()
+
+        for item in list(expected[:-3]):
+            children.remove(item)
+            expected.remove(item)
+            self.assertEqual(len(children), len(expected))
+        check()
+        self.assertRaises(ValueError, children.remove, items[0])
+
+    def test_treeNode_appendValue_chunks(self):
+        node = xmltreenode.XMLTreeNode("root")
+        for i in range(1000):
+            node.appendValue("ab")
+        self.assertEqual(node.text, "ab" * 1000)
+
+        node.appendValue(1)
+        self.assertEqual(node.getValue(), "ab" * 1000 + "1")
+
+        node.text = "new"
+        node.appendValue("er")
+        self.assertEqual(node.getValue(), "newer")
+        self.assertEqual(node.toSimpleString(), "<root>newer</root>")
+
+        node.setValue(5)
+        self.assertEqual(node.getValue(), 5)
+        node.appendValue("0")
+        self.assertEqual(node.getValue(), "50")
+
+        node.appendValue("1")
+        copynode = node.copy()
+        copynode.appendValue("2")
+        self.assertEqual(node.getValue(), "501")
+        self.assertEqual(copynode.getValue(), "5012")
+
+    def test_xmltreenode_shared_empty_attrib_and_children(self):
+        node_a = xmltreenode.XMLTreeNode("a")
+        node_b = xmltreenode.XMLTreeNode("b")
+        self.assertEqual(node_a.items(), node_b.items())
+        self.assertEqual(node_a.getChildren(), [])
+        self.assertFalse(node_a.isAttrib("x"))
+
+        node_a.addAttrib("x", "1")
+        node_a.attrib["y"] = "2"
+        node_b.getAttributes()["z"] = "3"
+        self.assertDictEqual(node_a.getAttributes(), {"x": "1", "y": "2"})
+        self.assertDictEqual(node_b.getAttributes(), {"z": "3"})
+        self.assertDictEqual(xmltreenode.XMLTreeNode("c").attrib, {})
+
+        node_b.getChildrenRef().append(node_a)
+        self.assertEqual(node_b.numChildren(), 1)
+        self.assertEqual(xmltreenode.XMLTreeNode("c").numChildren(), 0)
+
+        self.assertRaises(KeyError, xmltreenode.XMLTreeNode("c").delAttrib, "x")
+
+    def test_xmltreenode_slots(self):
+        node = xmltreenode.XMLTreeNode("root", {"a": "1"}, b="2")
+        self.assertDictEqual(node.getAttributes(), {"a": "1", "b": "2"})
+
+        node.custom = "value"
+        self.assertEqual(node.custom, "value")
+
+    def _walkByName(self, node, name):
+        return [item for item in node.iter() if item.getData() == name]
+
+    def test_xmltreenode_enableIndex(self):
+        root = self.root
+        index = root.enableIndex()
+        self.assertTrue(root.isIndexed())
+        self.assertTrue(self.baa.isIndexed())
+        self.assertEqual(root.enableIndex(), index)
+        self.assertRaises(ValueError, self.a.enableIndex)
+
+        self.assertEqual(root.getSubTreeNodesByName('Test'), [self.aa, self.ba, self.ca])
+        self.assertEqual(root.getSelfAndSubTreeNodesByName('root'), [root])
+        self.assertEqual(root.getSubTreeNodesByName('root'), [])
+        self.assertEqual(root.getTreeNodeByName('SubTest2'), self.bab)
+        self.assertEqual(root.getTreeNodeByName('NotFound'), None)
+        self.assertEqual(self.c.getSubTreeNodesByName('Test'), [self.ca])
+        self.assertEqual(self.b.getTreeNodeByName('Test'), self.ba)
+        self.assertEqual(list(self.a.iter('Test2')), [self.ab])
+
+    def test_xmltreenode_index_updates(self):
+        root = self.root
+        root.enableIndex()
+        self.assertEqual(root.getSubTreeNodesByName('Test2'), [self.ab, self.cc])
+
+        new = xmltreenode.XMLTreeNode("Test2")
+        new.addChild(xmltreenode.XMLTreeNode("Test"))
+        self.b.insertChild(0, new)
+        self.assertEqual(root.getSubTreeNodesByName('Test2'), self._walkByName(root, 'Test2'))
+        self.assertEqual(root.getSubTreeNodesByName('Test'), self._walkByName(root, 'Test'))
+
+        self.ca.setData('Renamed')
+        self.assertEqual(root.getSubTreeNodesByName('Test'), self._walkByName(root, 'Test'))
+        self.assertEqual(root.getSubTreeNodesByName('Renamed'), [self.ca])
+
+        self.ba.reparent(self.c)
+        self.assertEqual(root.getSubTreeNodesByName('SubTest'), [self.baa])
+        self.assertEqual(self.c.getSubTreeNodesByName('SubTest'), [self.baa])
+        self.assertEqual(self.b.getSubTreeNodesByName('SubTest'), [])
+
+        root.removeChild(self.c)
+        self.assertFalse(self.baa.isIndexed())
+        self.assertEqual(root.getSubTreeNodesByName('SubTest'), [])
+        self.assertEqual(root.getSubTreeNodesByName('Test'), self._walkByName(root, 'Test'))
+
+        root.disableIndex()
+        self.assertFalse(root.isIndexed())
+        self.assertFalse(self.aa.isIndexed())
+        self.assertEqual(root.getSubTreeNodesByName('Test'), self._walkByName(root, 'Test'))
+
+    def test_xmltreenode_index_interleaved_updates(self):
+        root = self.root
+        root.enableIndex(attributes=["id"])
+
+        # Lookups between modifications, inserting to the same place
+        # many times runs out of room between the neighbours
+        for i in range(100):
+            node = xmltreenode.XMLTreeNode("Test", {"id": "%d" % (i % 3)})
+            node.addChild(xmltreenode.XMLTreeNode("SubTest"))
+            self.ba.insertChild(0, node)
+            self.assertEqual(self.b.getSubTreeNodesByName('Test'), self._walkByName(self.b, 'Test'))
+            self.assertEqual(root.getSubTreeNodesByName('SubTest'), self._walkByName(root, 'SubTest'))
+            self.assertEqual(root.getNodesByAttrib("id", "1"),
+                             [item for item in root.iter() if item.getAttribSafe("id") == "1"])
+
+            self.aa.addChild(xmltreenode.XMLTreeNode("Test"))
+            self.assertEqual(self.a.getSubTreeNodesByName('Test'), self._walkByName(self.a, 'Test'))
+            self.assertEqual(self.c.getSubTreeNodesByName('Test'), self._walkByName(self.c, 'Test'))
+
+            if i % 4 == 0:
+                self.ba.removeChild(node)
+            elif i % 4 == 1:
+                node.reparent(self.cb)
+            elif i % 4 == 2:
+                node.setData("Renamed")
+                node.addAttrib("id", "1")
+            self.assertEqual(root.getSubTreeNodesByName('Test'), self._walkByName(root, 'Test'))
+            self.assertEqual(root.getSubTreeNodesByName('Renamed'), self._walkByName(root, 'Renamed'))
+            self.assertEqual(self.c.getSubTreeNodesByName('SubTest'), self._walkByName(self.c, 'SubTest'))
+            self.assertEqual(root.getNodesByAttrib("id", "1"),
+                             [item for item in root.iter() if item.getAttribSafe("id") == "1"])
+
+    def test_xmltreenode_getNodesByAttrib(self):
+        root = self.root
+        self.aa.addAttrib("id", "1")
+        self.ca.addAttrib("id", "1")
+        self.bab.addAttrib("id", "2")
+        self.ba.addAttrib("ref", "1")
+
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [self.aa, self.ca])
+        root.enableIndex(attributes=["id"])
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [self.aa, self.ca])
+        self.assertEqual(root.getNodesByAttrib("id", "3"), [])
+        self.assertEqual(self.c.getNodesByAttrib("id", "1"), [self.ca])
+        self.assertEqual(root.getNodesByAttrib("ref", "1"), [self.ba])
+
+        root.enableIndex(attributes=["ref"])
+        self.assertEqual(root.getNodesByAttrib("ref", "1"), [self.ba])
+
+        self.bab.addAttrib("id", "1")
+        self.aa.delAttrib("id")
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [self.bab, self.ca])
+        self.assertEqual(root.getNodesByAttrib("id", "2"), [])
+
+        self.cb.attrib = {"id": "1"}
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [self.bab, self.ca, self.cb])
+
+        node = xmltreenode.XMLTreeNode("Test", {"id": "1"})
+        self.a.insertChild(0, node)
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [node, self.bab, self.ca, self.cb])
+
+        self.b.reparent(self.c)
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [node, self.ca, self.cb, self.bab])
+
+        root.removeChild(self.c)
+        self.assertEqual(root.getNodesByAttrib("id", "1"), [node])
+        self.assertEqual(self.c.getNodesByAttrib("id", "1"), [self.ca, self.cb, self.bab])
+
+    def test_xmltreenode_deep_tree_without_recursion(self):
+        depth = sys.getrecursionlimit() * 5
+        root = xmltreenode.XMLTreeNode("root")
+        node = root
+        for i in range(depth):
+            child = xmltreenode.XMLTreeNode("level")
+            node.addChild(child)
+            node = child
+        node.addChild(xmltreenode.XMLTreeNode("leaf"))
+
+        self.assertEqual(len(list(root.iter())), depth + 2)
+        self.assertEqual(len(root.getSubTreeNodesByName("level")), depth)
+        self.assertEqual(root.getTreeNodeByName("leaf").getParent(), node)
+        self.assertEqual(root.toRecursiveSortString(), "root{}" + "level{}" * depth + "leaf{}")
+
+        copied = root.deepcopy()
+        self.assertEqual(len(copied.getSelfAndSubTreeNodesByName("leaf")), 1)
+        self.assertEqual(copied.getTreeNodeByName("leaf").getRoot(), copied)
+
+        root.indent(root)
+        self.assertEqual(node.text, "\n" + "  " * (depth + 1))
+        self.assertEqual(node.getChildren()[0].tail, "\n" + "  " * depth)
+
+    def test_xmltreenode_findall_path(self):
+        root = self.root
+        self.aa.addAttrib("id", "1")
+        self.ca.addAttrib("id", "2")
+        self.ca.setValue("text")
+        self.c.addChild(xmltreenode.XMLTreeNode(xml.etree.ElementTree.Comment))
+
+        self.assertEqual(root.findall("ChildA/Test"), [self.aa])
+        self.assertEqual(root.findall("*/Test"), [self.aa, self.ba, self.ca])
+        self.assertEqual(root.findall("./ChildB/Test/*"), [self.baa, self.bab])
+        self.assertEqual(root.findall("ChildC/*"), [self.ca, self.cb, self.cc])
+        self.assertEqual(root.findall(".//Test"), [self.aa, self.ba, self.ca])
+        self.assertEqual(root.findall("//Test"), [self.aa, self.ba, self.ca])
+        self.assertEqual(self.c.findall("/root/ChildA"), [self.a])
+        self.assertEqual(self.c.findall("/ChildA"), [])
+        self.assertEqual(root.findall(".//Test/.."), [self.a, self.b, self.c])
+        self.assertEqual(root.findall(".//Test[@id]"), [self.aa, self.ca])
+        self.assertEqual(root.findall(".//Test[@id='2']"), [self.ca])
+        self.assertEqual(root.findall(".//Test[@id!='2']"), [self.aa])
+        self.assertEqual(root.findall("*[Test2]"), [self.a, self.c])
+        self.assertEqual(root.findall("*[Test='text']"), [self.c])
+        self.assertEqual(root.findall(".//*[.='text']"), [self.ca])
+        self.assertEqual(root.findall("*/*[1]"), [self.aa, self.ba, self.ca])
+        self.assertEqual(root.findall("*/*[2]"), [self.ab, self.cb])
+        self.assertEqual(root.findall("*/*[last()]"), [self.ab, self.ba, self.cc])
+        self.assertEqual(root.findall("*/*[last()-1]"), [self.aa, self.cb])
+        self.assertEqual(len(root.findall(".//*")), 11)
+
+        # Positions are counted per parent, results are still in document order
+        nested = xmltreenode.CustomXMLParser().load(
+            '<r><p><b id="1"/><x><b id="2"/><b id="3"/></x><b id="4"/></p></r>', sourceIsFile=False).getRoot()
+        self.assertEqual([node.getAttrib("id") for node in nested.findall(".//b[2]")], ["3", "4"])
+        self.assertEqual([node.getAttrib("id") for node in nested.findall(".//b[last()]")], ["3", "4"])
+        self.assertEqual([node.getAttrib("id") for node in nested.findall(".//b[1]")], ["1", "2"])
+
+        root.enableIndex()
+        self.assertEqual(root.findall(".//Test"), [self.aa, self.ba, self.ca])
+        self.assertEqual(root.findall("*//Test"), [self.aa, self.ba, self.ca])
+
+    def test_xmltreenode_find(self):
+        root = self.root
+        self.assertEqual(root.find("ChildB"), self.b)
+        self.assertEqual(root.find(".//Test2"), self.ab)
+        self.assertEqual(root.find("ChildC/Missing"), None)
+
+    def test_xmltreenode_findall_invalid_path(self):
+        for path in ("/", "a/", "a[", "a[@]", "a[0]", ".//..", "a]b"):
+            self.assertRaises(ValueError, self.root.findall, path)
+
+    def test_xmltreenode_write(self):
+        root = self.root
+        self.aa.addAttrib("id", "<1>")
+        self.ca.setValue("a & b")
+        self.ba.tail = "tail"
+        expected = xmltreenode.xmltreenode.element_tree.tostring(root)
+
+        out = io.BytesIO()
+        root.write(out, bufferSize=8)
+        self.assertEqual(out.getvalue(), expected)
+        self.assertEqual(root.toSimpleString(), expected.decode('utf-8') if sys.version >= '3' else expected)
+
+        class Socket(object):
+            def __init__(self):
+                self.sent = []
+
+            def sendall(self, data):
+                self.sent.append(data)
+
+        sock = Socket()
+        root.write(sock, encoding='utf-8', bufferSize=16, doctype='<!DOCTYPE root>')
+        self.assertTrue(len(sock.sent) > 1)
+        self.assertEqual(b''.join(sock.sent), b'<!DOCTYPE root>' + expected)
+
+        # Declaration of other encodings comes before doctype
+        out = io.BytesIO()
+        root.write(out, encoding='iso-8859-1', doctype='<!DOCTYPE root>')
+        self.assertEqual(out.getvalue(), b"<?xml version='1.0' encoding='iso-8859-1'?>\n<!DOCTYPE root>" + expected)
+
+        out = io.StringIO()
+        root.write(out, encoding='unicode')
+        self.assertEqual(out.getvalue(), expected.decode('utf-8'))
+
+        self.assertRaises(ValueError, root.write, object())
+
+    def test_xmltreenode_write_namespaces(self):
+        root = xmltreenode.XMLTreeNode("{urn:a}root")
+        child = xmltreenode.XMLTreeNode("b")
+        child.addAttrib("{urn:b}x", "1")
+        root.addChild(child)
+        child.addChild(xmltreenode.XMLTreeNode("{urn:c}c"))
+        child.addChild(xmltreenode.XMLTreeNode("{urn:a}d"))
+        expected = xmltreenode.xmltreenode.element_tree.tostring(root)
+
+        out = io.BytesIO()
+        root.write(out, bufferSize=8)
+        self.assertEqual(out.getvalue(), expected)
+        # Like ElementTree, all namespaces are declared in the start tag of the root
+        start = out.getvalue().split(b'>')[0]
+        self.assertEqual(start.count(b'xmlns:'), 3)
+
+    def test_xmltreenode_write_deep_tree(self):
+        depth = sys.getrecursionlimit() * 5
+        root = xmltreenode.XMLTreeNode("root")
+        node = root
+        for i in range(depth):
+            child = xmltreenode.XMLTreeNode("a")
+            node.addChild(child)
+            node = child
+
+        res = root.toSimpleString()
+        self.assertEqual(res, "<root>" + "<a>" * (depth - 1) + "<a />" + "</a>" * (depth - 1) + "</root>")
+
+    def test_xmltreenode_toString_does_not_modify_tree(self):
+        node = self.node
+        simple = node.toSimpleString()
+        expected = "<root>\n  <child1 />\n  <child2>\n    <child3 />\n  </child2>\n</root>\n"
+
+        self.assertEqual(node.toString(), expected)
+        self.assertEqual(node.toString(), expected)
+        self.assertEqual(node.toSimpleString(), simple)
+        self.assertFalse(self.c3.tail)
+
+        self.assertEqual(node.toString(indent=4), expected.replace("  ", "    "))
+        self.assertEqual(node.toString(indent=0), expected.replace("  ", ""))
+
+        out = io.BytesIO()
+        node.write(out, indent=2)
+        self.assertEqual(out.getvalue(), expected.encode('us-ascii'))
+
+    def test_xmltreenode_flatten_and_fromFlat(self):
+        root = self.root
+        self.aa.addAttrib("id", "1")
+        self.ca.setValue("text")
+        self.ba.tail = "tail"
+        self.c.addChild(xmltreenode.XMLTreeNode(xml.etree.ElementTree.Comment))
+
+        flat = root.flatten()
+        self.assertEqual(len(flat), 13)
+        self.assertEqual(flat[0], (-1, "root", None, "", ""))
+        self.assertEqual(flat[2], (1, "Test", {"id": "1"}, "", ""))
+
+        copied = xmltreenode.XMLTreeNode.fromFlat(flat)
+        self.assertEqual(copied.toSimpleString(), root.toSimpleString())
+        self.assertEqual(copied.getParent(), None)
+        self.assertEqual(copied.getTreeNodeByName("SubTest").getParent().getParent().getData(), "ChildB")
+        self.assertEqual(self.b.flatten()[0][0], -1)
+
+    def test_xmltreenode_snapshot(self):
+        root = self.root
+        self.aa.addAttrib("id", "1")
+        self.aa.addAttrib("name", u"\xe4\xe4")
+        self.ca.setValue("a & b")
+        self.ba.tail = "tail"
+        comment = xmltreenode.XMLTreeNode(xml.etree.ElementTree.Comment)
+        comment.setValue(" comment ")
+        self.c.addChild(comment)
+
+        data = snapshot.dumps(root)
+        self.assertEqual(data[:4], snapshot.MAGIC)
+        loaded = snapshot.loads(data)
+        self.assertEqual(loaded.toSimpleString(), root.toSimpleString())
+        self.assertEqual(loaded.getChildren()[1].getChildren()[0].tail, "tail")
+        self.assertEqual(loaded.getChildren()[2].getChildren()[3].tag, xml.etree.ElementTree.Comment)
+
+        out = io.BytesIO()
+        snapshot.dump(self.c, out)
+        out.seek(0)
+        loaded = snapshot.load(out)
+        self.assertEqual(loaded.getParent(), None)
+        self.assertEqual(loaded.toSimpleString(), self.c.toSimpleString())
+
+        wide = xmltreenode.XMLTreeNode("root")
+        for i in range(70000):
+            wide.addChild(xmltreenode.XMLTreeNode("row%d" % (i % 3)))
+        self.assertEqual(snapshot.loads(snapshot.dumps(wide)).toSimpleString(), wide.toSimpleString())
+
+    def test_xmltreenode_pickle(self):
+        import pickle
+        self.aa.addAttrib("id", "1")
+        self.ba.setValue("text")
+        self.ba.tail = "tail"
+        self.ca.extra = "extra"
+        for i in range(10):
+            self.c.addChild(xmltreenode.XMLTreeNode("row"))
+        comment = xml.etree.ElementTree.Comment
+        self.c.addChild(xmltreenode.XMLTreeNode(comment))
+        cloned = self.b.clone()
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(self.root, protocol))
+            self.assertEqual(loaded.toSimpleString(), self.root.toSimpleString())
+            self.assertEqual(loaded.flatten(), self.root.flatten())
+            a, b, c = loaded.getChildren()
+            self.assertEqual(a.getParent(), loaded)
+            self.assertEqual(c.getChildren()[0].extra, "extra")
+            self.assertEqual(c.getChildren()[-1].tag, comment)
+
+            # Children index and shared empty attributes work after loading
+            row = c.getChildren()[5]
+            self.assertTrue(row in c.getChildrenRef())
+            c.removeChild(row)
+            self.assertFalse(row in c.getChildrenRef())
+            row.addAttrib("x", "1")
+            self.assertEqual(c.getChildren()[6].getAttributes(), {})
+
+            loaded = pickle.loads(pickle.dumps(cloned, protocol))
+            self.assertEqual(loaded.toSimpleString(), self.b.toSimpleString())
+            self.assertEqual(loaded.getChildren()[0].getParent(), loaded)
+
+    def test_xmltreenode_snapshot_gc(self):
+        import gc
+        data = snapshot.dumps(self.root)
+        enabled = gc.isenabled()
+        try:
+            # Garbage collection is left as it was before loading
+            for disableGc in (False, True):
+                gc.enable()
+                snapshot.loads(data, disableGc=disableGc)
+                self.assertTrue(gc.isenabled())
+                gc.disable()
+                snapshot.loads(data, disableGc=disableGc)
+                self.assertFalse(gc.isenabled())
+        finally:
+            if enabled:
+                gc.enable()
+
+    def test_xmltreenode_snapshot_invalid(self):
+        data = snapshot.dumps(self.root)
+        self.assertRaisesRegexp(ValueError, 'Not a XMLTreeNode snapshot', snapshot.loads, b'XML' + data[3:])
+        self.assertRaisesRegexp(ValueError, 'Unsupported snapshot version', snapshot.loads, data[:4] + b'\x63\x00' + data[6:])
+        self.assertRaisesRegexp(ValueError, 'truncated or corrupted', snapshot.loads, data[:-1])
+
+        # Parent positions beyond the preceding nodes, or missing from other than the first node
+        stream = len(data) - 5 * 2 * len(self.root.flatten())
+        for node, parent in ((1, 0), (3, 4), (3, 11), (3, 0xffff)):
+            pos = stream + node * 5 * 2
+            corrupted = data[:pos] + struct.pack('=H', parent) + data[pos + 2:]
+            self.assertRaisesRegexp(ValueError, 'truncated or corrupted', snapshot.loads, corrupted)
+
+    def test_xmltreenode_digest_and_isEqual(self):
+        other = self.root.deepcopy()
+        self.assertEqual(len(self.root.digest()), 20)
+        self.assertTrue(self.root.isEqual(other))
+        self.assertNotEqual(self.root.digest(), self.root.digest(ordered=False))
+
+        # Reordered children are equal only when order is ignored
+        c = other.getChildren()[2]
+        ca = c.getChildren()[0]
+        c.removeChild(ca)
+        c.addChild(ca)
+        self.assertFalse(self.root.isEqual(other))
+        self.assertTrue(self.root.isEqual(other, ordered=False))
+
+        # Cached digests are dropped on modification
+        ca.addAttrib("a", "1")
+        self.assertFalse(self.root.isEqual(other, ordered=False))
+        ca.delAttrib("a")
+        self.assertTrue(self.root.isEqual(other, ordered=False))
+        ca.setValue("text")
+        self.assertFalse(self.root.isEqual(other, ordered=False))
+        ca.setValue("")
+        self.assertTrue(self.root.isEqual(other, ordered=False))
+        ca.tail = "tail"
+        self.assertTrue(self.root.isEqual(other, ordered=False))
+        ca.invalidateDigest()
+        self.assertFalse(self.root.isEqual(other, ordered=False))
+
+    def test_xmltreenode_diff(self):
+        other = self.root.deepcopy()
+        self.assertEqual(self.root.diff(other), [])
+
+        a, b, c = other.getChildren()
+        a.getChildren()[0].addAttrib("x", "1")
+        b.removeChild(b.getChildren()[0])
+        new = xmltreenode.XMLTreeNode("New")
+        c.addChild(new)
+
+        changes = [(change, node.getData() if node is not None else None, othernode.getData() if othernode is not None else None)
+                   for change, node, othernode in self.root.diff(other)]
+        self.assertEqual(changes, [
+            ("changed", "Test", "Test"),
+            ("removed", "Test", None),
+            ("added", None, "New")])
+
+        # Unordered diff pairs equal children regardless of position
+        c.removeChild(c.getChildren()[0])
+        c.insertChild(1, xmltreenode.XMLTreeNode("Test"))
+        changes = [(change, node.getData() if node is not None else None, othernode.getData() if othernode is not None else None)
+                   for change, node, othernode in self.root.diff(other, ordered=False)]
+        self.assertEqual(changes, [
+            ("changed", "Test", "Test"),
+            ("removed", "Test", None),
+            ("added", None, "New")])
+
+    def test_xmltreenode_clone(self):
+        self.root.addAttrib("a", "1")
+        self.ba.setValue("text")
+        copied = self.root.clone()
+        self.assertFalse(copied.isCopied())
+        self.assertEqual(copied.toSimpleString(), self.root.toSimpleString())
+        self.assertFalse(copied.isCopied())
+        self.assertTrue(copied.isEqual(self.root))
+
+        # Only the accessed path is copied
+        ba = copied.getChildren()[1].getChildren()[0]
+        ba.setValue("changed")
+        ba.addAttrib("b", "2")
+        self.assertTrue(ba.getRoot() is copied)
+        self.assertTrue(ba.getParent().getParent() is copied)
+        self.assertFalse(ba.isCopied())
+        self.assertFalse(copied.getChildren()[0].isCopied())
+        self.assertEqual(self.ba.getValue(), "text")
+        self.assertFalse(self.ba.isAttrib("b"))
+        self.assertEqual(copied.toSimpleString(), self.root.toSimpleString().replace(
+            '<Test>text<', '<Test b="2">changed<'))
+        self.assertEqual([change[0] for change in copied.diff(self.root)], ["changed"])
+
+        copied.addAttrib("a", "3")
+        self.assertEqual(self.root.getAttrib("a"), "1")
+
+        # Searches do not copy the shared levels, except the ones leading to the results
+        copied = self.root.clone()
+        self.assertEqual(copied.getTreeNodeByName("SubTest2").getData(), "SubTest2")
+        self.assertFalse(copied.getChildren()[0].isCopied())
+        self.assertFalse(copied.getChildren()[2].isCopied())
+        self.assertEqual(copied.getChildren()[2].numChildren(), 3)
+        self.assertFalse(copied.getChildren()[2].isCopied())
+        self.assertEqual(copied.find("ChildC[Other]").getData(), "ChildC")
+        self.assertFalse(copied.getChildren()[2].isCopied())
+        found = copied.getSubTreeNodesByName("Test")
+        self.assertEqual([node.getParent().getData() for node in found], ["ChildA", "ChildB", "ChildC"])
+        self.assertEqual(copied.findall(".//Test"), found)
+        self.assertEqual(list(copied.iter("Test")), found)
+        self.assertTrue(copied.getChildren()[2].isCopied())
+        found[2].setValue("found")
+        found[1].addAttrib("b", "3")
+        self.assertEqual(copied.getNodesByAttrib("b", "3"), [found[1]])
+        self.assertEqual(copied.find(".//Test[@b='3']/SubTest").getParent(), found[1])
+        self.assertEqual(self.ca.getValue(), "")
+        self.assertFalse(self.ba.isAttrib("b"))
+
+        # Modifying the template does not change the copies
+        expected = copied.toSimpleString()
+        self.a.addChild(xmltreenode.XMLTreeNode("New"))
+        self.baa.setValue("modified")
+        self.ab.setData("Renamed")
+        self.assertEqual(copied.toSimpleString(), expected)
+        self.assertEqual(len(copied.getChildren()[0].getChildren()), 2)
+        self.assertEqual(copied.getTreeNodeByName("SubTest").getValue(), "")
+
+        # Later copies are taken of the modified template
+        again = self.root.clone()
+        self.assertEqual(again.toSimpleString(), self.root.toSimpleString())
+        self.assertTrue(again.isEqual(self.root))
+        self.assertEqual(again.getChildren()[0].numChildren(), 3)
+
+    def test_xmltreenode_freeze(self):
+        from xmltreenode import columnar
+        self.aa.addAttrib("id", "1")
+        self.ba.setValue("text")
+        self.ba.tail = "tail"
+        comment = xmltreenode.XMLTreeNode(xml.etree.ElementTree.Comment)
+        comment.setValue(" comment ")
+        self.c.addChild(comment)
+
+        doc = self.root.freeze()
+        self.assertEqual(len(doc), sum(1 for node in self.root.iter()))
+        root = doc.getRoot()
+        self.assertEqual(root.toSimpleString(), self.root.toSimpleString())
+        self.assertEqual(doc.flatten(), self.root.flatten())
+        self.assertEqual(root.getParent(), None)
+
+        for node, frozen in zip(self.root.iter(), root.iter()):
+            self.assertEqual(frozen.getData(), node.getData())
+            self.assertEqual(frozen.getValue(), node.getValue())
+            self.assertEqual(frozen.tail, node.tail)
+            self.assertEqual(frozen.getAttributes(), node.getAttributes())
+            self.assertEqual([child.getData() for child in frozen.getChildren()],
+                             [child.getData() for child in node.getChildren()])
+            self.assertEqual(frozen.numChildren(), node.numChildren())
+            for name in ("Test", "ChildA", "Other", "missing"):
+                self.assertEqual([found.flatten() for found in frozen.getSubTreeNodesByName(name)],
+                                 [found.flatten() for found in node.getSubTreeNodesByName(name)])
+                self.assertEqual(len(list(frozen.iter(name))), len(list(node.iter(name))))
+
+        aa = root.getChildren()[0].getChildren()[0]
+        self.assertEqual(aa.getAttrib("id"), "1")
+        self.assertEqual(aa.getAttribSafe("x"), None)
+        self.assertRaises(KeyError, aa.getAttrib, "x")
+        self.assertEqual(aa.getParent().getParent(), root)
+        self.assertEqual(root.getTreeNodeByName(self.aa.getData()), aa)
+        self.assertEqual(root.getChildren()[2].getChildren()[-1].tag, xml.etree.ElementTree.Comment)
+
+        tree = root.getChildren()[1].toTree()
+        self.assertEqual(tree.getParent(), None)
+        self.assertEqual(tree.toSimpleString(), self.b.toSimpleString())
+
+        doc = columnar.load("<r><a x='1'>t<b /></a><c /></r>", sourceIsFile=False, exclude=["c"])
+        self.assertEqual(doc.getRoot().toSimpleString(), '<r><a x="1">t<b /></a></r>')
+        self.assertTrue(doc.memoryUsage() > 0)
+
+    def test_xmltreenode_columnar_load(self):
+        from xmltreenode import columnar, instrument
+        docs = [
+            "<r><a x='1' y='2'>t<b /></a><c /></r>",
+            "<!-- pre --><r>\n  <a>x\n    y &amp; <b>z</b> \n  tail</a><!-- c -->\n  after  <c/>\n</r><!-- post -->\n",
+            "<r><a> &lt; </a><a><![CDATA[ x ]]> y</a>\u00e4</r>",
+        ]
+        options = [{}, {'exclude': ['b']}, {'include': ['a/b']}]
+
+        for data in docs:
+            data = data.encode('utf-8')
+            for opts in options:
+                expected = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False, **opts).getRoot()
+                with instrument.instrumented() as registry:
+                    doc = columnar.load(data, sourceIsFile=False, **opts)
+                # Built from the events without the tree
+                self.assertEqual(registry.getCounter('node.appendValue'), 0)
+                self.assertEqual(doc.flatten(), columnar.fromTree(expected).flatten())
+
+        self.assertRaises(ValueError, columnar.load, '<a><b></a>', sourceIsFile=False)
+
+    def test_xmltreenode_instrument(self):
+        from xmltreenode import instrument
+        data = "<root><a><b>1</b><b>2</b></a><!-- c --><b>3</b></root>"
+
+        self.assertFalse(instrument.isEnabled())
+        with instrument.instrumented() as registry:
+            self.assertTrue(instrument.isEnabled())
+            root = xmltreenode.CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+            self.assertEqual(len(root.getSubTreeNodesByName('b')), 3)
+            out = root.toSimpleString()
+        self.assertFalse(instrument.isEnabled())
+
+        # Not measured when disabled
+        xmltreenode.CustomXMLParser().load(data, sourceIsFile=False)
+
+        self.assertEqual(registry.getCounter('parser.nodes'), 5)
+        self.assertEqual(registry.getCounter('parser.bytes') + registry.getCounter('parser.characters'), len(data))
+        self.assertEqual(registry.getTimer('parser.start')[0], 5)
+        self.assertEqual(registry.getTimer('parser.parse')[0], 1)
+        self.assertEqual(registry.getTimer('search.getSubTreeNodesByName')[0], 1)
+        self.assertEqual(registry.getCounter('walk.nodes'), 6)
+        # Values of the three b elements and text of the comment
+        self.assertEqual(registry.getCounter('node.appendValue'), 4)
+        self.assertEqual(registry.getCounter('serialize.bytes'), len(out))
+
+        values = registry.asDict()
+        self.assertEqual(values['parser.nodes'], 5)
+        self.assertEqual(values['serialize.write.calls'], 1)
+        self.assertTrue(values['parser.parse.seconds'] >= 0)
+
+        registry.reset()
+        self.assertEqual(registry.asDict(), {})
+
+        # Text is counted in characters, encoded text in bytes
+        with instrument.instrumented() as registry:
+            xmltreenode.CustomXMLParser().load(u'<a>\u00e4</a>'.encode('utf-8'), sourceIsFile=False)
+            parser = xmltreenode.CustomXMLParser()
+            parser.feed(u'<a>xx</a>')
+            parser.close()
+        self.assertEqual(registry.getCounter('parser.bytes'), 9)
+        self.assertEqual(registry.getCounter('parser.characters'), 9)
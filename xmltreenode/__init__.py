@@ -1,4 +1,4 @@
-from xmltreenode import XMLTreeNode
+from xmltreenode import XMLTreeNode, XMLTreeNodeChildren
 from xmlparser import CustomXMLParser
 
-__all__ = ["XMLTreeNode", "CustomXMLParser"]
+__all__ = ["XMLTreeNode", "XMLTreeNodeChildren", "CustomXMLParser"]
@@ -0,0 +1,70 @@
+"""@package asyncparser
+Incremental parsing of XML received from asyncio streams, requires Python 3.6 or later.
+Module is left out when installing with older Python versions, see setup.py.
+Data is parsed as it arrives, so parsing overlaps with receiving the rest.
+"""
+
+from xmlparser import CustomXMLParser, detachStreamed
+
+# Maximum size of one read from stream
+READ_SIZE = 65536
+
+
+async def parseStream(reader, parser=None, readSize=READ_SIZE):
+    """ Parse XML document from stream until end of the stream
+
+    @param reader asyncio.StreamReader or other object with coroutine read(size)
+    @param parser CustomXMLParser instance to use, new one is created by default
+    @param readSize Maximum size of one read
+    @returns CustomXMLParser instance containing the loaded document
+    """
+    if parser is None:
+        parser = CustomXMLParser()
+
+    while True:
+        data = await reader.read(readSize)
+        if not data:
+            break
+        parser.feed(data)
+
+    # Empty stream is reported as invalid input as well
+    parser.feed(b'')
+    return parser.close()
+
+
+async def iterStream(reader, tag, parser=None, detach=True, readSize=READ_SIZE):
+    """ Parse XML document from stream, yielding every element with the given tag
+    as soon as it's closed, while the rest is still being received.
+    See CustomXMLParser.iterLoad.
+
+    @param reader asyncio.StreamReader or other object with coroutine read(size)
+    @param tag Tag name of the elements to yield
+    @param parser CustomXMLParser instance to use, new one is created by default
+    @param detach If True, yielded element is removed from its parent after it has been handled
+    @param readSize Maximum size of one read
+    @returns Asynchronous generator of XMLTreeNode instances with the given tag
+    """
+    if parser is None:
+        parser = CustomXMLParser()
+
+    parser.setStreamTag(tag)
+    try:
+        while True:
+            data = await reader.read(readSize)
+            if not data:
+                break
+            parser.feed(data)
+            for node in parser.readNodes(False):
+                yield node
+                if detach:
+                    detachStreamed(node, tag)
+
+        # Empty stream is reported as invalid input as well
+        parser.feed(b'')
+        parser.close()
+        for node in parser.readNodes(False):
+            yield node
+            if detach:
+                detachStreamed(node, tag)
+    finally:
+        parser.setStreamTag(None)
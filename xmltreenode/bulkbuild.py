@@ -0,0 +1,181 @@
+"""@package bulkbuild
+Tree construction with the C accelerated ElementTree TreeBuilder
+
+CustomXMLParser is the target of the XML parser, so every start, data and end
+event is a call to Python. Here the parser builds a plain ElementTree in C instead,
+which is then converted to XMLTreeNode tree in one pass, see CustomXMLParser.load.
+
+Trees are identical to the ones built from parser events, TreeBuilder joins
+the text between events the same way as CustomXMLParser, see textrules.
+Comments outside the root element are not kept by TreeBuilder, such documents
+are parsed from the events as before.
+"""
+
+import sys
+from compat import text_type
+from textrules import keepText
+from xml.etree.ElementTree import Comment
+
+if sys.version_info < (3, 3):
+    from xml.etree.cElementTree import TreeBuilder, XMLParser
+else:
+    from xml.etree.ElementTree import TreeBuilder, XMLParser
+
+try:
+    TreeBuilder(insert_comments=True)
+    COMMENTS_SUPPORTED = True
+except TypeError:
+    COMMENTS_SUPPORTED = False
+
+# Comment start
+_COMMENT = u'<!--'
+_COMMENT_BYTES = b'<!--'
+
+
+def canBuild(source):
+    """ Check if document can be built with TreeBuilder identically to the parser events
+
+    @param source XML document as string, bytes or mmap object
+    @returns True if TreeBuilder can be used, False otherwise
+    """
+    if COMMENTS_SUPPORTED:
+        return True
+    sub = _COMMENT if isinstance(source, text_type) else _COMMENT_BYTES
+    return source.find(sub) < 0
+
+
+def newParser():
+    """ Create parser building ElementTree with comments
+
+    @returns XMLParser instance, feed it and close it to get the root element
+    """
+    if COMMENTS_SUPPORTED:
+        return XMLParser(target=TreeBuilder(insert_comments=True))
+    return XMLParser(target=TreeBuilder())
+
+
+def _countComments(source):
+    """ Count comments in document
+
+    @param source XML document as string, bytes or mmap object
+    @returns Number of comment starts
+    """
+    sub = _COMMENT if isinstance(source, text_type) else _COMMENT_BYTES
+    count = 0
+    pos = source.find(sub)
+    while pos >= 0:
+        count += 1
+        pos = source.find(sub, pos + 4)
+    return count
+
+
+def convert(root, source, internTable=None, internValues=()):
+    """ Convert ElementTree to XMLTreeNode tree. Tree is flattened, see XMLTreeNode.fromFlat.
+    Comments outside the root element are not kept by TreeBuilder, None is returned
+    if there were any.
+
+    @param root Root Element built by the parser from newParser
+    @param source The parsed document
+    @param internTable Intern table, see CustomXMLParser
+    @param internValues Names of attributes whose values are interned, or True for all attributes
+    @returns List of flattened nodes, None if tree can't be converted
+    """
+    flat = []
+    append = flat.append
+    # Tails are text of the parent, collected by position of the parent
+    tails = {}
+    comments = _countComments(source) if COMMENTS_SUPPORTED else 0
+    found = 0
+    intern = internTable.setdefault if internTable is not None else None
+    afterComment = False
+
+    # Stack of elements with position of their parent. Tails after comments are kept whole,
+    # and the mode is known only after the subtree, so with comments the tails
+    # are handled at exit markers, which have negative position.
+    stack = [(root, -1)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        elem, parent = pop()
+        if parent < -1:
+            _addTail(tails, -parent - 2, elem.tail, afterComment)
+            continue
+
+        pos = len(flat)
+        if elem.tag is Comment:
+            found += 1
+            afterComment = True
+            append((parent, Comment, None, elem.text, None))
+        else:
+            afterComment = False
+            append(_element(elem, parent, intern, internValues))
+
+        if elem.tail and parent >= 0:
+            if comments:
+                push((elem, -parent - 2))
+            else:
+                _addTail(tails, parent, elem.tail, False)
+        if len(elem):
+            stack.extend([(child, pos) for child in reversed(elem)])
+
+    if found != comments:
+        return None
+
+    for pos, parts in tails.items():
+        parent, tag, attrib, text, tail = flat[pos]
+        if text:
+            parts.insert(0, text)
+        flat[pos] = (parent, tag, attrib, ''.join(parts), None)
+    return flat
+
+
+def _element(elem, parent, intern, internValues):
+    """ Flattened node of element, see XMLTreeNode.fromFlat
+
+    @param elem Element
+    @param parent Position of the parent in the flattened tree
+    @param intern setdefault of the intern table, or None
+    @param internValues Names of attributes whose values are interned, or True for all attributes
+    @returns Tuple of parent position, tag, attributes, text and tail
+    """
+    tag = elem.tag
+    text = elem.text
+    attrib = elem.attrib
+    if intern is not None:
+        tag = intern(tag, tag)
+        if attrib:
+            attrib = _internAttrib(attrib, intern, internValues)
+    if text:
+        text = keepText(text) or None
+    return (parent, tag, attrib or None, text, None)
+
+
+def _addTail(tails, parent, tail, whole):
+    """ Add tail of element to the text of its parent
+
+    @param tails Dictionary from parent positions to lists of texts
+    @param parent Position of the parent in the flattened tree
+    @param tail Tail of the element
+    @param whole True to keep the tail as is, like after comments
+    """
+    if not whole:
+        tail = keepText(tail)
+    if tail:
+        tails.setdefault(parent, []).append(tail)
+
+
+def _internAttrib(attrib, intern, internValues):
+    """ Replace attribute keys, and values of the selected attributes, with the equal strings from intern table
+
+    @param attrib Attribute dictionary
+    @param intern setdefault of the intern table
+    @param internValues Names of attributes whose values are interned, or True for all attributes
+    @returns New attribute dictionary
+    """
+    res = {}
+    for key, value in attrib.items():
+        key = intern(key, key)
+        if internValues is True or (internValues and key in internValues):
+            value = intern(value, value)
+        res[key] = value
+    return res
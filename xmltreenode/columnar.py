@@ -0,0 +1,592 @@
+"""@package columnar
+Read-only columnar representation of XMLTreeNode trees, for analytics on huge documents
+
+Instead of one object per node the document is stored in arrays indexed by
+node position in document order:
+  tags          String id of the tag
+  parents       Position of the parent, -1 for the root
+  firstChilds   Position of the first child, -1 if none
+  nextSiblings  Position of the next sibling, -1 if none
+  texts, tails  String ids of text and tail
+  attribs       Offset of the first attribute of the node in attribute key and value arrays,
+                attributes of node i are between attribs[i] and attribs[i + 1]
+Every distinct string is stored only once in the string table.
+Subtree of a node is the range of positions from the node to the first node after it,
+so searching by tag only needs the sorted positions of the tag, which are collected
+from the tag array on the first search.
+
+ColumnarNode is a lightweight proxy of a node position, it has the read methods of
+XMLTreeNode. Proxies are created when needed and equal proxies refer to the same node.
+
+@code
+doc = columnar.load('huge.xml')
+for item in doc.getRoot().getSubTreeNodesByName('item'):
+    print(item.getAttribSafe('id'))
+@endcode
+"""
+
+import sys
+from array import array
+from bisect import bisect_left
+from xml.etree.ElementTree import Comment
+from textrules import keepText
+from xmltreenode import XMLTreeNode
+
+# Array type code of signed 32 bit integers
+_INT32 = 'i' if array('i').itemsize == 4 else 'l'
+
+
+class ColumnarDocument(object):
+    """ Frozen document stored in arrays, see module description
+    """
+
+    def __init__(self, flat):
+        """ Initialize from list created by XMLTreeNode.flatten, or from closed ColumnarBuilder
+
+        @param flat List of flattened nodes in document order, or ColumnarBuilder instance
+        """
+        if isinstance(flat, ColumnarBuilder):
+            builder = flat
+        else:
+            builder = ColumnarBuilder()
+            for parent, tag, attrib, text, tail in flat:
+                builder.addNode(parent, tag, attrib, text, tail)
+            builder.finish()
+        if not builder._tags:
+            raise ValueError('Can not create empty columnar document')
+
+        self._strings = builder._strings
+        self._tagIds = builder._tagIds
+        self._tags = builder._tags
+        self._parents = builder._parents
+        self._firstChilds = builder._firstChilds
+        self._nextSiblings = builder._nextSiblings
+        self._texts = builder._texts
+        self._tails = builder._tails
+        self._attribs = builder._attribs
+        self._attribKeys = builder._attribKeys
+        self._attribValues = builder._attribValues
+        # Positions of nodes by tag string id, created on first search
+        self._positions = None
+
+    @staticmethod
+    def fromTree(node):
+        """ Create columnar document of tree
+
+        @param node Top XMLTreeNode of the tree
+        @returns ColumnarDocument instance
+        """
+        return ColumnarDocument(node.flatten())
+
+    def __len__(self):
+        """ Number of nodes
+
+        @returns Number of nodes in the document
+        """
+        return len(self._tags)
+
+    def getRoot(self):
+        """ Get the root node
+
+        @returns ColumnarNode of the root
+        """
+        return ColumnarNode(self, 0)
+
+    def node(self, pos):
+        """ Get node by position
+
+        @param pos Position of the node in document order
+        @returns ColumnarNode instance
+        """
+        if not 0 <= pos < len(self._tags):
+            raise IndexError('Node position out of range: %d' % (pos))
+        return ColumnarNode(self, pos)
+
+    def subtreeEnd(self, pos):
+        """ Get the position after the subtree of a node
+
+        @param pos Position of the node
+        @returns Position of the first node after the subtree
+        """
+        parents = self._parents
+        nextSiblings = self._nextSiblings
+        while pos >= 0:
+            sibling = nextSiblings[pos]
+            if sibling >= 0:
+                return sibling
+            pos = parents[pos]
+        return len(parents)
+
+    def flatten(self, pos=0):
+        """ Flatten subtree to a list of plain tuples, see XMLTreeNode.flatten
+
+        @param pos Position of the top node of the subtree
+        @returns List of tuples of parent position, tag, attributes, text and tail in document order
+        """
+        strings = self._strings
+        parents = self._parents
+        flat = []
+        for i in range(pos, self.subtreeEnd(pos)):
+            parent = parents[i] - pos if i != pos else -1
+            flat.append((parent, strings[self._tags[i]], self._attribDict(i) or None,
+                         strings[self._texts[i]], strings[self._tails[i]]))
+        return flat
+
+    def toTree(self, pos=0):
+        """ Create XMLTreeNode tree of subtree
+
+        @param pos Position of the top node of the subtree
+        @returns Root XMLTreeNode of the new tree
+        """
+        return XMLTreeNode.fromFlat(self.flatten(pos))
+
+    def memoryUsage(self):
+        """ Get memory used by the arrays and the string table, excluding the strings themselves
+
+        @returns Size in bytes
+        """
+        arrays = (self._tags, self._parents, self._firstChilds, self._nextSiblings, self._texts,
+                  self._tails, self._attribs, self._attribKeys, self._attribValues)
+        return sum(sys.getsizeof(items) for items in arrays) + sys.getsizeof(self._strings)
+
+    def _attribDict(self, pos):
+        """ Get attributes of node as a new dictionary
+
+        @param pos Position of the node
+        @returns Dictionary of attributes
+        """
+        strings = self._strings
+        keys = self._attribKeys
+        values = self._attribValues
+        return dict((strings[keys[i]], strings[values[i]])
+                    for i in range(self._attribs[pos], self._attribs[pos + 1]))
+
+    def _findAttrib(self, pos, key):
+        """ Find attribute of node
+
+        @param pos Position of the node
+        @param key Attribute name
+        @returns String id of the value, -1 if not found
+        """
+        strings = self._strings
+        keys = self._attribKeys
+        for i in range(self._attribs[pos], self._attribs[pos + 1]):
+            if strings[keys[i]] == key:
+                return self._attribValues[i]
+        return -1
+
+    def _findByTag(self, start, end, tag):
+        """ Find nodes by tag
+
+        @param start First position to search
+        @param end Position after the last position to search
+        @param tag Tag name
+        @returns List of ColumnarNode instances in document order
+        """
+        key = self._tagIds.get(tag)
+        if key is None:
+            return []
+        if self._positions is None:
+            positions = {}
+            for pos, value in enumerate(self._tags):
+                found = positions.get(value)
+                if found is None:
+                    found = positions[value] = array(_INT32)
+                found.append(pos)
+            self._positions = positions
+        positions = self._positions[key]
+        first = bisect_left(positions, start)
+        last = bisect_left(positions, end, first)
+        return [ColumnarNode(self, pos) for pos in positions[first:last]]
+
+
+class ColumnarBuilder(object):
+    """ Builds the arrays of ColumnarDocument node by node. As parser target it builds the
+    document straight from the parser events, without creating XMLTreeNode instances,
+    and keeps text the same way as CustomXMLParser, see textrules and load.
+    """
+
+    def __init__(self):
+        """ Initialize
+        """
+        self._strings = ['']
+        self.__ids = {'': 0}
+        self._tagIds = {}
+        self._tags = array(_INT32)
+        self._parents = array(_INT32)
+        self._firstChilds = array(_INT32)
+        self._nextSiblings = array(_INT32)
+        self._texts = array(_INT32)
+        self._tails = array(_INT32)
+        self._attribs = array(_INT32)
+        self._attribKeys = array(_INT32)
+        self._attribValues = array(_INT32)
+        self.__lastChilds = array(_INT32)
+        # Text chunks of nodes by position, joined when the document is finished
+        self.__textChunks = {}
+
+        # Position of the current node, tag of the last started element or Comment,
+        # and text of comments before the root, like in CustomXMLParser
+        self.__node = -1
+        self.__name = ''
+        self.__rootComments = []
+        # Text pieces reported since the last event, see textrules
+        self.__pending = []
+
+    def __intern(self, value):
+        """ Get string id of value, adding it to the string table if needed
+
+        @param value String
+        @returns String id
+        """
+        key = self.__ids.get(value)
+        if key is None:
+            key = self.__ids[value] = len(self._strings)
+            self._strings.append(value)
+        return key
+
+    def addNode(self, parent, tag, attrib=None, text='', tail=''):
+        """ Add node after the nodes added before, in document order
+
+        @param parent Position of the parent, -1 for the root
+        @param tag Tag of the node
+        @param attrib Dictionary of attributes or None
+        @param text Text of the node
+        @param tail Tail of the node
+        @returns Position of the node
+        """
+        intern = self.__intern
+        pos = len(self._tags)
+        key = intern(tag)
+        self._tagIds[tag] = key
+        self._tags.append(key)
+        self._parents.append(parent)
+        self._firstChilds.append(-1)
+        self._nextSiblings.append(-1)
+        self.__lastChilds.append(-1)
+        if parent >= 0:
+            last = self.__lastChilds[parent]
+            if last < 0:
+                self._firstChilds[parent] = pos
+            else:
+                self._nextSiblings[last] = pos
+            self.__lastChilds[parent] = pos
+        self._texts.append(intern(text))
+        self._tails.append(intern(tail))
+        self._attribs.append(len(self._attribKeys))
+        if attrib:
+            for name, value in attrib.items():
+                self._attribKeys.append(intern(name))
+                self._attribValues.append(intern(value))
+        return pos
+
+    def finish(self):
+        """ Join the text collected from parser events and end the arrays,
+        no nodes can be added after this
+        """
+        for pos, chunks in self.__textChunks.items():
+            self._texts[pos] = self.__intern(''.join(chunks))
+        self.__textChunks = {}
+        self.__lastChilds = None
+        self._attribs.append(len(self._attribKeys))
+
+    def start(self, tag, attrib):
+        if self.__pending:
+            self.__flushData()
+        self.__name = tag
+        parent = self.__node
+        pos = self.__node = self.addNode(parent, tag, attrib)
+        if parent < 0:
+            for text in self.__rootComments:
+                self.addNode(pos, Comment, None, text)
+            self.__rootComments = []
+
+    def end(self, tag):
+        if self.__pending:
+            self.__flushData()
+        node = self.__node
+        if node >= 0:
+            parent = self._parents[node]
+            if parent >= 0:
+                self.__node = parent
+
+    def data(self, data):
+        if self.__name == Comment:
+            if data and self.__node >= 0:
+                self.__textChunks.setdefault(self.__node, []).append(data)
+            return
+        if data and self.__name:
+            self.__pending.append(data)
+
+    def __flushData(self):
+        """ Add the text reported since the last event to the current node
+        """
+        text = keepText(''.join(self.__pending))
+        self.__pending = []
+        if text:
+            self.__textChunks.setdefault(self.__node, []).append(text)
+
+    def comment(self, data):
+        if self.__pending:
+            self.__flushData()
+        self.__name = Comment
+        if self.__node >= 0:
+            self.addNode(self.__node, Comment, None, data)
+        else:
+            self.__rootComments.append(data)
+
+    def skipTag(self, tag):
+        """ Called by filtering targets after a skipped subtree, see CustomXMLParser.skipTag
+
+        @param tag Tag name of the last element in the subtree, or Comment if comment was the last
+        """
+        if self.__pending:
+            self.__flushData()
+        self.__name = tag
+
+    def close(self):
+        """ Called when parsing is finished
+
+        @returns ColumnarDocument instance
+        """
+        if self.__pending:
+            self.__flushData()
+        self.finish()
+        return ColumnarDocument(self)
+
+
+class ColumnarNode(object):
+    """ Read-only proxy of a node in ColumnarDocument, with the read methods of XMLTreeNode
+    """
+    __slots__ = ('document', 'pos')
+
+    def __init__(self, document, pos):
+        """ Initialize
+
+        @param document ColumnarDocument instance
+        @param pos Position of the node in document order
+        """
+        self.document = document
+        self.pos = pos
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnarNode) and self.document is other.document and self.pos == other.pos
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.document), self.pos))
+
+    @property
+    def tag(self):
+        return self.document._strings[self.document._tags[self.pos]]
+
+    @property
+    def text(self):
+        return self.document._strings[self.document._texts[self.pos]]
+
+    @property
+    def tail(self):
+        return self.document._strings[self.document._tails[self.pos]]
+
+    @property
+    def attrib(self):
+        return self.document._attribDict(self.pos)
+
+    def getData(self):
+        """ Get the data under this node
+
+        @returns Tag of the node
+        """
+        return self.tag
+
+    def isData(self, name):
+        """ Compare the data on this node to name
+
+        @param name The name to compare
+        @returns True if name matches to the data, False otherwise
+        """
+        return self.tag == name
+
+    def getValue(self):
+        """ Return value of the node
+
+        @returns Text of the node
+        """
+        return self.text
+
+    def getAttrib(self, key):
+        """ Get attribute value by name
+        @param key Attribute name
+        @returns Attribute value or raises KeyError
+        """
+        value = self.document._findAttrib(self.pos, key)
+        if value < 0:
+            raise KeyError(key)
+        return self.document._strings[value]
+
+    def getAttribSafe(self, key):
+        """ Get attribute value by name or None if not found
+        @param key Attribute name
+        @returns Attribute value or None
+        """
+        value = self.document._findAttrib(self.pos, key)
+        if value < 0:
+            return None
+        return self.document._strings[value]
+
+    def isAttrib(self, key):
+        """ Check if node has attribute
+        @param key Attribute name
+        @returns True if found, False otherwise
+        """
+        return self.document._findAttrib(self.pos, key) >= 0
+
+    def getAttributes(self):
+        """ Get all attributes as a new dictionary
+        @returns Dictionary containing all attributes
+        """
+        return self.attrib
+
+    def items(self):
+        """ Get all attribute items
+
+        @returns List of all attribute items
+        """
+        return list(self.attrib.items())
+
+    def getParent(self):
+        """ Return node parent
+
+        @returns ColumnarNode if this node has a parent, None if this is the root node
+        """
+        parent = self.document._parents[self.pos]
+        if parent < 0:
+            return None
+        return ColumnarNode(self.document, parent)
+
+    def getRoot(self):
+        """ Get the root node
+        @returns Root ColumnarNode of the document
+        """
+        return ColumnarNode(self.document, 0)
+
+    def getChildren(self):
+        """ Get list of children
+
+        @returns List of ColumnarNode instances
+        """
+        document = self.document
+        nextSiblings = document._nextSiblings
+        children = []
+        child = document._firstChilds[self.pos]
+        while child >= 0:
+            children.append(ColumnarNode(document, child))
+            child = nextSiblings[child]
+        return children
+
+    def numChildren(self):
+        """ Return the number of children under this node
+
+        @returns Number of children
+        """
+        nextSiblings = self.document._nextSiblings
+        count = 0
+        child = self.document._firstChilds[self.pos]
+        while child >= 0:
+            count += 1
+            child = nextSiblings[child]
+        return count
+
+    def __len__(self):
+        return self.numChildren()
+
+    def __iter__(self):
+        return iter(self.getChildren())
+
+    def iter(self, tag=None):
+        """ Iterate this node and its subtree in document order
+
+        @param tag Tag name, None or '*' for all nodes
+        @returns Iterator of ColumnarNode instances
+        """
+        document = self.document
+        end = document.subtreeEnd(self.pos)
+        if tag is None or tag == '*':
+            return (ColumnarNode(document, pos) for pos in range(self.pos, end))
+        return iter(document._findByTag(self.pos, end, tag))
+
+    def getSubTreeNodesByName(self, name):
+        """ Get all nodes in the subtree of this node, excluding this node, which have given tag
+
+        @param name Tag to be searched for
+        @returns List of ColumnarNode instances in document order
+        """
+        return self.document._findByTag(self.pos + 1, self.document.subtreeEnd(self.pos), name)
+
+    def getSelfAndSubTreeNodesByName(self, name):
+        """ Get this node and all nodes in its subtree which have given tag
+
+        @param name Tag to be searched for
+        @returns List of ColumnarNode instances in document order
+        """
+        return self.document._findByTag(self.pos, self.document.subtreeEnd(self.pos), name)
+
+    def getTreeNodeByName(self, name):
+        """ Get first node, this node or one in its subtree, which has given tag
+
+        @param name Tag to be searched for
+        @returns ColumnarNode instance or None if not found
+        """
+        found = self.getSelfAndSubTreeNodesByName(name)
+        if found:
+            return found[0]
+        return None
+
+    def flatten(self):
+        """ Flatten the subtree to a list of plain tuples, see XMLTreeNode.flatten
+
+        @returns List of tuples of parent position, tag, attributes, text and tail in document order
+        """
+        return self.document.flatten(self.pos)
+
+    def toTree(self):
+        """ Create modifiable XMLTreeNode copy of the subtree
+
+        @returns Root XMLTreeNode of the new tree
+        """
+        return self.document.toTree(self.pos)
+
+    def toSimpleString(self):
+        """ Convert to XML string, does not do any formatting
+
+        @returns XML presentation of the subtree
+        """
+        return self.toTree().toSimpleString()
+
+    def __repr__(self):
+        return "%x %s %d" % (id(self.document), ("%s" % self.tag).replace(" ", ""), self.pos)
+
+
+def fromTree(node):
+    """ Create columnar document of tree
+
+    @param node Top XMLTreeNode of the tree
+    @returns ColumnarDocument instance
+    """
+    return ColumnarDocument.fromTree(node)
+
+
+def load(xmlfile, sourceIsFile=True, **options):
+    """ Parse XML file or raw text straight to columnar document, without building XMLTreeNode tree,
+    see ColumnarBuilder
+
+    @param xmlfile Input XML file
+    @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
+    @param **options Other options of CustomXMLParser.parseTarget: useMmap, chunkSize, include and exclude
+    @returns ColumnarDocument instance, None if nothing was parsed
+    """
+    from xmlparser import CustomXMLParser
+
+    return CustomXMLParser().parseTarget(ColumnarBuilder(), xmlfile, sourceIsFile, **options)
@@ -0,0 +1,21 @@
+"""@package compat
+Definitions shared by the modules supporting both Python 2 and 3
+"""
+
+import sys
+import xml.etree.ElementTree
+
+if sys.version >= '3':
+    string_types = (str,)
+    text_type = str
+else:
+    string_types = (str, unicode)  # NOQA
+    text_type = unicode  # NOQA
+
+# Tags of comments and processing instructions, cElementTree has its own factories before Python 3.3
+COMMENTS = (xml.etree.ElementTree.Comment,)
+PROCESSING_INSTRUCTIONS = (xml.etree.ElementTree.ProcessingInstruction,)
+if sys.version < '3.3':
+    import xml.etree.cElementTree
+    COMMENTS += (xml.etree.cElementTree.Comment,)
+    PROCESSING_INSTRUCTIONS += (xml.etree.cElementTree.ProcessingInstruction,)
@@ -0,0 +1,149 @@
+"""@package cowclone
+Copy-on-write cloning of XMLTreeNode trees
+
+Clone of a tree starts as a single node sharing the children of the template.
+Children are copied one level at a time, only when they are needed as nodes
+of the clone: when they are modified, or returned by getChildren or searches.
+Searches, serializing and hashing read the shared subtrees without copying them,
+so subtrees which are never touched stay shared with the template.
+
+Clones share a snapshot of the template instead of the template itself,
+so the template can be modified freely after cloning. Snapshot is taken when
+the template is cloned the first time, and reused by later clones until
+the digest of the template changes, see XMLTreeNode.digest.
+"""
+
+import weakref
+import treehash
+from traversal import sharedChildren
+from xmltreenode import XMLTreeNode, XMLTreeNodeChildren
+
+_childrenSlot = XMLTreeNode._children
+
+# Shared placeholders of nodes without attributes or children
+_EMPTY_ATTRIB = XMLTreeNode()._attrib
+_EMPTY_CHILDREN = XMLTreeNode()._children
+
+# Snapshots of cloned templates, with digests of the templates when they were taken
+_snapshots = weakref.WeakKeyDictionary()
+
+
+def clone(node, snapshot=True):
+    """ Clone tree with copy-on-write
+
+    @param node Top XMLTreeNode of the template tree
+    @param snapshot If False, clone shares node itself instead of its snapshot.
+        Node must never be modified after that, like documents owned by doccache
+    @returns ClonedXMLTreeNode, root of the independent copy
+    """
+    if snapshot:
+        digest = treehash.update(node)
+        entry = _snapshots.get(node)
+        if entry is None or entry[0] != digest:
+            entry = (digest, _snapshot(node))
+            _snapshots[node] = entry
+        node = entry[1]
+    return _cloneNode(node, None)
+
+
+def _snapshot(node):
+    """ Copy tree which has cached digests, including the digests
+
+    @param node Top XMLTreeNode of the tree
+    @returns XMLTreeNode, top of the copy
+    """
+    res = _copyNode(XMLTreeNode, node, None)
+    stack = [(node, res)]
+    while stack:
+        item, copied = stack.pop()
+        children = sharedChildren(item)
+        if not children:
+            continue
+        copiedChildren = [_copyNode(XMLTreeNode, child, copied) for child in children]
+        _childrenSlot.__set__(copied, XMLTreeNodeChildren(copiedChildren))
+        stack.extend(zip(children, copiedChildren))
+    return res
+
+
+def _copyNode(cls, template, parent):
+    """ Create copy of node without children, bypassing __init__ and reparent.
+    Digest is copied too, as the contents are equal.
+
+    @param cls Class of the copy
+    @param template XMLTreeNode to copy
+    @param parent Parent XMLTreeNode of the copy, or None
+    @returns Instance of cls
+    """
+    node = object.__new__(cls)
+    node.tag = template.tag
+    attrib = template._attrib
+    node._attrib = attrib.copy() if attrib else _EMPTY_ATTRIB
+    _childrenSlot.__set__(node, _EMPTY_CHILDREN)
+    node._text = template.text
+    node._textChunks = None
+    node.tail = template.tail
+    node._index = None
+    node._digest = template._digest
+    node._XMLTreeNode__parent = parent
+    node._XMLTreeNode__nodeType = None
+    return node
+
+
+def _cloneNode(template, parent):
+    """ Create clone of node, sharing its children
+
+    @param template XMLTreeNode
+    @param parent Parent ClonedXMLTreeNode of the clone, or None
+    @returns ClonedXMLTreeNode
+    """
+    node = _copyNode(ClonedXMLTreeNode, template, parent)
+    node._template = template if sharedChildren(template) else None
+    return node
+
+
+class ClonedXMLTreeNode(XMLTreeNode):
+    """ XMLTreeNode which shares its children with the template it was cloned from,
+    until the children are needed as nodes the first time.
+    Tag, attributes, text and tail are copied from the beginning.
+    """
+    __slots__ = ('_template', )
+
+    def __init__(self, tag=None, attrib={}, **extra):
+        """ Initialize
+
+        @param tag Setup the data of this node, can be overridden later with setData
+        @param attrib Element attribute dictionary
+        @param **extra Additional attributes, given as keyword arguments
+        """
+        self._template = None
+        XMLTreeNode.__init__(self, tag, attrib, **extra)
+
+    def isCopied(self):
+        """ Check if children have been copied from the template
+
+        @returns True if children are copied, False otherwise
+        """
+        return self._template is None
+
+    def copyChildren(self):
+        """ Copy children from the template, if not done yet
+        """
+        template = self._template
+        if template is None:
+            return
+        self._template = None
+
+        # Set directly, adding children would drop the digest
+        _childrenSlot.__set__(self, XMLTreeNodeChildren(
+            [_cloneNode(child, self) for child in sharedChildren(template)]))
+
+    def __getChildren(self):
+        if self._template is not None:
+            self.copyChildren()
+        return _childrenSlot.__get__(self, XMLTreeNode)
+
+    def __setChildren(self, value):
+        self._template = None
+        _childrenSlot.__set__(self, value)
+
+    _children = property(__getChildren, __setChildren)
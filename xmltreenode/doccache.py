@@ -0,0 +1,207 @@
+"""@package doccache
+Process wide cache of parsed documents for CustomXMLParser.load
+
+Files are keyed by their absolute path, modification time and size, so a file
+is parsed again only after it has changed. Contents given as string are keyed
+by hash of the contents. Cached trees are never handed out themselves, every load
+gets a copy-on-write clone, see cowclone, so callers may modify their trees freely.
+Least recently used documents are evicted when there are more documents than
+allowed, or their estimated memory exceeds the limit.
+
+@code
+root = CustomXMLParser().load("catalog.xml", cache=True).getRoot()
+print(doccache.getCache().stats())
+@endcode
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from traversal import walk
+from xmltreenode import XMLTreeNode, XMLTreeNodeChildren
+import cowclone
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Cache used by load(cache=True), created when used the first time
+_default = None
+_defaultLock = threading.Lock()
+
+# Estimated memory of a node without its strings, and of an attribute without its key and value
+_NODE_BYTES = sum(map(sys.getsizeof, (XMLTreeNode(), {}, XMLTreeNodeChildren(), '', '')))
+_ATTRIBUTE_BYTES = 2 * sys.getsizeof('') + 3 * sys.getsizeof(0)
+
+
+def estimateSize(root):
+    """ Estimate memory used by a tree. Strings shared by several nodes
+    are counted for every node, so the estimate is rather too large than too small.
+
+    @param root Top XMLTreeNode of the tree
+    @returns Estimated size in bytes
+    """
+    getsizeof = sys.getsizeof
+    size = 0
+    for node in walk(root):
+        size += getsizeof(node) + getsizeof(node._attrib) + getsizeof(node._children)
+        for key, value in node._attrib.items():
+            size += getsizeof(key) + getsizeof(value)
+        text = node.text
+        if text is not None:
+            size += getsizeof(text)
+        if node.tail is not None:
+            size += getsizeof(node.tail)
+    return size
+
+
+def estimateBuiltSize(nodes, attributes, inputSize):
+    """ Estimate memory used by a tree from the numbers known when it was built,
+    without walking the tree. Strings are taken to use as much memory as
+    the whole input they were parsed from. Estimate is close to estimateSize
+    for documents which were parsed whole.
+
+    @param nodes Number of nodes
+    @param attributes Number of attributes
+    @param inputSize Size of the parsed document
+    @returns Estimated size in bytes
+    """
+    return nodes * _NODE_BYTES + attributes * _ATTRIBUTE_BYTES + inputSize
+
+
+class DocumentCache(object):
+    """ LRU cache of parsed documents bounded by number of documents and their estimated memory
+    """
+
+    def __init__(self, maxEntries=DEFAULT_MAX_ENTRIES, maxBytes=DEFAULT_MAX_BYTES):
+        """ Initialize
+
+        @param maxEntries Maximum number of cached documents
+        @param maxBytes Maximum estimated memory of cached documents, larger documents are not cached
+        """
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.__lock = threading.Lock()
+        self.__entries = OrderedDict()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def makeKey(self, xmlfile, sourceIsFile=True, addDummy=False, options=None):
+        """ Make cache key of the input of CustomXMLParser.load
+
+        @param xmlfile Input XML file or contents
+        @param sourceIsFile True if xmlfile is name of a file, False if it contains the XML contents
+        @param addDummy Whether contents are added into dummy element, see CustomXMLParser.load
+        @param options Other hashable options affecting the parsed tree
+        @returns Key, None if file can not be accessed
+        """
+        if sourceIsFile:
+            try:
+                st = os.stat(xmlfile)
+            except (OSError, TypeError):
+                return None
+            return ('file', os.path.abspath(xmlfile), st.st_mtime, st.st_size, addDummy, options)
+
+        data = xmlfile
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return ('data', hashlib.sha1(data).hexdigest(), len(data), addDummy, options)
+
+    def get(self, key):
+        """ Get clone of cached document
+
+        @param key Key made by makeKey
+        @returns ClonedXMLTreeNode, None if document is not cached
+        """
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries[key] = entry
+            self.__hits += 1
+        return cowclone.clone(entry[0], snapshot=False)
+
+    def put(self, key, root, size=None):
+        """ Cache document. Root must not be used after this, use the returned clone instead.
+
+        @param key Key made by makeKey
+        @param root Top XMLTreeNode of the parsed document
+        @param size Estimated memory of the document, see estimateBuiltSize. Estimated with estimateSize if not given
+        @returns ClonedXMLTreeNode, clone of the cached document
+        """
+        if size is None:
+            size = estimateSize(root)
+        # Cached root is never handed out or modified, so clones can share it
+        res = cowclone.clone(root, snapshot=False)
+        if size > self.maxBytes:
+            return res
+
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__bytes -= old[1]
+            self.__entries[key] = (root, size)
+            self.__bytes += size
+            while len(self.__entries) > self.maxEntries or self.__bytes > self.maxBytes:
+                dropped = self.__entries.popitem(last=False)[1]
+                self.__bytes -= dropped[1]
+                self.__evictions += 1
+        return res
+
+    def clear(self):
+        """ Remove all documents, statistics are kept
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def resetStats(self):
+        """ Reset hit, miss and eviction counters
+        """
+        with self.__lock:
+            self.__hits = 0
+            self.__misses = 0
+            self.__evictions = 0
+
+    def stats(self):
+        """ Get statistics of the cache
+
+        @returns Dictionary of hits, misses, evictions, entries and bytes
+        """
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'entries': len(self.__entries),
+                'bytes': self.__bytes,
+            }
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+def getCache():
+    """ Get the process wide cache used by CustomXMLParser.load(cache=True)
+
+    @returns DocumentCache instance
+    """
+    global _default
+    with _defaultLock:
+        if _default is None:
+            _default = DocumentCache()
+        return _default
+
+
+def setCache(cache):
+    """ Replace the process wide cache, for example to change its limits
+
+    @param cache DocumentCache instance, or None to create a new one with default limits when used next time
+    """
+    global _default
+    with _defaultLock:
+        _default = cache
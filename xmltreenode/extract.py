@@ -0,0 +1,262 @@
+"""@package extract
+Extraction of records from XML straight from the parser events, without building a tree
+
+Extractor is given the tag path of the record elements, see tagfilter, and
+fields as pairs of name and path relative to the record element:
+  name          Text of the first child element name
+  a/b           Text of the first b element below any a child element, in document order
+  @id           Attribute id of the record element
+  price/@cur    Attribute cur of the first price child element
+  .             Text of the record element itself
+Values are the same as the ones found from a loaded tree with find(path).getValue()
+and getAttribSafe, fields which are not found get the default value.
+Records inside records are not extracted separately.
+
+@code
+extractor = RecordExtractor('product', [('id', '@id'), ('name', 'name'), ('currency', 'price/@currency')])
+for row in extractor.iterRows('catalog.xml'):
+    print(row)
+@endcode
+"""
+
+from collections import OrderedDict
+from xml.etree.ElementTree import Comment
+import instrument
+import tagfilter
+from textrules import keepText
+from xmlparser import CustomXMLParser, ParseError, xml_parser
+
+READ_SIZE = 65536
+
+
+def _parseField(path):
+    """ Parse field path
+
+    @param path Field path
+    @returns Tuple of tuple of element tags relative to record and attribute name or None
+    """
+    parts = [part for part in tagfilter.splitPath(path) if part != '.']
+    attrib = None
+    if parts and parts[-1].startswith('@'):
+        attrib = parts.pop()[1:]
+    for part in parts:
+        if part.startswith('@') or part in ('*', '..'):
+            raise ValueError('Unsupported field path: %r' % (path, ))
+    if path.startswith('/') or attrib == '':
+        raise ValueError('Unsupported field path: %r' % (path, ))
+    return tuple(parts), attrib
+
+
+class RecordExtractor(object):
+    """ Compiled extraction of records
+    """
+
+    def __init__(self, record, fields, default=None):
+        """ Initialize
+
+        @param record Tag path of the record elements, or list of paths
+        @param fields List of tuples of field name and path, or dictionary from names to paths
+        @param default Value of the fields which are not found
+        """
+        if isinstance(record, (list, tuple)):
+            self.record = tagfilter.TagPaths(record)
+        else:
+            self.record = tagfilter.TagPaths([record])
+        if isinstance(fields, dict):
+            fields = list(fields.items())
+        self.names = tuple(name for name, path in fields)
+        self.default = default
+
+        # Fields by element path relative to record, as lists of field position and attribute name
+        self.fields = {}
+        for index, (name, path) in enumerate(fields):
+            tags, attrib = _parseField(path)
+            self.fields.setdefault(tags, []).append((index, attrib))
+        self.depth = max(len(tags) for tags in self.fields) if self.fields else 0
+
+    def target(self):
+        """ Create parser target extracting the records, see ExtractTarget
+
+        @returns ExtractTarget instance
+        """
+        return ExtractTarget(self)
+
+    def iterRows(self, xmlfile, sourceIsFile=True, asDict=False, chunkSize=READ_SIZE):
+        """ Extract records from XML file or raw text incrementally.
+        Every record is yielded as soon as it is closed, while the rest is still being parsed.
+        Raises ValueError if input is not valid XML.
+
+        @param xmlfile Input XML file
+        @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
+        @param asDict If True, records are dictionaries from field names to values, otherwise tuples of values
+        @param chunkSize Size of chunks to read and feed to parser at once
+        @returns Generator of records
+        """
+        target = self.target()
+        parser = xml_parser(target=target)
+        names = self.names
+
+        try:
+            for chunk in CustomXMLParser().readChunks(xmlfile, sourceIsFile, chunkSize):
+                if instrument.registry is not None:
+                    instrument.countInput(instrument.registry, chunk)
+                parser.feed(chunk)
+                rows = target.readRows()
+                if rows:
+                    for row in rows:
+                        yield dict(zip(names, row)) if asDict else tuple(row)
+            parser.close()
+        except ParseError as e:
+            if sourceIsFile:
+                raise ValueError('Input is not valid XML: %s, %s' % (xmlfile, e))
+            else:
+                raise ValueError('Input is not valid XML: %s' % e)
+
+        for row in target.readRows():
+            yield dict(zip(names, row)) if asDict else tuple(row)
+
+    def rows(self, xmlfile, sourceIsFile=True, asDict=False, chunkSize=READ_SIZE):
+        """ Extract all records from XML file or raw text, see iterRows
+
+        @returns List of records
+        """
+        return list(self.iterRows(xmlfile, sourceIsFile, asDict, chunkSize))
+
+    def columns(self, xmlfile, sourceIsFile=True, chunkSize=READ_SIZE):
+        """ Extract all records from XML file or raw text as columns, see iterRows
+
+        @returns Ordered dictionary from field names to lists of values
+        """
+        columns = [[] for name in self.names]
+        for row in self.iterRows(xmlfile, sourceIsFile, chunkSize=chunkSize):
+            for column, value in zip(columns, row):
+                column.append(value)
+        return OrderedDict(zip(self.names, columns))
+
+
+class ExtractTarget(object):
+    """ Parser target collecting the records of RecordExtractor.
+    Text is collected with the same rules as CustomXMLParser uses, so values match the loaded tree.
+    """
+
+    def __init__(self, extractor):
+        """ Initialize
+
+        @param extractor RecordExtractor instance
+        """
+        self.record = extractor.record
+        self.fields = extractor.fields
+        self.depth = extractor.depth
+        self.default = extractor.default
+        self.width = len(extractor.names)
+
+        # Tags of the open elements outside records
+        self.__tags = []
+        # Record being extracted, as list of values
+        self.__row = None
+        # Fields already found in the record
+        self.__found = None
+        # Open elements in record, as tuples of path relative to record and positions of the text fields
+        self.__open = []
+        # Text chunks of fields by position
+        self.__texts = {}
+        # Text pieces reported since the last event, see textrules
+        self.__pending = []
+        # Tag of the last started element, or Comment, like in CustomXMLParser
+        self.__name = None
+        self.__rows = []
+
+    def readRows(self):
+        """ Take the records which have been closed since the last call
+
+        @returns List of records as lists of values
+        """
+        rows = self.__rows
+        if rows:
+            self.__rows = []
+        return rows
+
+    def start(self, tag, attrib):
+        if self.__pending:
+            self.__flushData()
+        self.__name = tag
+        opened = self.__open
+        if self.__row is None:
+            tags = self.__tags
+            tags.append(tag)
+            if not self.record.match(tags):
+                return
+            tags.pop()
+            self.__row = [self.default] * self.width
+            self.__found = set()
+            path = ()
+        else:
+            path = opened[-1][0]
+            # Elements deeper than any field only need to be tracked
+            if path is None or len(path) >= self.depth:
+                opened.append((None, None))
+                return
+            path = path + (tag, )
+
+        captures = None
+        fields = self.fields.get(path)
+        if fields is not None:
+            found = self.__found
+            for index, name in fields:
+                if index in found:
+                    continue
+                found.add(index)
+                if name is None:
+                    if captures is None:
+                        captures = []
+                    captures.append(index)
+                    self.__texts[index] = []
+                else:
+                    self.__row[index] = attrib.get(name, self.default)
+        opened.append((path, captures))
+
+    def end(self, tag):
+        if self.__pending:
+            self.__flushData()
+        opened = self.__open
+        if not opened:
+            self.__tags.pop()
+            return
+
+        path, captures = opened.pop()
+        if captures is not None:
+            row = self.__row
+            texts = self.__texts
+            for index in captures:
+                row[index] = ''.join(texts.pop(index))
+        if not opened:
+            self.__rows.append(self.__row)
+            self.__row = None
+            self.__found = None
+
+    def data(self, data):
+        opened = self.__open
+        if not opened:
+            return
+        if data and opened[-1][1] is not None:
+            self.__pending.append(data)
+
+    def __flushData(self):
+        """ Add the text reported since the last event to the fields of the innermost open element
+        """
+        text = ''.join(self.__pending)
+        self.__pending = []
+        if self.__name is not Comment:
+            text = keepText(text)
+        if text:
+            texts = self.__texts
+            for index in self.__open[-1][1]:
+                texts[index].append(text)
+
+    def comment(self, data):
+        if self.__pending:
+            self.__flushData()
+        self.__name = Comment
+
+    def close(self):
+        return None
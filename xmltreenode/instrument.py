@@ -0,0 +1,248 @@
+"""@package instrument
+Opt-in counters and timers of parsing, searching and serialization
+
+Instrumentation is disabled by default, then hooks cost only a check per call.
+Enable it with a registry collecting the measurements:
+
+@code
+with instrument.instrumented() as registry:
+    root = CustomXMLParser().load(data, sourceIsFile=False).getRoot()
+    root.getSubTreeNodesByName('item')
+    root.toString()
+print(registry.asDict())
+@endcode
+
+Measurements:
+  parser.start, parser.end, parser.data, parser.comment  Timers of parser target events
+  parser.parse      Timer of parsing a whole document by load
+  parser.nodes      Counter of created element nodes
+  parser.bytes      Counter of bytes fed to parser, for files and byte strings
+  parser.characters Counter of characters fed to parser, for text strings
+  node.appendValue  Counter of text chunks appended to nodes
+  walk.nodes        Counter of nodes visited by tree traversals
+  search.*          Timers of search methods
+  serialize.write   Timer of serialization
+  serialize.bytes   Counter of serialized bytes
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from compat import text_type
+
+# Registry collecting measurements, None when instrumentation is disabled
+registry = None
+
+# Clock used by timers
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class Registry(object):
+    """ Collection of named counters and timers.
+    Timers count calls and total time in seconds.
+    """
+
+    def __init__(self):
+        """ Initialize
+        """
+        self.__lock = threading.Lock()
+        self.__counters = {}
+        self.__timers = {}
+
+    def count(self, name, value=1):
+        """ Increase counter
+
+        @param name Name of the counter
+        @param value Amount to add
+        """
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def addTime(self, name, seconds, calls=1):
+        """ Add time to timer
+
+        @param name Name of the timer
+        @param seconds Time in seconds
+        @param calls Number of calls the time was spent in
+        """
+        with self.__lock:
+            timer = self.__timers.get(name)
+            if timer is None:
+                timer = self.__timers[name] = [0, 0.0]
+            timer[0] += calls
+            timer[1] += seconds
+
+    @contextmanager
+    def timer(self, name):
+        """ Context manager adding time spent in the block to timer
+
+        @param name Name of the timer
+        """
+        start = clock()
+        try:
+            yield
+        finally:
+            self.addTime(name, clock() - start)
+
+    def getCounter(self, name):
+        """ Get value of counter
+
+        @param name Name of the counter
+        @returns Value, 0 if counter has not been used
+        """
+        return self.__counters.get(name, 0)
+
+    def getTimer(self, name):
+        """ Get calls and time of timer
+
+        @param name Name of the timer
+        @returns Tuple of number of calls and total seconds
+        """
+        timer = self.__timers.get(name, (0, 0.0))
+        return (timer[0], timer[1])
+
+    def reset(self):
+        """ Clear all counters and timers
+        """
+        with self.__lock:
+            self.__counters = {}
+            self.__timers = {}
+
+    def asDict(self):
+        """ Export measurements as flat dictionary, for example for metrics systems.
+        Timers are exported as name.calls and name.seconds.
+
+        @returns Dictionary from names to values
+        """
+        with self.__lock:
+            res = dict(self.__counters)
+            for name, (calls, seconds) in self.__timers.items():
+                res[name + '.calls'] = calls
+                res[name + '.seconds'] = seconds
+        return res
+
+
+def enable(reg=None):
+    """ Enable instrumentation
+
+    @param reg Registry to collect measurements to, new one by default
+    @returns Registry in use
+    """
+    global registry
+    if reg is None:
+        reg = Registry()
+    registry = reg
+    return reg
+
+
+def disable():
+    """ Disable instrumentation
+    """
+    global registry
+    registry = None
+
+
+def isEnabled():
+    """ Check if instrumentation is enabled
+
+    @returns True if enabled, False otherwise
+    """
+    return registry is not None
+
+
+@contextmanager
+def instrumented(reg=None):
+    """ Context manager enabling instrumentation within the block.
+    Previous state is restored afterwards.
+
+    @param reg Registry to collect measurements to, new one by default
+    @returns Registry in use
+    """
+    global registry
+    previous = registry
+    reg = enable(reg)
+    try:
+        yield reg
+    finally:
+        registry = previous
+
+
+def countInput(reg, data):
+    """ Count data fed to parser, bytes and text are counted separately
+    as the length of text is in characters
+
+    @param reg Registry to collect measurements to
+    @param data Chunk of bytes or text
+    """
+    if isinstance(data, text_type):
+        reg.count('parser.characters', len(data))
+    else:
+        reg.count('parser.bytes', len(data))
+
+
+def timed(name):
+    """ Decorator measuring time of calls to timer, when instrumentation is enabled
+
+    @param name Name of the timer
+    @returns Decorator
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            reg = registry
+            if reg is None:
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                reg.addTime(name, clock() - start)
+        return wrapper
+    return decorate
+
+
+class InstrumentedTarget(object):
+    """ Parser target measuring the events passed to the real target
+    """
+
+    def __init__(self, target, reg):
+        """ Initialize
+
+        @param target Parser target, for example CustomXMLParser
+        @param reg Registry to collect measurements to
+        """
+        self.target = target
+        self.registry = reg
+
+    def start(self, tag, attrib):
+        start = clock()
+        try:
+            return self.target.start(tag, attrib)
+        finally:
+            self.registry.addTime('parser.start', clock() - start)
+            self.registry.count('parser.nodes')
+
+    def end(self, tag):
+        start = clock()
+        try:
+            return self.target.end(tag)
+        finally:
+            self.registry.addTime('parser.end', clock() - start)
+
+    def data(self, data):
+        start = clock()
+        try:
+            return self.target.data(data)
+        finally:
+            self.registry.addTime('parser.data', clock() - start)
+
+    def comment(self, data):
+        start = clock()
+        try:
+            return self.target.comment(data)
+        finally:
+            self.registry.addTime('parser.comment', clock() - start)
+
+    def close(self):
+        return self.target.close()
@@ -0,0 +1,356 @@
+"""@package lazyload
+Lazy loading of XML files, subtrees are parsed only when they are accessed
+"""
+
+import re
+import sys
+from xml.parsers import expat
+from xmltreenode import XMLTreeNode
+
+# Size of slices fed to the scanning parser at once
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Name of the element wrapping a subtree when it's materialized
+_WRAPPER = b'xmltreenode-lazy'
+
+_START_TAG_RE = re.compile(br'<[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>')
+
+_setText = XMLTreeNode.text.fset
+_getText = XMLTreeNode.text.fget
+_childrenSlot = XMLTreeNode._children
+
+
+def _fixName(name):
+    """ Convert name reported by expat to ElementTree format
+
+    @param name Name from expat, namespace separated with }
+    @returns Name as {uri}name
+    """
+    if '}' in name:
+        name = '{' + name
+    if sys.version < '3':
+        try:
+            name = name.encode('ascii')
+        except UnicodeError:
+            pass
+    return name
+
+
+def _fixText(text):
+    """ Convert text reported by expat to ElementTree format
+
+    @param text Text from expat
+    @returns Text
+    """
+    if sys.version < '3':
+        try:
+            text = text.encode('ascii')
+        except UnicodeError:
+            pass
+    return text
+
+
+class LazySource(object):
+    """ Location of unparsed subtree in the source document
+    """
+    __slots__ = ('data', 'start', 'end', 'namespaces', 'encoding')
+
+    def __init__(self, data, start, end, namespaces, encoding):
+        """ Initialize
+
+        @param data Whole source document as bytes or mmap
+        @param start Byte offset of start of the element
+        @param end Byte offset after end of the element
+        @param namespaces Tuple of prefix and uri pairs of namespaces in scope of the element
+        @param encoding Encoding of the source document, or None
+        """
+        self.data = data
+        self.start = start
+        self.end = end
+        self.namespaces = namespaces
+        self.encoding = encoding
+
+    def parse(self):
+        """ Parse the subtree
+
+        @returns XMLTreeNode of the element
+        """
+        from xmlparser import CustomXMLParser
+
+        decls = []
+        for prefix, uri in self.namespaces:
+            uri = (uri or '').replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;')
+            if prefix:
+                decls.append(' xmlns:%s="%s"' % (prefix, uri))
+            else:
+                decls.append(' xmlns="%s"' % (uri))
+        decls = ''.join(decls).encode('utf-8')
+
+        parts = []
+        if self.encoding:
+            parts.append(("<?xml version='1.0' encoding='%s'?>" % (self.encoding)).encode('ascii'))
+        parts.extend((b'<', _WRAPPER, decls, b'>', self.data[self.start:self.end], b'</', _WRAPPER, b'>'))
+
+        parser = CustomXMLParser().load(b''.join(parts), sourceIsFile=False)
+        return parser.getRoot().getChildren()[0]
+
+
+class LazyXMLTreeNode(XMLTreeNode):
+    """ XMLTreeNode whose text and children are parsed from the source
+    document only when they are accessed the first time.
+    Tag, attributes and tail are known from the beginning.
+    """
+    __slots__ = ('_source',)
+
+    def __init__(self, tag=None, attrib={}, **extra):
+        """ Initialize
+
+        @param tag Setup the data of this node, can be overridden later with setData
+        @param attrib Element attribute dictionary
+        @param **extra Additional attributes, given as keyword arguments
+        """
+        self._source = None
+        XMLTreeNode.__init__(self, tag, attrib, **extra)
+
+    def setSource(self, source):
+        """ Set location of the unparsed contents
+
+        @param source LazySource instance, or None if contents are already set
+        """
+        self._source = source
+
+    def isMaterialized(self):
+        """ Check if contents have been parsed
+
+        @returns True if contents are parsed, False otherwise
+        """
+        return self._source is None
+
+    def materialize(self):
+        """ Parse text and children from the source document, if not done yet
+        """
+        source = self._source
+        if source is None:
+            return
+        self._source = None
+
+        node = source.parse()
+        _setText(self, node.text)
+        for child in node.getChildren():
+            child.reparent(self)
+
+    def __getChildren(self):
+        if self._source is not None:
+            self.materialize()
+        return _childrenSlot.__get__(self, XMLTreeNode)
+
+    def __setChildren(self, value):
+        _childrenSlot.__set__(self, value)
+
+    _children = property(__getChildren, __setChildren)
+
+    def __getText(self):
+        if self._source is not None:
+            self.materialize()
+        return _getText(self)
+
+    def __setText(self, value):
+        if self._source is not None:
+            self.materialize()
+        _setText(self, value)
+
+    text = property(__getText, __setText)
+
+    def appendValue(self, value):
+        """ Append to value of the Node, or the text
+
+        @param value Any value
+        """
+        if self._source is not None:
+            self.materialize()
+        XMLTreeNode.appendValue(self, value)
+
+
+class LazyScanner(object):
+    """ Scans XML document and builds the tree down to the given depth
+    through CustomXMLParser target methods. Elements at the given depth become
+    LazyXMLTreeNode instances, which only remember where their contents are.
+    """
+
+    def __init__(self, target, data, depth=1, chunkSize=SCAN_CHUNK_SIZE):
+        """ Initialize
+
+        @param target CustomXMLParser instance to build the tree with
+        @param data Document as bytes or mmap
+        @param depth Depth of lazily loaded elements, root is at depth 0
+        @param chunkSize Size of slices fed to parser at once
+        """
+        if depth < 1:
+            raise ValueError('Depth of lazily loaded elements must be at least 1')
+
+        self.target = target
+        self.data = data
+        self.depth = depth
+        self.chunkSize = chunkSize
+
+        self.__level = 0
+        self.__lazy = None
+        self.__lazyStart = 0
+        self.__lazyLevel = 0
+        self.__lazyEnd = None
+        self.__lazyComment = False
+        self.__afterComment = False
+        self.__nodes = []
+        self.__namespaces = []
+        self.__scope = ()
+        self.__encoding = None
+        self.__parser = None
+        self.__names = {}
+
+    def scan(self):
+        """ Scan the document, raises expat.ExpatError if it's not valid
+        """
+        parser = expat.ParserCreate(None, '}')
+        parser.StartElementHandler = self.__start
+        parser.EndElementHandler = self.__end
+        parser.CharacterDataHandler = self.__data
+        parser.CommentHandler = self.__comment
+        parser.StartNamespaceDeclHandler = self.__startNamespace
+        parser.EndNamespaceDeclHandler = self.__endNamespace
+        parser.XmlDeclHandler = self.__xmlDecl
+        self.__parser = parser
+
+        # Scanner switches the node factory of the target, the one set by user is restored afterwards
+        target = self.target
+        factory = target.nodeFactory
+        data = self.data
+        size = len(data)
+        chunkSize = self.chunkSize
+        try:
+            for pos in range(0, size, chunkSize):
+                if sys.version < '3':
+                    chunk = buffer(data, pos, chunkSize)  # NOQA
+                else:
+                    chunk = data[pos:pos + chunkSize]
+                parser.Parse(chunk, False)
+            parser.Parse(b'', True)
+        finally:
+            self.__parser = None
+            target.nodeFactory = factory
+
+    def __xmlDecl(self, version, encoding, standalone):
+        self.__encoding = encoding
+
+    def __startNamespace(self, prefix, uri):
+        self.__namespaces.append((prefix, uri))
+        self.__scope = None
+
+    def __endNamespace(self, prefix):
+        namespaces = self.__namespaces
+        for pos in range(len(namespaces) - 1, -1, -1):
+            if namespaces[pos][0] == prefix:
+                del namespaces[pos]
+                break
+        self.__scope = None
+
+    def __fixName(self, name):
+        """ Convert name like _fixName, sharing one string object per distinct name
+
+        @param name Name from expat
+        @returns Name as {uri}name
+        """
+        fixed = self.__names.get(name)
+        if fixed is None:
+            fixed = self.__names[name] = _fixName(name)
+        return fixed
+
+    def __skipStart(self, tag, attrib):
+        self.__lazyLevel += 1
+        self.__lazyComment = False
+
+    def __skipEnd(self, tag):
+        if self.__lazyLevel:
+            self.__lazyLevel -= 1
+        else:
+            self.__end(tag)
+
+    def __start(self, tag, attrib):
+        self.__afterComment = False
+        if attrib:
+            attrib = dict((self.__fixName(key), _fixText(value)) for key, value in attrib.items())
+        target = self.target
+        if self.__level == self.depth:
+            start = self.__parser.CurrentByteIndex
+            self.__lazyStart = start
+            self.__lazyLevel = 0
+            self.__lazyEnd = None
+            self.__lazyComment = False
+            tagEnd = _START_TAG_RE.match(self.data, start).end()
+            if self.data[tagEnd - 2:tagEnd] == b'/>':
+                self.__lazyEnd = tagEnd
+            if self.__scope is None:
+                # Later declarations of the same prefix override earlier ones
+                self.__scope = tuple(dict(self.__namespaces).items())
+            target.nodeFactory = self.__createLazy
+            target.start(self.__fixName(tag), attrib)
+
+            # Only find the end of the element, while skipping its contents
+            parser = self.__parser
+            parser.StartElementHandler = self.__skipStart
+            parser.EndElementHandler = self.__skipEnd
+            parser.CharacterDataHandler = None
+            parser.CommentHandler = self.__skipComment
+            return
+
+        self.__level += 1
+        target.nodeFactory = self.__createNode
+        target.start(self.__fixName(tag), attrib)
+
+    def __createNode(self, tag):
+        node = XMLTreeNode(tag)
+        self.__nodes.append(node)
+        return node
+
+    def __createLazy(self, tag):
+        self.__lazy = LazyXMLTreeNode(tag)
+        return self.__lazy
+
+    def __end(self, tag):
+        if self.__lazy is not None:
+            data = self.data
+            end = self.__lazyEnd
+            if end is None:
+                # Position is at the beginning of the end tag
+                end = data.find(b'>', self.__parser.CurrentByteIndex) + 1
+            self.__lazy.setSource(LazySource(data, self.__lazyStart, end, self.__scope, self.__encoding))
+            self.__lazy = None
+            self.__afterComment = self.__lazyComment
+
+            parser = self.__parser
+            parser.StartElementHandler = self.__start
+            parser.EndElementHandler = self.__end
+            parser.CharacterDataHandler = self.__data
+            parser.CommentHandler = self.__comment
+        else:
+            self.__level -= 1
+            if len(self.__nodes) > 1:
+                self.__nodes.pop()
+
+        self.target.end(self.__fixName(tag))
+
+    def __data(self, data):
+        data = _fixText(data)
+        if self.__afterComment:
+            # CustomXMLParser keeps all text after a comment until next tag starts,
+            # do the same when the comment was inside a skipped subtree
+            if data:
+                self.__nodes[-1].appendValue(data)
+            return
+        self.target.data(data)
+
+    def __comment(self, data):
+        self.__afterComment = False
+        self.target.comment(_fixText(data))
+
+    def __skipComment(self, data):
+        self.__lazyComment = True
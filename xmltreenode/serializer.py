@@ -0,0 +1,309 @@
+"""@package serializer
+Streaming serializer writing XMLTreeNode trees directly to a file or socket
+"""
+
+import sys
+import xml.etree.ElementTree
+import instrument
+from compat import COMMENTS, PROCESSING_INSTRUCTIONS, string_types
+from traversal import sharedChildren, walkShared
+
+# Amount of characters collected before they are encoded and written out
+DEFAULT_BUFFER_SIZE = 65536
+
+# Attributes are written in sorted order like ElementTree does before Python 3.8
+_SORT_ATTRIBUTES = sys.version_info < (3, 8)
+
+
+def escapeText(text):
+    """ Escape character data
+
+    @param text Text to escape
+    @returns Escaped text
+    """
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def escapeAttrib(text):
+    """ Escape attribute value
+
+    @param text Attribute value to escape
+    @returns Escaped attribute value
+    """
+    if not isinstance(text, string_types):
+        raise TypeError('cannot serialize %r (type %s)' % (text, type(text).__name__))
+    text = escapeText(text)
+    if '"' in text:
+        text = text.replace('"', '&quot;')
+    if '\n' in text:
+        text = text.replace('\n', '&#10;')
+    return text
+
+
+class XMLWriter(object):
+    """ Writes XMLTreeNode trees incrementally to a writable object.
+    Output is collected to a buffer of bufferSize characters, which is
+    encoded and written out when full, so memory usage stays bounded
+    regardless of the size of the tree.
+    """
+
+    def __init__(self, out, encoding='us-ascii', bufferSize=DEFAULT_BUFFER_SIZE, indent=None):
+        """ Initialize
+
+        @param out Object with write or sendall method, for example file, socket or BytesIO
+        @param encoding Output encoding, or 'unicode' to write strings without encoding
+        @param bufferSize Amount of characters buffered before writing out
+        @param indent Number of spaces per level for pretty printing, None to write as is
+        """
+        if hasattr(out, 'write'):
+            self.__out = out.write
+        elif hasattr(out, 'sendall'):
+            self.__out = out.sendall
+        else:
+            raise ValueError('Output does not have write or sendall method')
+
+        self.encoding = encoding
+        self.bufferSize = bufferSize
+        self.__encode = encoding.lower() != 'unicode'
+        self.__indent = None if indent is None else ' ' * indent
+        self.__newlines = ['\n']
+        self.__buffer = []
+        self.__size = 0
+        # Amount of bytes, or characters without encoding, written out
+        self.written = 0
+
+    def write(self, data):
+        """ Write string to output through the buffer
+
+        @param data String to write
+        """
+        self.__buffer.append(data)
+        self.__size += len(data)
+        if self.__size >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        """ Write buffered data to output
+        """
+        if not self.__buffer:
+            return
+
+        self.__size = 0
+        if self.__encode:
+            data = ''.join(self.__buffer).encode(self.encoding, 'xmlcharrefreplace')
+        else:
+            data = u''.join(self.__buffer)
+        self.__buffer = []
+        self.written += len(data)
+        self.__out(data)
+
+    def writeDeclaration(self):
+        """ Write XML declaration, if needed by the encoding
+        """
+        if self.__encode and self.encoding.lower() not in ('utf-8', 'us-ascii'):
+            self.write("<?xml version='1.0' encoding='%s'?>\n" % (self.encoding))
+
+    def writeTree(self, node):
+        """ Write XMLTreeNode and its subtree, and flush the output
+
+        @param node Top XMLTreeNode of the tree
+        """
+        self.__qnames, self.__namespaces = self.__collectNamespaces(node)
+
+        entry = self.__open(node, self.__namespaces, 0, False)
+        if entry is not None:
+            stack = [entry]
+            append = stack.append
+            pop = stack.pop
+            while stack:
+                closing, children, level, last = stack[-1]
+                for child in children:
+                    entry = self.__open(child, None, level, child is last)
+                    if entry is not None:
+                        append(entry)
+                    break
+                else:
+                    pop()
+                    self.write(closing)
+
+        self.flush()
+
+    def __newline(self, level):
+        """ Get new line and indent of level for pretty printing
+
+        @param level Level of indent
+        @returns Indent string
+        """
+        newlines = self.__newlines
+        while len(newlines) <= level:
+            newlines.append(newlines[-1] + self.__indent)
+        return newlines[level]
+
+    def __open(self, node, namespaces, level, last):
+        """ Write beginning of node
+
+        @param node XMLTreeNode instance
+        @param namespaces Namespace declarations to write into the start tag
+        @param level Level of the node in the written tree
+        @param last True if node is the last child of its parent
+        @returns Tuple of closing string, iterator of children, level of children and
+        last child, or None if node was written completely
+        """
+        tag = node.tag
+        text = node.text
+        tail = node.tail
+        children = sharedChildren(node)
+
+        if self.__indent is not None:
+            text, tail = self.__indented(text, tail, children, level, last)
+        tail = escapeText(tail) if tail else ''
+
+        if self.__writeSpecial(tag, text, tail):
+            return None
+
+        write = self.write
+        if tag is None:
+            if text:
+                write(escapeText(text))
+            if children:
+                return (tail, iter(children), level + 1, children[-1])
+            if tail:
+                write(tail)
+            return None
+
+        tag = self.__writeStartTag(node, tag, namespaces)
+        if text or children:
+            write('>')
+            if text:
+                write(escapeText(text))
+            closing = '</%s>%s' % (tag, tail)
+            if children:
+                return (closing, iter(children), level + 1, children[-1])
+            write(closing)
+        else:
+            write(' />' + tail)
+        return None
+
+    def __indented(self, text, tail, children, level, last):
+        """ Get text and tail of node for pretty printing. Same whitespace as
+        XMLTreeNode.indent would set, without modifying the node
+
+        @param text Text of node
+        @param tail Tail of node
+        @param children Children of node
+        @param level Level of the node in the written tree
+        @param last True if node is the last child of its parent
+        @returns Tuple of text and tail
+        """
+        if children and (not text or not text.strip()):
+            text = self.__newline(level + 1)
+        if (children or level) and (not tail or not tail.strip()):
+            tail = self.__newline(level - 1 if last else level)
+        return text, tail
+
+    def __writeSpecial(self, tag, text, tail):
+        """ Write comment or processing instruction
+
+        @param tag Tag of node
+        @param text Text of node
+        @param tail Escaped tail of node
+        @returns True if node was written, False if it is not a comment or processing instruction
+        """
+        if tag in COMMENTS:
+            self.write('<!--%s-->%s' % (text, tail))
+            return True
+        if tag in PROCESSING_INSTRUCTIONS:
+            self.write('<?%s?>%s' % (text, tail))
+            return True
+        return False
+
+    def __writeStartTag(self, node, tag, namespaces):
+        """ Write start tag of element without the closing bracket
+
+        @param node XMLTreeNode instance
+        @param tag Tag of node
+        @param namespaces Namespace declarations to write into the start tag
+        @returns Qualified tag name
+        """
+        write = self.write
+        qnames = self.__qnames
+        tag = qnames[tag]
+        write('<' + tag)
+        if namespaces:
+            for uri, prefix in sorted(namespaces.items(), key=lambda x: x[1]):
+                if prefix:
+                    prefix = ':' + prefix
+                write(' xmlns%s="%s"' % (prefix, escapeAttrib(uri)))
+        attrib = node._attrib
+        if attrib:
+            items = attrib.items()
+            if _SORT_ATTRIBUTES:
+                items = sorted(items)
+            for key, value in items:
+                write(' %s="%s"' % (qnames[key], escapeAttrib(value)))
+        return tag
+
+    def __collectNamespaces(self, node):
+        """ Resolve qualified names of all tags and attributes in the tree.
+        Tree is walked before writing so that all namespaces are declared in the start tag
+        of the top node, giving the same output as ElementTree. Declaring them at first use
+        would save the walk, but would move the declarations and change the prefixes.
+
+        @param node Top XMLTreeNode of the tree
+        @returns Tuple of dictionary from names to qualified names, and dictionary from namespace uris to prefixes
+        """
+        qnames = {None: None}
+        namespaces = {}
+        known = getattr(xml.etree.ElementTree, '_namespace_map', {})
+
+        def addQName(qname):
+            if qname[:1] == '{':
+                uri, name = qname[1:].split('}', 1)
+                prefix = namespaces.get(uri)
+                if prefix is None:
+                    prefix = known.get(uri)
+                    if prefix is None:
+                        prefix = 'ns%d' % (len(namespaces))
+                    # xml prefix is reserved and never declared
+                    if prefix != 'xml':
+                        namespaces[uri] = prefix
+                qnames[qname] = '%s:%s' % (prefix, name)
+            else:
+                qnames[qname] = qname
+
+        for item in walkShared(node):
+            tag = item.tag
+            if isinstance(tag, string_types) and tag not in qnames:
+                addQName(tag)
+            for key in item._attrib:
+                if key not in qnames:
+                    addQName(key)
+
+        return qnames, namespaces
+
+
+@instrument.timed('serialize.write')
+def write(node, out, encoding='us-ascii', bufferSize=DEFAULT_BUFFER_SIZE, doctype='', indent=None):
+    """ Write XMLTreeNode tree to a writable object
+
+    @param node Top XMLTreeNode of the tree
+    @param out Object with write or sendall method, for example file, socket or BytesIO
+    @param encoding Output encoding, or 'unicode' to write strings without encoding
+    @param bufferSize Amount of characters buffered before writing out
+    @param doctype Documentation type written in the beginning of the output
+    @param indent Number of spaces per level for pretty printing, None to write as is
+    """
+    writer = XMLWriter(out, encoding, bufferSize, indent)
+    # Declaration must be the first thing in the document
+    writer.writeDeclaration()
+    if doctype:
+        writer.write(doctype)
+    writer.writeTree(node)
+    if instrument.registry is not None:
+        instrument.registry.count('serialize.bytes', writer.written)
@@ -0,0 +1,243 @@
+"""@package snapshot
+Compact binary snapshot format of XMLTreeNode trees, for fast save and load
+
+Snapshot consists of a header, string table and node stream:
+  header        Magic, format version, byte order, item size of node stream, string count,
+                string blob size and node stream size
+  string table  Length of every string in bytes, followed by all strings encoded as UTF-8.
+                Highest bit of the length is set for strings having non-ASCII characters.
+  node stream   For every node in document order: position of parent plus one, tag,
+                text and tail string ids, attribute count and string ids of every key and value.
+                Stored as 16 bit integers when all values fit, otherwise as 32 bit integers.
+
+Every distinct string is stored only once. String id 0 is reserved for None
+and 1 for comment tags, strings of the table start from 2.
+"""
+
+import gc
+import struct
+import sys
+import xml.etree.ElementTree
+from array import array
+from compat import COMMENTS, string_types
+from xmltreenode import XMLTreeNode
+
+MAGIC = b'XTNS'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHBBIII')
+_NONE_ID = 0
+_COMMENT_ID = 1
+_FIRST_STRING_ID = 2
+_NON_ASCII = 0x80000000
+
+
+# Array type codes of unsigned integers by their size
+_UINT16 = 'H'
+_UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+_TYPECODES = {2: _UINT16, 4: _UINT32}
+_BYTE_ORDERS = {'little': 0, 'big': 1}
+
+
+def _toBytes(items):
+    """ Get contents of array as bytes
+
+    @param items Array
+    @returns Bytes
+    """
+    if sys.version >= '3':
+        return items.tobytes()
+    return items.tostring()
+
+
+def _fromBytes(data, typecode=_UINT32):
+    """ Create array of unsigned integers from bytes
+
+    @param data Bytes
+    @param typecode Array type code of the integers
+    @returns Array
+    """
+    items = array(typecode)
+    if sys.version >= '3':
+        items.frombytes(data)
+    else:
+        items.fromstring(data)
+    return items
+
+
+def dumps(node):
+    """ Create snapshot of tree
+
+    @param node Top XMLTreeNode of the tree
+    @returns Snapshot as bytes
+    """
+    ids = {}
+    strings = []
+    stream = []
+    append = stream.append
+
+    def intern(value):
+        if value is None:
+            return _NONE_ID
+        key = ids.get(value)
+        if key is None:
+            if not isinstance(value, string_types):
+                raise ValueError('Can not store value %r of type %s in snapshot' % (value, type(value).__name__))
+            key = ids[value] = len(strings) + _FIRST_STRING_ID
+            strings.append(value)
+        return key
+
+    for parent, tag, attrib, text, tail in node.flatten():
+        append(parent + 1)
+        if tag in COMMENTS:
+            append(_COMMENT_ID)
+        else:
+            append(intern(tag))
+        append(intern(text))
+        append(intern(tail))
+        if attrib:
+            append(len(attrib))
+            for key, value in attrib.items():
+                append(intern(key))
+                append(intern(value))
+        else:
+            append(0)
+
+    lengths = array(_UINT32)
+    encoded = []
+    for value in strings:
+        data = value if isinstance(value, bytes) else value.encode('utf-8')
+        length = len(data)
+        if length != len(value):
+            length |= _NON_ASCII
+        lengths.append(length)
+        encoded.append(data)
+    blob = b''.join(encoded)
+    stream = array(_UINT16 if max(stream) < 0x10000 else _UINT32, stream)
+
+    header = _HEADER.pack(MAGIC, VERSION, _BYTE_ORDERS[sys.byteorder], stream.itemsize,
+                          len(strings), len(blob), len(stream))
+    return b''.join((header, _toBytes(lengths), blob, _toBytes(stream)))
+
+
+def loads(data, disableGc=False):
+    """ Load tree from snapshot
+
+    @param data Snapshot as bytes
+    @param disableGc If True, cyclic garbage collection is disabled while building the tree.
+        Building creates no garbage, so this makes loading large snapshots faster,
+        but collector is process wide: collections of other threads are paused too,
+        and a thread enabling it meanwhile enables it for the rest of the load.
+    @returns Root XMLTreeNode of the tree
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError('Not a XMLTreeNode snapshot')
+    magic, version, byteorder, itemsize, count, blobsize, streamsize = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError('Not a XMLTreeNode snapshot')
+    if version != VERSION:
+        raise ValueError('Unsupported snapshot version %d' % (version))
+    if itemsize not in _TYPECODES:
+        raise ValueError('Snapshot is truncated or corrupted')
+
+    pos = _HEADER.size
+    end = pos + 4 * count + blobsize + itemsize * streamsize
+    if len(data) != end:
+        raise ValueError('Snapshot is truncated or corrupted')
+
+    lengths = _fromBytes(data[pos:pos + 4 * count])
+    pos += 4 * count
+    blob = data[pos:pos + blobsize]
+    pos += blobsize
+    stream = _fromBytes(data[pos:end], _TYPECODES[itemsize])
+    if byteorder != _BYTE_ORDERS[sys.byteorder]:
+        lengths.byteswap()
+        stream.byteswap()
+
+    if not disableGc:
+        return _loadTree(blob, lengths, stream)
+
+    # Building the tree allocates lots of objects but creates no garbage,
+    # cyclic garbage collection would only repeatedly scan the growing tree
+    gcenabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _loadTree(blob, lengths, stream)
+    finally:
+        if gcenabled:
+            gc.enable()
+
+
+def _loadTree(blob, lengths, stream):
+    """ Load tree from decoded snapshot contents
+
+    @param blob Blob of strings
+    @param lengths Array of string lengths
+    @param stream Array of node stream
+    @returns Root XMLTreeNode of the tree
+    """
+    strings = [None, xml.etree.ElementTree.Comment]
+    append = strings.append
+    decode = sys.version >= '3'
+    pos = 0
+    for length in lengths:
+        if length & _NON_ASCII:
+            length &= ~_NON_ASCII
+            append(blob[pos:pos + length].decode('utf-8'))
+        elif decode:
+            append(blob[pos:pos + length].decode('ascii'))
+        else:
+            append(blob[pos:pos + length])
+        pos += length
+
+    flat = []
+    stream = stream.tolist()
+    pos = 0
+    end = len(stream)
+    try:
+        while pos < end:
+            parent, tag, text, tail, attribs = stream[pos:pos + 5]
+            pos += 5
+            # Parents come before their children, and only the first node has none
+            if parent > len(flat) or (parent == 0) != (not flat):
+                raise ValueError('Invalid parent')
+            attrib = None
+            if attribs:
+                attrib = {}
+                for i in range(pos, pos + 2 * attribs, 2):
+                    attrib[strings[stream[i]]] = strings[stream[i + 1]]
+                pos += 2 * attribs
+            flat.append((parent - 1, strings[tag], attrib, strings[text], strings[tail]))
+    except (IndexError, ValueError):
+        raise ValueError('Snapshot is truncated or corrupted')
+
+    if not flat:
+        raise ValueError('Snapshot is truncated or corrupted')
+    return XMLTreeNode.fromFlat(flat)
+
+
+def dump(node, out):
+    """ Write snapshot of tree to a file
+
+    @param node Top XMLTreeNode of the tree
+    @param out File name or object with write method
+    """
+    data = dumps(node)
+    if hasattr(out, 'write'):
+        out.write(data)
+        return
+    with open(out, 'wb') as f:
+        f.write(data)
+
+
+def load(inp, disableGc=False):
+    """ Load tree from snapshot file
+
+    @param inp File name or object with read method
+    @param disableGc If True, cyclic garbage collection is disabled while building the tree, see loads
+    @returns Root XMLTreeNode of the tree
+    """
+    if hasattr(inp, 'read'):
+        return loads(inp.read(), disableGc)
+    with open(inp, 'rb') as f:
+        return loads(f.read(), disableGc)
@@ -0,0 +1,190 @@
+"""@package tagfilter
+Pruning of the parsed tree by tag paths while parsing, see CustomXMLParser.load
+
+Path is tag names separated by slashes, like items/item. It matches elements whose
+own tag and the tags of their closest ancestors are the given ones, so item matches
+item elements at any depth. Path starting with slash is matched from the root element,
+like /catalog/items/item. Asterisk matches any tag.
+
+Excluded elements are skipped with their subtrees. With include paths only the
+matching elements are kept with their subtrees, and their ancestors without text
+so that kept nodes have their parent chain. Skipped elements are never created,
+parser events of their subtrees only update a depth counter.
+"""
+
+import re
+from xml.etree.ElementTree import Comment
+
+# Tag with namespace may contain slashes inside the braces
+_PART = re.compile(r'\{[^}]*\}[^/]*|[^/]+')
+
+
+def splitPath(path):
+    """ Split path to its parts
+
+    @param path Path string
+    @returns List of tags
+    """
+    return _PART.findall(path)
+
+
+class TagPaths(object):
+    """ Set of compiled tag paths
+    """
+
+    def __init__(self, paths):
+        """ Initialize
+
+        @param paths List of path strings
+        """
+        self.paths = tuple(paths)
+        # Paths by their last tag, paths ending with asterisk are under None
+        self.__byTag = {}
+        for path in self.paths:
+            anchored = path.startswith('/')
+            parts = tuple(splitPath(path))
+            if not parts:
+                raise ValueError('Empty tag path: %r' % (path, ))
+            last = parts[-1] if parts[-1] != '*' else None
+            self.__byTag.setdefault(last, []).append((anchored, parts))
+
+    def match(self, tags):
+        """ Check if element matches any path
+
+        @param tags List of tags from the root element to the element
+        @returns True if matches, False otherwise
+        """
+        byTag = self.__byTag
+        candidates = byTag.get(tags[-1])
+        if candidates is not None and self.__matchAny(candidates, tags):
+            return True
+        candidates = byTag.get(None)
+        return candidates is not None and self.__matchAny(candidates, tags)
+
+    @staticmethod
+    def __matchAny(candidates, tags):
+        depth = len(tags)
+        for anchored, parts in candidates:
+            count = len(parts)
+            if count > depth or (anchored and count != depth):
+                continue
+            for part, tag in zip(parts, tags[depth - count:]):
+                if part != '*' and part != tag:
+                    break
+            else:
+                return True
+        return False
+
+
+def compilePaths(paths):
+    """ Compile tag paths
+
+    @param paths List of path strings, TagPaths instance or None
+    @returns TagPaths instance, None if paths is None
+    """
+    if paths is None or isinstance(paths, TagPaths):
+        return paths
+    return TagPaths(paths)
+
+
+class FilterTarget(object):
+    """ Parser target passing only the events of kept elements to the real target
+    """
+
+    def __init__(self, target, parser, include=None, exclude=None):
+        """ Initialize
+
+        @param target Parser target, for example CustomXMLParser
+        @param parser CustomXMLParser building the tree, notified of skipped elements
+        @param include TagPaths of elements to keep, None to keep all elements which are not excluded
+        @param exclude TagPaths of elements to skip, None to skip nothing
+        """
+        self.target = target
+        self.parser = parser
+        self.include = include
+        self.exclude = exclude
+
+        # Depth inside skipped subtree, and tag of its last element or comment
+        self.__skipping = 0
+        self.__lastSkipped = None
+        # Tags of the open elements which are not skipped
+        self.__tags = []
+        # Open elements which are not skipped, as lists of tag, attributes,
+        # whether the whole subtree is kept, and whether the element has been passed to target
+        self.__open = []
+        self.__rootKept = None
+        self.__rootComments = []
+
+    def start(self, tag, attrib):
+        if self.__skipping:
+            self.__skipping += 1
+            self.__lastSkipped = tag
+            return
+
+        tags = self.__tags
+        tags.append(tag)
+        if self.exclude is not None and self.exclude.match(tags):
+            tags.pop()
+            self.__skipping = 1
+            self.__lastSkipped = tag
+            return
+
+        opened = self.__open
+        kept = self.include is None or bool(opened and opened[-1][2]) or self.include.match(tags)
+        if not opened:
+            self.__rootKept = kept
+            if kept:
+                for data in self.__rootComments:
+                    self.target.comment(data)
+            self.__rootComments = []
+        elif kept and not opened[-1][3]:
+            # Pass the ancestors the first time something is kept below them,
+            # passed ones are all above the ones not passed yet
+            first = len(opened) - 1
+            while not opened[first - 1][3]:
+                first -= 1
+            for entry in opened[first:]:
+                self.target.start(entry[0], entry[1])
+                entry[3] = True
+
+        # Root element is always passed, so that there's a tree
+        passed = kept or not opened
+        opened.append([tag, attrib, kept, passed])
+        if passed:
+            self.target.start(tag, attrib)
+
+    def end(self, tag):
+        if self.__skipping:
+            self.__skipping -= 1
+            if not self.__skipping:
+                # Text after the skipped subtree is handled as if it had been parsed
+                self.parser.skipTag(self.__lastSkipped)
+            return
+
+        self.__tags.pop()
+        entry = self.__open.pop()
+        if entry[3]:
+            self.target.end(tag)
+
+    def data(self, data):
+        if self.__skipping:
+            return
+        opened = self.__open
+        if opened and opened[-1][2]:
+            self.target.data(data)
+
+    def comment(self, data):
+        if self.__skipping:
+            self.__lastSkipped = Comment
+            return
+        opened = self.__open
+        if opened:
+            if opened[-1][2]:
+                self.target.comment(data)
+        elif self.__rootKept is None:
+            self.__rootComments.append(data)
+        elif self.__rootKept:
+            self.target.comment(data)
+
+    def close(self):
+        return self.target.close()
@@ -0,0 +1,23 @@
+"""@package textrules
+Rules of keeping element text from the data reported by the parser
+
+All data between two parser events, start or end of element or comment, is handled
+as one text. Lines of only whitespace are dropped from it, so indentation between
+elements is not kept. Text of a comment, and text after it, is kept as is.
+
+Parser splits data in pieces at line breaks, references and chunks fed to it,
+applying the rules to the whole text keeps the result same however input is split.
+"""
+
+
+def keepText(text):
+    """ Get text left after lines of only whitespace are dropped
+
+    @param text Text between two parser events
+    @returns Kept text, empty string if nothing is kept
+    """
+    if '\n' not in text:
+        if text.strip():
+            return text
+        return ''
+    return ''.join([line for line in text.split('\n') if line.strip()])
@@ -0,0 +1,193 @@
+"""@package traversal
+Non-recursive traversal of XMLTreeNode trees
+"""
+
+from itertools import islice
+import instrument
+
+
+def walk(node):
+    """ Walk through node and its subtree in document order.
+    Uses explicit stack of child iterators instead of recursion, so depth
+    of the tree is not limited by Python recursion limit and every node is
+    yielded only once instead of passing through all ancestor generators.
+
+    @param node Top XMLTreeNode of the subtree
+    @returns Generator of XMLTreeNode instances
+    """
+    if instrument.registry is not None:
+        return _countedWalk(node, instrument.registry)
+    return _walk(node)
+
+
+def _countedWalk(node, registry):
+    """ Walk through the subtree counting visited nodes to registry
+
+    @param node Top XMLTreeNode of the subtree
+    @param registry instrument.Registry instance
+    @returns Generator of XMLTreeNode instances
+    """
+    count = 0
+    try:
+        for item in _walk(node):
+            count += 1
+            yield item
+    finally:
+        registry.count('walk.nodes', count)
+
+
+def _walk(node):
+    """ Walk through node and its subtree in document order, see walk
+
+    @param node Top XMLTreeNode of the subtree
+    @returns Generator of XMLTreeNode instances
+    """
+    yield node
+    stack = [iter(node._children)]
+    append = stack.append
+    pop = stack.pop
+    while stack:
+        for child in stack[-1]:
+            yield child
+            if child._children:
+                append(iter(child._children))
+            break
+        else:
+            pop()
+
+
+def sharedChildren(node):
+    """ Get children of node for reading only. Cloned nodes whose children
+    are not copied yet give the children of their template instead, see cowclone.
+
+    @param node XMLTreeNode
+    @returns List of children, must not be modified
+    """
+    template = node._template
+    if template is None:
+        return node._children
+    return template._children
+
+
+def select(node, predicate, includeSelf=True):
+    """ Walk through node and its subtree in document order like walk,
+    yielding only the nodes matching predicate. Children shared by cloned
+    nodes are tested without copying them, only the levels leading to
+    the matching nodes are copied, see cowclone.
+    Nodes must not be added or removed while iterating, except below the yielded nodes.
+
+    @param node Top XMLTreeNode of the subtree
+    @param predicate Function called with XMLTreeNode, True if node is wanted
+    @param includeSelf True if node itself can be yielded
+    @returns Generator of XMLTreeNode instances
+    """
+    if instrument.registry is not None:
+        return _countedSelect(node, predicate, includeSelf, instrument.registry)
+    return _select(node, predicate, includeSelf)
+
+
+def _countedSelect(node, predicate, includeSelf, registry):
+    """ Select nodes from the subtree counting visited nodes to registry
+
+    @param node Top XMLTreeNode of the subtree
+    @param predicate Function called with XMLTreeNode, True if node is wanted
+    @param includeSelf True if node itself can be yielded
+    @param registry instrument.Registry instance
+    @returns Generator of XMLTreeNode instances
+    """
+    # Predicate is called once for every visited node, except node itself when it's not included
+    count = [0 if includeSelf else 1]
+
+    def counted(item):
+        count[0] += 1
+        return predicate(item)
+
+    try:
+        for item in _select(node, counted, includeSelf):
+            yield item
+    finally:
+        registry.count('walk.nodes', count[0])
+
+
+def _select(node, predicate, includeSelf):
+    """ Select nodes matching predicate from the subtree, see select
+
+    @param node Top XMLTreeNode of the subtree
+    @param predicate Function called with XMLTreeNode, True if node is wanted
+    @param includeSelf True if node itself can be yielded
+    @returns Generator of XMLTreeNode instances
+    """
+    if includeSelf and predicate(node):
+        yield node
+
+    # Entries of the stack are children iterators of nodes, and for shared
+    # children the nearest node and indices of the path from it to the children
+    stack = [_selectEntry(node)]
+    append = stack.append
+    pop = stack.pop
+    while stack:
+        children, owner, path = stack[-1]
+        if owner is None:
+            for child in children:
+                if predicate(child):
+                    yield child
+                if child._template is not None or child._children:
+                    append(_selectEntry(child))
+                    break
+            else:
+                pop()
+            continue
+
+        for index, child in children:
+            childpath = path + (index, )
+            if predicate(child):
+                # Copy the levels down to the matching node, and continue
+                # the walk with the copied nodes instead of the shared ones
+                base = len(stack) - len(childpath)
+                found = owner
+                for level, pos in enumerate(childpath):
+                    copied = found._children
+                    stack[base + level] = (islice(copied, pos + 1, None), None, None)
+                    found = copied[pos]
+                yield found
+                if found._template is not None or found._children:
+                    append(_selectEntry(found))
+            elif sharedChildren(child):
+                append((enumerate(sharedChildren(child)), owner, childpath))
+            break
+        else:
+            pop()
+
+
+def _selectEntry(node):
+    """ Create stack entry of select for children of node
+
+    @param node XMLTreeNode
+    @returns Tuple of children iterator, nearest node and path to the children
+    """
+    template = node._template
+    if template is None:
+        return (iter(node._children), None, None)
+    return (enumerate(template._children), node, ())
+
+
+def walkShared(node):
+    """ Walk through node and its subtree in document order like walk,
+    without copying children of cloned nodes. Nodes must not be modified.
+
+    @param node Top XMLTreeNode of the subtree
+    @returns Generator of XMLTreeNode instances
+    """
+    yield node
+    stack = [iter(sharedChildren(node))]
+    append = stack.append
+    pop = stack.pop
+    while stack:
+        for child in stack[-1]:
+            yield child
+            children = sharedChildren(child)
+            if children:
+                append(iter(children))
+            break
+        else:
+            pop()
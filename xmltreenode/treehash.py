@@ -0,0 +1,239 @@
+"""@package treehash
+Structural hashing of XMLTreeNode trees, for fast equality checks and diffs
+
+Digest of a node covers its tag, attributes, text, tail and digests of its children,
+so equal subtrees have equal digests. Ordered digest depends on the order of the children,
+unordered digest sorts the digests of the children first.
+Digests are cached in the nodes as tuple of ordered and unordered digest,
+either of which is None until it is needed, see XMLTreeNode.digest.
+"""
+
+import hashlib
+import struct
+from compat import COMMENTS, string_types
+
+# Changes reported by diff
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+# Packers of value lengths of node headers by number of values
+_lengthPackers = {}
+_packNoAttrib = struct.Struct('<4i').pack
+
+
+def _bytes(value):
+    """ Convert value to bytes for hashing
+
+    @param value Any value
+    @returns Bytes, empty for None
+    """
+    if value is None:
+        return b''
+    if not isinstance(value, string_types):
+        value = '%s' % (value, )
+    if not isinstance(value, bytes):
+        value = value.encode('utf-8')
+    return value
+
+
+def header(node):
+    """ Get hashed contents of the node itself, without children
+
+    @param node XMLTreeNode
+    @returns Bytes
+    """
+    tag = node.tag
+    attrib = node._attrib
+    # Same as node.text, without the property call
+    text = node._text if node._textChunks is None else node.text
+    tail = node.tail
+
+    # Number of the values and their lengths make the joined string unambiguous
+    try:
+        if attrib:
+            values = [tag]
+            for key in sorted(attrib):
+                values.append(key)
+                values.append(attrib[key])
+            values.append(text)
+            values.append(tail)
+            data = ''.join(values)
+            lengths = _lengthPacker(len(values))(len(values), *map(len, values))
+        else:
+            # Most nodes have no attributes
+            data = tag + text + tail
+            lengths = _packNoAttrib(3, len(tag), len(text), len(tail))
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return lengths + data
+    except (TypeError, UnicodeError):
+        # Comments, values which are not strings, or mixed non-ASCII byte and unicode strings
+        pass
+
+    comment = tag in COMMENTS
+    values = [] if comment else [tag]
+    if attrib:
+        for key in sorted(attrib):
+            values.append(key)
+            values.append(attrib[key])
+    values.append(text)
+    values.append(tail)
+    strings = [_bytes(value) for value in values]
+    lengths = [len(string) if value is not None else -1 for value, string in zip(values, strings)]
+    # Comments have no tag, their number of values is negative
+    count = -len(values) if comment else len(values)
+    return _lengthPacker(len(values))(count, *lengths) + b''.join(strings)
+
+
+def _lengthPacker(count):
+    """ Get function packing number of values and their lengths for header
+
+    @param count Number of values
+    @returns Pack function of struct.Struct
+    """
+    packer = _lengthPackers.get(count)
+    if packer is None:
+        packer = _lengthPackers[count] = struct.Struct('<%di' % (count + 1, )).pack
+    return packer
+
+
+def update(node, ordered=True):
+    """ Compute and cache digests of node and its subtree, where missing.
+    Subtrees having cached digests are not visited. Ordered and unordered
+    digests are computed separately, only when asked, except for leaves
+    whose digests are the same.
+
+    @param node XMLTreeNode
+    @param ordered True for ordered digest, False for unordered
+    @returns Digest of the node as bytes
+    """
+    pos = 0 if ordered else 1
+    digest = node._digest
+    if digest is not None and digest[pos] is not None:
+        return digest[pos]
+
+    # Leaves are hashed when found, equal leaves only once. Parents are before
+    # their children in preorder, so reversed preorder handles every child before its parent
+    sha1 = hashlib.sha1
+    leaves = {}
+    order = []
+    stack = [node]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        # Same as traversal.sharedChildren, called for every node
+        template = item._template
+        children = item._children if template is None else template._children
+        if not children:
+            # Order of children does not matter for leaves
+            data = header(item)
+            digest = leaves.get(data)
+            if digest is None:
+                digest = sha1(data).digest()
+                digest = leaves[data] = (digest, digest)
+            item._digest = digest
+            continue
+        order.append((item, children))
+        for child in children:
+            digest = child._digest
+            if digest is None or digest[pos] is None:
+                push(child)
+
+    for item, children in reversed(order):
+        hashed = sha1(header(item))
+        digest = item._digest
+        if ordered:
+            hashed.update(b''.join([child._digest[0] for child in children]))
+            item._digest = (hashed.digest(), digest[1] if digest is not None else None)
+        else:
+            hashed.update(b''.join(sorted([child._digest[1] for child in children])))
+            item._digest = (digest[0] if digest is not None else None, hashed.digest())
+
+    return node._digest[pos]
+
+
+def diff(node, other, ordered=True):
+    """ Find differences between two trees.
+    Subtrees with equal digests are skipped without visiting them.
+    In ordered mode children are paired by position. Otherwise equal
+    children are paired first and the rest by tag, in document order.
+    Nodes with different tags are reported as removed and added.
+
+    @param node Top XMLTreeNode of the first tree
+    @param other Top XMLTreeNode of the second tree
+    @param ordered True if order of children matters
+    @returns List of tuples of change, node of first tree and node of second tree.
+        Change is ADDED, REMOVED or CHANGED, missing node is None.
+        CHANGED means that tag, attributes, text or tail differ,
+        changes of children are reported separately.
+    """
+    changes = []
+    stack = [(node, other)]
+    while stack:
+        a, b = stack.pop()
+        if b is None:
+            changes.append((REMOVED, a, None))
+            continue
+        if a is None:
+            changes.append((ADDED, None, b))
+            continue
+        if update(a, ordered) == update(b, ordered):
+            continue
+        if a.tag != b.tag:
+            changes.append((REMOVED, a, None))
+            changes.append((ADDED, None, b))
+            continue
+        if header(a) != header(b):
+            changes.append((CHANGED, a, b))
+
+        pairs = _pairChildren(list(a._children), list(b._children), ordered)
+        stack.extend(reversed(pairs))
+
+    return changes
+
+
+def _pairChildren(children, others, ordered):
+    """ Pair children of two nodes for diff
+
+    @param children Children of the first node
+    @param others Children of the second node
+    @param ordered True if order of children matters
+    @returns List of pairs, missing child is None
+    """
+    if ordered:
+        pairs = list(zip(children, others))
+        pairs.extend((child, None) for child in children[len(others):])
+        pairs.extend((None, child) for child in others[len(children):])
+        return pairs
+
+    # Equal children need no further checks, drop them
+    unmatched = {}
+    for child in others:
+        unmatched.setdefault(child._digest[1], []).append(child)
+    rest = []
+    for child in children:
+        same = unmatched.get(child._digest[1])
+        if same:
+            same.pop()
+        else:
+            rest.append(child)
+    left = set(id(child) for same in unmatched.values() for child in same)
+    others = [child for child in others if id(child) in left]
+
+    # Pair the rest by tag in document order
+    byTag = {}
+    for child in reversed(others):
+        byTag.setdefault(child.tag, []).append(child)
+    pairs = []
+    for child in rest:
+        same = byTag.get(child.tag)
+        if same:
+            match = same.pop()
+            left.discard(id(match))
+            pairs.append((child, match))
+        else:
+            pairs.append((child, None))
+    pairs.extend((None, child) for child in others if id(child) in left)
+    return pairs
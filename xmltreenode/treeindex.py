@@ -0,0 +1,446 @@
+"""@package treeindex
+Index of XMLTreeNode tree for fast lookups
+"""
+
+from bisect import bisect_left, bisect_right
+from traversal import walk
+
+# Distance between positions of consecutive nodes when document order is resolved,
+# leaves room for positions of the nodes added later
+POSITION_GAP = 1 << 32
+
+
+class TreeIndex(object):
+    """ Index of all nodes in a XMLTreeNode tree by their tag name,
+    and optionally by values of selected attributes.
+    Index is attached to every node of the tree and kept up to date by
+    XMLTreeNode methods modifying the tree, see XMLTreeNode.enableIndex.
+    Document order of the nodes is resolved lazily on the first lookup.
+    After that added subtrees get positions between their neighbours and only
+    they are added to or removed from the ordered lookups, the whole tree is
+    walked again only when there's no room left between the neighbours.
+    """
+
+    def __init__(self, root, attributes=()):
+        """ Initialize and index the tree
+
+        @param root Root XMLTreeNode of the indexed tree
+        @param attributes Names of the attributes to index by value
+        """
+        self.root = root
+        self.attributes = set(attributes)
+        self.__tags = {}
+        self.__values = {}
+        self.__ordered = {}
+        self.__orderedValues = {}
+        self.__positions = None
+        self.__lasts = None
+
+        self.addTree(root)
+
+    def __add(self, table, key, node):
+        """ Add node under key in index table
+
+        @param table Index table
+        @param key Key
+        @param node XMLTreeNode instance
+        """
+        nodes = table.get(key)
+        if nodes is None:
+            nodes = table[key] = set()
+        nodes.add(node)
+
+    def __discard(self, table, key, node):
+        """ Remove node from key in index table, if it's there
+
+        @param table Index table
+        @param key Key
+        @param node XMLTreeNode instance
+        """
+        nodes = table.get(key)
+        if nodes is not None:
+            nodes.discard(node)
+            if not nodes:
+                del table[key]
+
+    def __resolveOrder(self):
+        """ Resolve document order and subtree extent of all nodes.
+        Positions of the nodes in ordered lookups are updated, their order stays the same.
+        """
+        positions = {}
+        lasts = {}
+        counter = 0
+        positions[self.root] = counter
+        stack = [(self.root, iter(self.root._children))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                counter += POSITION_GAP
+                positions[child] = counter
+                stack.append((child, iter(child._children)))
+                break
+            else:
+                lasts[node] = counter
+                stack.pop()
+
+        self.__positions = positions
+        self.__lasts = lasts
+
+        for cache in (self.__ordered, self.__orderedValues):
+            for labels, nodes in cache.values():
+                labels[:] = [positions[node] for node in nodes]
+
+    def __siblingIndex(self, siblings, node):
+        """ Find index of node in list of its siblings
+
+        @param siblings List of children of the parent of node
+        @param node XMLTreeNode instance
+        @returns Index of node
+        """
+        # Added nodes are usually the last ones
+        if siblings[-1] is node:
+            return len(siblings) - 1
+        for index, sibling in enumerate(siblings):
+            if sibling is node:
+                return index
+        raise ValueError('Node is not child of its parent')
+
+    def __nextPosition(self, node):
+        """ Get position of the first node after subtree of node in document order
+
+        @param node XMLTreeNode instance in the indexed tree
+        @returns Position, or None if subtree of node is last in the tree
+        """
+        while node is not self.root:
+            parent = node.getParent()
+            siblings = parent._children
+            index = self.__siblingIndex(siblings, node)
+            if index + 1 < len(siblings):
+                return self.__positions[siblings[index + 1]]
+            node = parent
+        return None
+
+    def __placeTree(self, node, nodes):
+        """ Give positions to the nodes of added subtree between its neighbours
+
+        @param node Top XMLTreeNode of the subtree
+        @param nodes List of XMLTreeNode instances of the subtree in document order
+        """
+        positions = self.__positions
+        lasts = self.__lasts
+
+        parent = node.getParent()
+        siblings = parent._children
+        index = self.__siblingIndex(siblings, node)
+        if index > 0:
+            before = lasts[siblings[index - 1]]
+        else:
+            before = positions[parent]
+        after = self.__nextPosition(node)
+
+        if after is None:
+            step = POSITION_GAP
+        else:
+            step = (after - before) // (len(nodes) + 1)
+        if step < 1:
+            # No room left between the neighbours
+            self.__resolveOrder()
+            return
+
+        position = before
+        for item in nodes:
+            position += step
+            positions[item] = position
+        # Children come after their parent, so their extents are known first
+        for item in reversed(nodes):
+            children = item._children
+            lasts[item] = lasts[children[-1]] if children else positions[item]
+
+        ancestor = parent
+        while lasts[ancestor] < position:
+            lasts[ancestor] = position
+            if ancestor is self.root:
+                break
+            ancestor = ancestor.getParent()
+
+    def __valueKeys(self, node):
+        """ Get keys of indexed attribute values of node
+
+        @param node XMLTreeNode instance
+        @returns List of tuples of attribute name and value
+        """
+        attrib = node._attrib
+        if not attrib:
+            return []
+        return [(name, attrib[name]) for name in self.attributes if name in attrib]
+
+    def __groupOrdered(self, nodes):
+        """ Group nodes by the ordered lookups they are part of
+
+        @param nodes List of XMLTreeNode instances in document order
+        @returns List of tuples of ordered lookup and list of its nodes in document order
+        """
+        groups = {}
+        ordered = self.__ordered
+        orderedValues = self.__orderedValues
+        for item in nodes:
+            if item.tag in ordered:
+                groups.setdefault((True, item.tag), []).append(item)
+            if orderedValues:
+                for key in self.__valueKeys(item):
+                    if key in orderedValues:
+                        groups.setdefault((False, key), []).append(item)
+
+        return [((ordered if isTag else orderedValues)[key], items)
+                for (isTag, key), items in groups.items()]
+
+    def __orderedAdd(self, cache, key, node):
+        """ Add node to ordered lookup, if the lookup is cached
+
+        @param cache Cache of ordered nodes
+        @param key Key
+        @param node XMLTreeNode instance
+        """
+        ordered = cache.get(key)
+        if ordered is not None:
+            labels, nodes = ordered
+            position = self.__positions[node]
+            at = bisect_left(labels, position)
+            labels.insert(at, position)
+            nodes.insert(at, node)
+
+    def __orderedDiscard(self, cache, key, node):
+        """ Remove node from ordered lookup, if the lookup is cached
+
+        @param cache Cache of ordered nodes
+        @param key Key
+        @param node XMLTreeNode instance
+        """
+        ordered = cache.get(key)
+        if ordered is not None:
+            labels, nodes = ordered
+            at = bisect_left(labels, self.__positions[node])
+            if at < len(nodes) and nodes[at] is node:
+                del labels[at]
+                del nodes[at]
+
+    def addTree(self, node):
+        """ Add subtree to the index
+
+        @param node Top XMLTreeNode of the subtree
+        """
+        attributes = self.attributes
+        nodes = list(walk(node))
+        for item in nodes:
+            item._index = self
+            self.__add(self.__tags, item.tag, item)
+            if attributes and item._attrib:
+                self.__addValues(item, item._attrib, attributes)
+
+        if self.__positions is None:
+            return
+
+        self.__placeTree(node, nodes)
+        positions = self.__positions
+        # Positions of the subtree are between its neighbours,
+        # so nodes of the subtree are next to each other in every lookup
+        for (labels, ordered), items in self.__groupOrdered(nodes):
+            added = [positions[item] for item in items]
+            at = bisect_left(labels, added[0])
+            labels[at:at] = added
+            ordered[at:at] = items
+
+    def removeTree(self, node):
+        """ Remove subtree from the index
+
+        @param node Top XMLTreeNode of the subtree
+        """
+        nodes = list(walk(node))
+        positions = self.__positions
+        if positions is not None:
+            first = positions[node]
+            last = self.__lasts[node]
+            for (labels, ordered), items in self.__groupOrdered(nodes):
+                start = bisect_left(labels, first)
+                end = bisect_right(labels, last, start)
+                del labels[start:end]
+                del ordered[start:end]
+            for item in nodes:
+                del positions[item]
+                del self.__lasts[item]
+
+        attributes = self.attributes
+        for item in nodes:
+            item._index = None
+            self.__discard(self.__tags, item.tag, item)
+            if attributes and item._attrib:
+                self.__discardValues(item, item._attrib)
+
+    def clear(self):
+        """ Remove all nodes from the index
+        """
+        self.removeTree(self.root)
+
+    def retag(self, node, oldtag, newtag):
+        """ Update index when tag of node changes
+
+        @param node XMLTreeNode instance
+        @param oldtag Previous tag
+        @param newtag New tag
+        """
+        self.__discard(self.__tags, oldtag, node)
+        self.__orderedDiscard(self.__ordered, oldtag, node)
+        self.__add(self.__tags, newtag, node)
+        self.__orderedAdd(self.__ordered, newtag, node)
+
+    def __addValues(self, node, attrib, names):
+        """ Add indexed attribute values of node
+
+        @param node XMLTreeNode instance
+        @param attrib Attribute dictionary of the node
+        @param names Names of attributes to add
+        """
+        for name in names:
+            if name in attrib:
+                self.__add(self.__values, (name, attrib[name]), node)
+
+    def __discardValues(self, node, attrib):
+        """ Remove indexed attribute values of node
+
+        @param node XMLTreeNode instance
+        @param attrib Attribute dictionary of the node
+        """
+        for name in self.attributes:
+            if name in attrib:
+                self.__discard(self.__values, (name, attrib[name]), node)
+
+    def __addValue(self, node, key):
+        """ Add attribute value of node already in the tree
+
+        @param node XMLTreeNode instance
+        @param key Tuple of attribute name and value
+        """
+        self.__add(self.__values, key, node)
+        self.__orderedAdd(self.__orderedValues, key, node)
+
+    def __discardValue(self, node, key):
+        """ Remove attribute value of node still in the tree
+
+        @param node XMLTreeNode instance
+        @param key Tuple of attribute name and value
+        """
+        self.__discard(self.__values, key, node)
+        self.__orderedDiscard(self.__orderedValues, key, node)
+
+    def addAttributes(self, names):
+        """ Start indexing values of more attributes
+
+        @param names Names of the attributes
+        """
+        names = set(names) - self.attributes
+        if not names:
+            return
+
+        self.attributes.update(names)
+        for item in walk(self.root):
+            if item._attrib:
+                self.__addValues(item, item._attrib, names)
+
+    def setAttrib(self, node, key, value):
+        """ Update index before attribute of node is set
+
+        @param node XMLTreeNode instance
+        @param key Attribute name
+        @param value New value of the attribute
+        """
+        if key in self.attributes:
+            self.delAttrib(node, key)
+            self.__addValue(node, (key, value))
+
+    def delAttrib(self, node, key):
+        """ Update index before attribute of node is removed
+
+        @param node XMLTreeNode instance
+        @param key Attribute name
+        """
+        if key in self.attributes and key in node._attrib:
+            self.__discardValue(node, (key, node._attrib[key]))
+
+    def setAttributes(self, node, attrib):
+        """ Update index before all attributes of node are replaced
+
+        @param node XMLTreeNode instance
+        @param attrib New attribute dictionary
+        """
+        for name in self.attributes:
+            if name in node._attrib:
+                self.__discardValue(node, (name, node._attrib[name]))
+            if name in attrib:
+                self.__addValue(node, (name, attrib[name]))
+
+    def __orderedNodes(self, table, cache, key):
+        """ Get nodes under key in document order
+
+        @param table Index table
+        @param cache Cache of ordered nodes for the table
+        @param key Key
+        @returns Tuple of list of positions and list of XMLTreeNode instances
+        """
+        ordered = cache.get(key)
+        if ordered is not None:
+            return ordered
+
+        if self.__positions is None:
+            self.__resolveOrder()
+        positions = self.__positions
+
+        nodes = sorted(table.get(key, ()), key=positions.__getitem__)
+        ordered = ([positions[node] for node in nodes], nodes)
+        cache[key] = ordered
+        return ordered
+
+    def findByTag(self, node, tag, includeSelf=True):
+        """ Find nodes with tag in the subtree
+
+        @param node Top XMLTreeNode of the subtree to search from
+        @param tag Tag name
+        @param includeSelf True if node itself is included in the results
+        @returns List of XMLTreeNode instances in document order
+        """
+        ordered = self.__orderedNodes(self.__tags, self.__ordered, tag)
+        return self.__subtreeNodes(node, ordered, includeSelf)
+
+    def findByAttrib(self, node, name, value):
+        """ Find nodes with attribute value in the subtree, attribute must be indexed
+
+        @param node Top XMLTreeNode of the subtree to search from
+        @param name Attribute name
+        @param value Attribute value
+        @returns List of XMLTreeNode instances in document order
+        """
+        ordered = self.__orderedNodes(self.__values, self.__orderedValues, (name, value))
+        return self.__subtreeNodes(node, ordered)
+
+    def __subtreeNodes(self, node, ordered, includeSelf=True):
+        """ Pick nodes in the subtree from ordered nodes
+
+        @param node Top XMLTreeNode of the subtree
+        @param ordered Tuple of list of positions and list of XMLTreeNode instances
+        @param includeSelf True if node itself is included in the results
+        @returns List of XMLTreeNode instances in document order
+        """
+        positions, nodes = ordered
+        if not nodes:
+            return []
+
+        if node is self.root:
+            first = 0
+            last = len(nodes)
+        else:
+            first = bisect_left(positions, self.__positions[node])
+            last = bisect_right(positions, self.__lasts[node], first)
+
+        if not includeSelf and first < last and nodes[first] is node:
+            first += 1
+
+        return nodes[first:last]
@@ -3,6 +3,15 @@ Primary XML parsing interface as well some other misc support functionality
 """
 
 from __future__ import print_function
+import mmap
+import multiprocessing
+import sys
+from xml.parsers import expat
+import bulkbuild
+import doccache
+import instrument
+import tagfilter
+from textrules import keepText
 from xmltreenode import XMLTreeNode
 from xml.etree.ElementTree import Comment
 from xml.etree.ElementTree import XMLParser
@@ -31,7 +40,6 @@ class CommentParser(XMLParser):
 
 use_cetree = True
 if use_cetree:
-    import sys
     if sys.version >= '3.3':
         from xml.etree.ElementTree import ParseError
         from xml.etree.ElementTree import XMLParser
@@ -43,22 +51,96 @@ else:
     from xml.etree.ElementTree import ParseError  # NOQA
     xml_parser = CommentParser
 
+# Size of slices of memory mapped file fed to parser at once
+MMAP_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def _loadFile(args):
+    """ Parse one file of loadFiles batch
+
+    @param args Tuple of path and keyword arguments for load
+    @returns Tuple of path, root XMLTreeNode and error message.
+        Any exception fails only this file, root is None and the exception is described in the message
+    """
+    path, options = args
+    try:
+        return (path, CustomXMLParser().load(path, **options).getRoot(), None)
+    except ValueError as e:
+        # Messages of load include the path
+        return (path, None, str(e))
+    except Exception as e:
+        return (path, None, 'Failed to load %s: %s: %s' % (path, type(e).__name__, e))
+
+
+def _loadWorker(args):
+    """ Parse one file of loadFiles batch in worker process
+
+    @param args Tuple of path and keyword arguments for load
+    @returns Tuple of path, flattened tree and error message
+    """
+    path, root, error = _loadFile(args)
+    if root is not None:
+        root = root.flatten()
+    return (path, root, error)
+
+
+def detachStreamed(node, tag):
+    """ Release handled subtree of streamed element from the tree, see CustomXMLParser.iterLoad.
+    Element inside an element with the same tag is kept, so that the outer
+    element is complete when it's handled, and released with it.
+
+    @param node XMLTreeNode instance to remove from its parent
+    @param tag Tag name of the streamed elements
+    """
+    par = node.getParent()
+    ancestor = par
+    while ancestor is not None:
+        if ancestor.tag == tag:
+            return
+        ancestor = ancestor.getParent()
+    if par is not None:
+        par.removeChild(node)
+
 
 class CustomXMLParser():
     """Special class meant to use with XMLParser to get walkthrough of the XML parse tree
     Will create tree presentation of XML file utilizing the XMLTreeNode class.
     """
 
-    def __init__(self, parseSpecial=True):
+    def __init__(self, parseSpecial=True, internTable=None, internValues=()):
         """Initialize
 
         @param parseSpecial If True, will parse and handle special tags. If you need only bare parsing, set this to False
+        @param internTable Dictionary used to share equal tag names and attribute keys as one string object, None disables interning.
+            Give the same dictionary to several parsers to share the strings between documents
+        @param internValues Names of attributes whose values are interned too, or True for all attributes.
+            Meant for attributes with few distinct values, requires internTable
         """
+        if internValues and internTable is None:
+            raise ValueError('Interning attribute values requires internTable')
+        self.__internTable = internTable
+        self.__internValues = internValues if internValues is True else frozenset(internValues)
+
         self.__name = ""
         self.__node = None
         self.__root = None
         self.__tagname = None
         self.__rootcomments = []
+        # Text pieces reported since the last event, see textrules
+        self.__pending = []
+
+        self.__streamtag = None
+        self.__streamed = []
+        self.__feeder = None
+
+        # Callable creating XMLTreeNode instances for tags
+        self.nodeFactory = XMLTreeNode
+
+        # Numbers of nodes and attributes built by the last load and size of its input,
+        # for estimating memory of cached documents
+        self.__nodeCount = 0
+        self.__attribCount = 0
+        self.__inputSize = 0
 
         self.__ignore_errors = False
 
@@ -104,12 +186,40 @@ class CustomXMLParser():
         """
         return self.__root
 
+    def __target(self, include=None, exclude=None, builder=None):
+        """ Get target for XML parser, measuring the events when instrumentation is enabled
+
+        @param include TagPaths of elements to keep, see tagfilter
+        @param exclude TagPaths of elements to skip, see tagfilter
+        @param builder Target building the document, this parser by default, see parseTarget
+        @returns Target object
+        """
+        if builder is None:
+            builder = self
+        target = builder
+        registry = instrument.registry
+        if registry is not None:
+            target = instrument.InstrumentedTarget(target, registry)
+        if include is not None or exclude is not None:
+            target = tagfilter.FilterTarget(target, builder, include, exclude)
+        return target
+
+    def skipTag(self, tag):
+        """ Called by filtering targets after a skipped subtree,
+        so text after it is handled the same as if the subtree had been parsed
+
+        @param tag Tag name of the last element in the subtree, or Comment if comment was the last
+        """
+        if self.__pending:
+            self.__flushData()
+        self.__name = tag
+
     def startHandleTag(self):
         """ Handle normal tag, just create new XMLTreeNode and set it as child to current node or make it the root node
 
         """
         # Just a normal, non-empty tag, so create tree node
-        node = XMLTreeNode(self.__name)
+        node = self.nodeFactory(self.__name)
 
         if self.__node is not None:
             self.__node.addChild(node)
@@ -137,10 +247,13 @@ class CustomXMLParser():
         @param tag Tag name
         @param attrib Attributes
         """
+        if self.__pending:
+            self.__flushData()
         if tag == Comment:
             self.__name = tag
 
             node = XMLTreeNode(Comment)
+            self.__nodeCount += 1
             if self.__node is not None:
                 self.__node.addChild(node)
             elif self.__root is None:
@@ -151,20 +264,46 @@ class CustomXMLParser():
 
         self.__name = tag.strip()
         self.__tagname = None
+        table = self.__internTable
+        if table is not None:
+            self.__name = table.setdefault(self.__name, self.__name)
 
         if self.__name:
             self.startHandleTag()
+            self.__nodeCount += 1
 
         # Check if there's attributes and create a tree structure out of them
         if attrib:
+            self.__attribCount += len(attrib)
+            if table is not None:
+                attrib = self.__internAttrib(attrib)
             for attr in attrib:
                 self.__node.addAttrib(attr, attrib[attr])
 
+    def __internAttrib(self, attrib):
+        """ Replace attribute keys, and values of the selected attributes,
+        with the equal strings from intern table
+
+        @param attrib Attribute dictionary
+        @returns New attribute dictionary
+        """
+        intern = self.__internTable.setdefault
+        values = self.__internValues
+        res = {}
+        for key, value in attrib.items():
+            key = intern(key, key)
+            if values is True or (values and key in values):
+                value = intern(value, value)
+            res[key] = value
+        return res
+
     def end(self, tag):
         """The end of the tag, handle properly, free what needs to be freed
 
         @param data Tag data
         """
+        if self.__pending:
+            self.__flushData()
         if tag == Comment:
             if self.__node is None:
                 return
@@ -177,10 +316,14 @@ class CustomXMLParser():
 
         tag = tag.strip()
         if tag and self.__node is not None:
+            node = self.__node
             # Walk down to the tree if possible (towards the root)
-            par = self.__node.getParent()
+            par = node.getParent()
             if par is not None:
                 self.__node = par
+            # Collect finished subtrees when streaming
+            if tag == self.__streamtag:
+                self.__streamed.append(node)
 
     def data(self, data):
         """The data/contents of the tag
@@ -195,14 +338,95 @@ class CustomXMLParser():
                 self.__node.appendValue(data)
             return
 
-        if len(data.strip()) > 0 and ___name:
-            # And create the value node
-            self.__node.appendValue(data)
+        # Keep the pieces until the whole text is known, whitespace is dropped
+        # by lines and the parser may split a line in several pieces
+        if data and ___name:
+            self.__pending.append(data)
+
+    def __flushData(self):
+        """ Add the text reported since the last event to the current node
+        """
+        text = keepText(''.join(self.__pending))
+        self.__pending = []
+        if text:
+            self.__node.appendValue(text)
 
     def close(self):
-        """Called when parsing/parser is closed
+        """Called when parsing/parser is closed.
+        Finishes also incremental parsing started with feed,
+        raises ValueError if input was not valid XML.
+
+        @returns CustomXMLParser instance if incremental parsing was finished, None otherwise
+        """
+        if self.__pending:
+            self.__flushData()
+        parser = self.__feeder
+        if parser is None:
+            return None
+
+        # Parser calls close of its target again, nothing to do then
+        self.__feeder = None
+        try:
+            parser.close()
+        except ParseError as e:
+            raise ValueError('Input is not valid XML: %s' % e)
+        return self
+
+    def feed(self, data):
+        """Parse next chunk of XML data incrementally, for example as it's received from network.
+        Tree is built as data arrives, call close after the last chunk.
+        Raises ValueError if input is not valid XML.
+
+        @param data Chunk of XML data
+        """
+        parser = self.__feeder
+        if parser is None:
+            parser = self.__feeder = xml_parser(target=self.__target())
+        if instrument.registry is not None:
+            instrument.countInput(instrument.registry, data)
+        try:
+            parser.feed(data)
+        except ParseError as e:
+            self.__feeder = None
+            raise ValueError('Input is not valid XML: %s' % e)
+
+    def setStreamTag(self, tag):
+        """Collect elements with the given tag when they are closed during feed, see readNodes
+
+        @param tag Tag name of the elements to collect, None to stop collecting
+        """
+        self.__streamtag = tag
+        self.__streamed = []
+
+    def readNodes(self, detach=True):
+        """Take the elements with the tag given to setStreamTag, which have been closed
+        since the last call. Elements are complete while the rest is still being parsed.
+
+        @param detach If True, elements are removed from their parents, keeping the tree small
+        @returns List of XMLTreeNode instances
         """
-        return
+        nodes = self.__popStreamed()
+        if detach:
+            for node in nodes:
+                detachStreamed(node, self.__streamtag)
+        return nodes
+
+    def __openFile(self, xmlfile, mode):
+        """ Open XML file, reporting missing file as error
+
+        @param xmlfile Input XML file
+        @param mode Mode to open the file with
+        @returns File object, None if file could not be opened and errors are ignored
+        """
+        try:
+            return open(xmlfile, mode)
+        except IOError:
+            tmp = "File %s not found!" % xmlfile
+            if self.__ignore_errors:
+                print ("ERROR: %s" % tmp)
+                return None
+            else:
+                raise ValueError(tmp)
 
     def loadFile(self, xmlfile, sourceIsFile):
         """ Load and parse a XML file
@@ -214,24 +438,247 @@ class CustomXMLParser():
         curxml = None
         if sourceIsFile:
             # We have a file so try to read
+            f = self.__openFile(xmlfile, "r")
+            if f is None:
+                return None
             try:
-                f = open(xmlfile, "r")
-                contents = f.read()
+                curxml = f.read()
+            finally:
                 f.close()
-            except IOError:
-                tmp = "File %s not found!" % xmlfile
-                if self.__ignore_errors:
-                    print ("ERROR: %s" % tmp)
-                    return None
-                else:
-                    raise ValueError(tmp)
-            curxml = contents
         else:
             curxml = xmlfile
 
         return curxml
 
-    def load(self, xmlfile, sourceIsFile=True, addDummy=False):
+    def mapFile(self, xmlfile):
+        """ Memory map a XML file for reading
+
+        @param xmlfile Input XML file
+        @returns Tuple of file object and mmap object, mmap object is None if file is empty. None if file could not be opened
+        """
+        f = self.__openFile(xmlfile, "rb")
+        if f is None:
+            return None
+
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can not be mapped
+            mapped = None
+        return (f, mapped)
+
+    def __mappedChunks(self, mapped, chunkSize):
+        """ Slice memory mapped file without copying
+
+        @param mapped mmap object
+        @param chunkSize Maximum size of one slice
+        @returns Generator of slices
+        """
+        if sys.version < '3':
+            for pos in range(0, len(mapped), chunkSize):
+                yield buffer(mapped, pos, chunkSize)  # NOQA
+            return
+
+        view = memoryview(mapped)
+        try:
+            for pos in range(0, len(mapped), chunkSize):
+                chunk = view[pos:pos + chunkSize]
+                try:
+                    yield chunk
+                finally:
+                    # Slices must be released before the file can be unmapped,
+                    # also when parsing stops with an error
+                    chunk.release()
+        finally:
+            view.release()
+
+    def __feedAll(self, parser, source, isMapped, chunkSize, addDummy, dummy):
+        """ Feed whole document to parser and close it
+
+        @param parser XMLParser instance
+        @param source Document as string, or mmap object, which is None for empty file
+        @param isMapped True if source is a memory mapped file, fed in slices
+        @param chunkSize Size of slices of memory mapped file
+        @param addDummy Add contents into dummy element
+        @param dummy Tuple of start and end tag of dummy element
+        @returns Result of closing the parser
+        """
+        if isMapped:
+            chunks = self.__mappedChunks(source, chunkSize) if source is not None else iter([])
+        else:
+            chunks = iter([source])
+        registry = instrument.registry
+        chunk = None
+
+        try:
+            # Dummy element is fed separately to avoid copying the contents
+            if addDummy:
+                parser.feed(dummy[0])
+            for chunk in chunks:
+                parser.feed(chunk)
+                if registry is not None:
+                    instrument.countInput(registry, chunk)
+            if addDummy:
+                parser.feed(dummy[1])
+            return parser.close()
+        finally:
+            # Traceback of a parse error keeps this frame alive,
+            # the slice must not be referenced when the file is unmapped
+            chunk = None
+            if isMapped and source is not None:
+                chunks.close()
+
+    def __cacheKey(self, cache, xmlfile, sourceIsFile, addDummy, include, exclude):
+        """ Get the document cache and the key of the document in it, see load
+
+        @param cache DocumentCache instance, True for the process wide cache, None or False for no caching
+        @param xmlfile Input XML file
+        @param sourceIsFile True if xmlfile is a file, False if it contains XML content
+        @param addDummy Add contents into dummy element
+        @param include Compiled TagPaths of elements to keep, or None
+        @param exclude Compiled TagPaths of elements to skip, or None
+        @returns Tuple of DocumentCache instance and key, key is None if document is not cached
+        """
+        if cache is None or cache is False:
+            return (None, None)
+        if self.nodeFactory is not XMLTreeNode:
+            # Cached documents are handed out as ClonedXMLTreeNode, not as nodes of the factory
+            return (None, None)
+        if cache is True:
+            cache = doccache.getCache()
+        options = None
+        if include is not None or exclude is not None:
+            options = (include.paths if include is not None else None, exclude.paths if exclude is not None else None)
+        if self.__internTable is not None:
+            # Documents share the strings of their intern table, keep documents of other tables apart
+            options = (options, id(self.__internTable), self.__internValues)
+        return (cache, cache.makeKey(xmlfile, sourceIsFile, addDummy, options))
+
+    def __openSource(self, xmlfile, sourceIsFile, useMmap):
+        """ Read or memory map the source document, see load
+
+        @param xmlfile Input XML file
+        @param sourceIsFile True if xmlfile is a file, False if it contains XML content
+        @param useMmap Memory map the file instead of reading it
+        @returns Tuple of source, result of mapFile or None, and tuple of dummy element start and end tags.
+            None if file could not be opened
+        """
+        if useMmap and sourceIsFile:
+            mapped = self.mapFile(xmlfile)
+            if mapped is None:
+                return None
+            return (mapped[1], mapped, (b'<dummy>\n', b'\n</dummy>'))
+
+        source = self.loadFile(xmlfile, sourceIsFile)
+        if source is None:
+            return None
+        return (source, None, ('<dummy>\n', '\n</dummy>'))
+
+    def __parseSource(self, xmlfile, sourceIsFile, useMmap, parse, *args):
+        """ Read or memory map the source document and parse it, see load.
+        Raises ValueError if input is not valid XML.
+
+        @param xmlfile Input XML file
+        @param sourceIsFile True if xmlfile is a file, False if it contains XML content
+        @param useMmap Memory map the file instead of reading it
+        @param parse Function called with the source, whether it is memory mapped, tuple of dummy element tags
+            and args. Raises ParseError if input is not valid XML
+        @param *args Other arguments of parse
+        @returns Result of parse, None if file could not be opened
+        """
+        opened = self.__openSource(xmlfile, sourceIsFile, useMmap)
+        if opened is None:
+            return None
+        source, mapped, dummy = opened
+
+        err = None
+        try:
+            return parse(source, mapped is not None, dummy, *args)
+        except ParseError as e:
+            err = e
+        finally:
+            if mapped is not None:
+                f, data = mapped
+                if data is not None:
+                    data.close()
+                f.close()
+
+        if sourceIsFile:
+            raise ValueError('Input is not valid XML: %s, %s' % (xmlfile, err))
+        else:
+            raise ValueError('Input is not valid XML: %s' % err)
+
+    def __build(self, source, isMapped, dummy, chunkSize, addDummy, useTreeBuilder, include, exclude):
+        """ Parse the source and build the tree, with TreeBuilder when possible, see load.
+        Raises ParseError if input is not valid XML.
+
+        @param source XML document as string, bytes or mmap object, None for empty file
+        @param isMapped True if source is a memory mapped file
+        @param dummy Tuple of start and end tag of dummy element
+        @param chunkSize Size of slices of memory mapped file
+        @param addDummy Add contents into dummy element
+        @param useTreeBuilder Build the tree with TreeBuilder if the document can be converted exactly
+        @param include Compiled TagPaths of elements to keep, or None
+        @param exclude Compiled TagPaths of elements to skip, or None
+        """
+        registry = instrument.registry
+        if registry is not None:
+            start = instrument.clock()
+        filtered = include is not None or exclude is not None
+        self.__nodeCount = 0
+        self.__attribCount = 0
+        self.__inputSize = len(source) if source is not None else 0
+        flat = None
+        useTreeBuilder = useTreeBuilder and source is not None and self.nodeFactory is XMLTreeNode
+        if useTreeBuilder and self.__streamtag is None and not filtered and bulkbuild.canBuild(source):
+            tree = self.__feedAll(bulkbuild.newParser(), source, isMapped, chunkSize, addDummy, dummy)
+            flat = bulkbuild.convert(tree, source, self.__internTable, self.__internValues)
+        if flat is not None:
+            self.__root = XMLTreeNode.fromFlat(flat)
+            self.__nodeCount = len(flat)
+            self.__attribCount = sum([len(item[2]) for item in flat if item[2]])
+            if registry is not None:
+                registry.count('parser.nodes', sum(1 for item in flat if item[1] is not Comment))
+        else:
+            # And feed the XML to parser with the this custom parser walker
+            target = self.__target(include, exclude)
+            self.__feedAll(xml_parser(target=target), source, isMapped, chunkSize, addDummy, dummy)
+        if registry is not None:
+            registry.addTime('parser.parse', instrument.clock() - start)
+        return True
+
+    def parseTarget(self, builder, xmlfile, sourceIsFile=True, useMmap=False, chunkSize=MMAP_CHUNK_SIZE,
+                    include=None, exclude=None):
+        """Parse XML file or raw text to other parser target than this parser, for example to build
+        other representation of the document without creating XMLTreeNode instances, see columnar.
+        Target gets the same events as CustomXMLParser, and with include or exclude it's notified
+        of skipped elements with skipTag. See load for the parameters.
+
+        @param builder Parser target with start, end, data, comment and close methods
+        @returns Result of close of the target, None if file could not be opened
+        """
+        if xmlfile is None:
+            return None
+
+        include = tagfilter.compilePaths(include)
+        exclude = tagfilter.compilePaths(exclude)
+        parser = xml_parser(target=self.__target(include, exclude, builder))
+        return self.__parseSource(xmlfile, sourceIsFile, useMmap, self.__feedTarget, parser, chunkSize)
+
+    def __feedTarget(self, source, isMapped, dummy, parser, chunkSize):
+        """ Feed the source to the parser of other target, see parseTarget
+
+        @param source XML document as string, bytes or mmap object, None for empty file
+        @param isMapped True if source is a memory mapped file
+        @param dummy Tuple of start and end tag of dummy element, not used
+        @param parser XMLParser instance
+        @param chunkSize Size of slices of memory mapped file
+        @returns Result of closing the parser
+        """
+        return self.__feedAll(parser, source, isMapped, chunkSize, False, dummy)
+
+    def load(self, xmlfile, sourceIsFile=True, addDummy=False, useMmap=False, chunkSize=MMAP_CHUNK_SIZE, cache=None,
+             useTreeBuilder=False, include=None, exclude=None):
         """Load XML file or raw text
         xmlfile is either name of the XML file
         or contents of XML data in case of sourceIsFile=False
@@ -239,44 +686,235 @@ class CustomXMLParser():
         @param xmlfile Input XML file
         @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
         @param addDummy Add given xml file contents to into dummy element, <dummy> xmlfile </dummy>
+        @param useMmap Memory map the file and feed its bytes to parser without reading it into a string first
+        @param chunkSize Size of slices of memory mapped file fed to parser at once
+        @param cache DocumentCache instance to get the document from or store it to, or True to use the process wide cache, see doccache
+        @param useTreeBuilder Build the tree with the C accelerated TreeBuilder and convert it at once, instead of handling
+            every parser event in Python. Trees are the same, documents which can't be converted exactly are parsed from events, see bulkbuild
+        @param include List of tag paths of elements to keep with their subtrees, others are skipped while parsing
+            except the ancestors of kept elements, which are kept without text. See tagfilter for the paths
+        @param exclude List of tag paths of elements to skip with their subtrees while parsing
         @returns CustomXMLParser instance containing the loaded file OR list of XMLTreeNode instances containing tag elements in case multiple root tags found
         """
         if xmlfile is None:
             return self
 
-        curxml = self.loadFile(xmlfile, sourceIsFile)
-        if curxml is None:
+        include = tagfilter.compilePaths(include)
+        exclude = tagfilter.compilePaths(exclude)
+
+        cache, key = self.__cacheKey(cache, xmlfile, sourceIsFile, addDummy, include, exclude)
+        if key is not None:
+            root = cache.get(key)
+            if root is not None:
+                self.__root = root
+                return self
+
+        if not self.__parseSource(xmlfile, sourceIsFile, useMmap, self.__build,
+                                  chunkSize, addDummy, useTreeBuilder, include, exclude):
             return None
 
+        # Parse the dummy from under the root
         if addDummy:
-            curxml = '<dummy>\n' + curxml + '\n</dummy>'
+            c = self.__root.getChildren()
+            for dd in c:
+                if dd.getData() == 'dummy':
+                    self.__root = dd
 
-        # And feed the XML to parser with the this custom parser walker
-        parser = xml_parser(target=self)
+        if key is not None and self.__root is not None:
+            size = None
+            if include is None and exclude is None:
+                # Skipped parts of the input would make the estimate too large, filtered trees are walked
+                size = doccache.estimateBuiltSize(self.__nodeCount, self.__attribCount, self.__inputSize)
+            self.__root = cache.put(key, self.__root, size)
+
+        # Return ourself when success
+        return self
+
+    @instrument.timed('parser.loadLazy')
+    def loadLazy(self, xmlfile, sourceIsFile=True, depth=1, chunkSize=MMAP_CHUNK_SIZE):
+        """Load XML file or raw text lazily.
+        Document is scanned once and the tree is built only down to the given depth.
+        Elements at that depth are LazyXMLTreeNode instances, which parse their text
+        and children from the source only when those are accessed the first time.
+        Files are memory mapped and kept mapped as long as there are lazy nodes left.
+        Entities declared in document type definition can not be used in lazy subtrees.
+
+        @param xmlfile Input XML file
+        @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
+        @param depth Depth of lazily loaded elements, 1 means the children of the root element
+        @param chunkSize Size of slices fed to parser at once
+        @returns CustomXMLParser instance containing the loaded file
+        """
+        from lazyload import LazyScanner
+
+        if xmlfile is None:
+            return self
+
+        if sourceIsFile:
+            mapped = self.mapFile(xmlfile)
+            if mapped is None:
+                return None
+            f, data = mapped
+            f.close()
+            if data is None:
+                data = b''
+        else:
+            data = xmlfile
+            if not isinstance(data, bytes):
+                data = data.encode('utf-8')
 
-        reraise = False
-        err = None
         try:
-            parser.feed(curxml)
+            LazyScanner(self, data, depth, chunkSize).scan()
+        except expat.ExpatError as e:
+            if sourceIsFile:
+                raise ValueError('Input is not valid XML: %s, %s' % (xmlfile, e))
+            else:
+                raise ValueError('Input is not valid XML: %s' % e)
+
+        return self
+
+    def loadFiles(self, paths, processes=None, ordered=True, addDummy=False, useMmap=False, useTreeBuilder=False,
+                  include=None, exclude=None, raiseErrors=False):
+        """Load multiple XML files in parallel using a pool of worker processes.
+        Failure of a file does not stop the others, the error is returned with the result of the file.
+
+        @param paths List of input XML files
+        @param processes Number of worker processes, defaults to number of CPUs. With 1 files are parsed in this process
+        @param ordered If True, results are returned in the order of paths, otherwise as soon as files are parsed
+        @param addDummy Add contents of every file into dummy element, see load
+        @param useMmap Memory map the files, see load
+        @param useTreeBuilder Build the trees with TreeBuilder, see load
+        @param include List of tag paths of elements to keep, see load
+        @param exclude List of tag paths of elements to skip, see load
+        @param raiseErrors If True, ValueError is raised after all files are handled, if any of them failed
+        @returns Generator of tuples of path, root XMLTreeNode and error message of the file.
+            Error message is None if the file was loaded, otherwise root is None
+        """
+        options = {'addDummy': addDummy, 'useMmap': useMmap, 'useTreeBuilder': useTreeBuilder,
+                   'include': include, 'exclude': exclude}
+        tasks = [(path, options) for path in paths]
+
+        pool = None
+        if processes == 1 or len(tasks) <= 1:
+            results = (_loadFile(task) for task in tasks)
+            build = None
+        else:
+            pool = multiprocessing.Pool(processes)
+            if ordered:
+                results = pool.imap(_loadWorker, tasks)
+            else:
+                results = pool.imap_unordered(_loadWorker, tasks)
+            build = XMLTreeNode.fromFlat
+
+        errors = []
+        try:
+            for path, root, error in results:
+                if error is not None:
+                    errors.append(error)
+                elif build is not None:
+                    root = build(root)
+                yield (path, root, error)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        if errors and raiseErrors:
+            raise ValueError('%d of %d files failed to load, first: %s' % (len(errors), len(tasks), errors[0]))
+
+    def readChunks(self, xmlfile, sourceIsFile, chunkSize):
+        """ Read XML file or raw text in chunks
+
+        @param xmlfile Input XML file
+        @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
+        @param chunkSize Maximum size of one chunk
+        @returns Generator of chunks
+        """
+        if not sourceIsFile:
+            for pos in range(0, len(xmlfile), chunkSize):
+                yield xmlfile[pos:pos + chunkSize]
+            return
+
+        f = self.__openFile(xmlfile, "rb")
+        if f is None:
+            return
+
+        try:
+            while True:
+                chunk = f.read(chunkSize)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    def iterLoad(self, xmlfile, tag, sourceIsFile=True, detach=True, chunkSize=65536):
+        """Load XML file or raw text incrementally.
+        Input is read and parsed in chunks, and every element with the given tag
+        is yielded as soon as it is closed, while the rest is still being parsed.
+
+        @param xmlfile Input XML file
+        @param tag Tag name of the elements to yield
+        @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
+        @param detach If True, yielded element is removed from its parent after it has been handled, keeping the tree small.
+                      Elements nested in elements with the same tag are removed with the outer element.
+        @param chunkSize Size of chunks to read and feed to parser at once
+        @returns Generator of XMLTreeNode instances with the given tag
+        """
+        if xmlfile is None:
+            return
+
+        self.__streamtag = tag
+        self.__streamed = []
+        parser = xml_parser(target=self.__target())
+
+        try:
+            for chunk in self.readChunks(xmlfile, sourceIsFile, chunkSize):
+                if instrument.registry is not None:
+                    instrument.countInput(instrument.registry, chunk)
+                parser.feed(chunk)
+                for node in self.__popStreamed():
+                    yield node
+                    if detach:
+                        detachStreamed(node, tag)
             parser.close()
         except ParseError as e:
-            reraise = True
-            err = e
-
-        if reraise:
             if sourceIsFile:
-                raise ValueError('Input is not valid XML: %s, %s' % (xmlfile, err))
+                raise ValueError('Input is not valid XML: %s, %s' % (xmlfile, e))
             else:
-                raise ValueError('Input is not valid XML: %s' % err)
+                raise ValueError('Input is not valid XML: %s' % e)
+        finally:
+            self.__streamtag = None
 
-        # Parse the dummy from under the root
-        if addDummy:
-            c = self.__root.getChildren()
-            for dd in c:
-                if dd.getData() == 'dummy':
-                    self.__root = dd
+        for node in self.__popStreamed():
+            yield node
+            if detach:
+                detachStreamed(node, tag)
+
+    def streamLoad(self, xmlfile, tag, callback, sourceIsFile=True, detach=True, chunkSize=65536):
+        """Load XML file or raw text incrementally, calling callback for every element with the given tag.
+        See iterLoad for details.
+
+        @param xmlfile Input XML file
+        @param tag Tag name of the elements to handle
+        @param callback Function called with XMLTreeNode instance of every closed element with the given tag
+        @param sourceIsFile Set this True if xmlfile parameter is a file, False if it contains XML content as a string
+        @param detach If True, element is removed from its parent after callback returns
+        @param chunkSize Size of chunks to read and feed to parser at once
+        @returns CustomXMLParser instance
+        """
+        for node in self.iterLoad(xmlfile, tag, sourceIsFile=sourceIsFile, detach=detach, chunkSize=chunkSize):
+            callback(node)
 
-        # Return ourself when success
         return self
 
+    def __popStreamed(self):
+        """ Take the elements closed since the last call
+
+        @returns List of XMLTreeNode instances
+        """
+        streamed = self.__streamed
+        self.__streamed = []
+        return streamed
+
 # vi: tabstop=8 expandtab shiftwidth=4 softtabstop=4
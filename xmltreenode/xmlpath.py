@@ -0,0 +1,332 @@
+"""@package xmlpath
+Path queries over XMLTreeNode trees, a subset of XPath similar to ElementPath.
+
+Supported syntax:
+  tag           Child elements with tag, tag may contain namespace as {uri}tag
+  *             All child elements, comments are not included
+  .             Current node
+  ..            Parent node
+  //tag         All descendant elements with tag, or all with //*
+  /tag          When in the beginning, path starts from root of the tree
+  [@attr]       Elements having attribute
+  [@attr='v']   Elements having attribute with value, != for not equal
+  [tag]         Elements having child with tag
+  [tag='text']  Elements having child with tag and text, != for not equal
+  [.='text']    Elements with text, != for not equal
+  [n]           N:th element among results with same parent, starting from 1
+  [last()]      Last element among results with same parent, [last()-n] also works
+"""
+
+import re
+from collections import OrderedDict
+from compat import string_types
+from traversal import select, sharedChildren
+
+# Maximum number of compiled paths kept in cache
+PATH_CACHE_SIZE = 256
+
+_cache = OrderedDict()
+
+_PATH_CHARS_RE = re.compile(r"[/\[\]*@]")
+
+_STEP_RE = re.compile(r"\.\.|\.|\*|(?:\{[^}]*\})?[^/\[\]\s.*][^/\[\]\s]*")
+_PREDICATE_RE = re.compile(r"""\[\s*(?:
+      @(?P<attr>[^\s=!\]]+)\s*(?:(?P<attrop>!?=)\s*(?P<attrval>'[^']*'|"[^"]*"))?
+    | (?P<index>\d+)
+    | last\(\)\s*(?:-\s*(?P<last>\d+))?
+    | (?P<child>\.|(?:\{[^}]*\})?[^\s=!\]\['"\d@][^\s=!\]\[]*)\s*(?:(?P<childop>!?=)\s*(?P<childval>'[^']*'|"[^"]*"))?
+    )\s*\]""", re.X)
+
+
+class _Document(object):
+    """ Document node above root of the tree, used for absolute paths
+    """
+    tag = None
+
+    def __init__(self, root):
+        """ Initialize
+
+        @param root Root XMLTreeNode of the tree
+        """
+        self.root = root
+        self._children = (root,)
+
+
+def _isElement(node):
+    """ Check if node is element, not comment or other special node
+
+    @param node XMLTreeNode instance
+    @returns True if node is element
+    """
+    tag = node.tag
+    return tag is not None and not callable(tag)
+
+
+def _selectChildren(tag):
+    def select(nodes):
+        for node in nodes:
+            for child in node._children:
+                if child.tag == tag:
+                    yield child
+    return select
+
+
+def _selectAllChildren(nodes):
+    for node in nodes:
+        for child in node._children:
+            if _isElement(child):
+                yield child
+
+
+def _selectSelf(nodes):
+    return nodes
+
+
+def _selectParent(nodes):
+    seen = set()
+    for node in nodes:
+        if isinstance(node, _Document):
+            continue
+        parent = node.getParent()
+        if parent is not None and parent not in seen:
+            seen.add(parent)
+            yield parent
+
+
+def _selectDescendants(tag):
+    def select(nodes):
+        seen = set() if len(nodes) > 1 else None
+        for node in nodes:
+            if isinstance(node, _Document):
+                found = node.root.getSelfAndSubTreeNodesByName(tag)
+            else:
+                found = node.getSubTreeNodesByName(tag)
+            for item in found:
+                if seen is not None:
+                    if item in seen:
+                        continue
+                    seen.add(item)
+                yield item
+    return select
+
+
+def _selectAllDescendants(nodes):
+    seen = set() if len(nodes) > 1 else None
+    for node in nodes:
+        for item in select(node, _isElement, includeSelf=False):
+            if seen is not None:
+                if item in seen:
+                    continue
+                seen.add(item)
+            yield item
+
+
+def _filterAttrib(name, op, value):
+    def predicate(nodes):
+        for node in nodes:
+            attrib = node._attrib
+            if name not in attrib:
+                continue
+            if op is None or (attrib[name] == value) == (op == '='):
+                yield node
+    return predicate
+
+
+def _filterChild(tag, op, value):
+    def predicate(nodes):
+        for node in nodes:
+            if tag == '.':
+                if (node.text == value) == (op == '='):
+                    yield node
+                continue
+            for child in sharedChildren(node):
+                if child.tag == tag and (op is None or (child.text == value) == (op == '=')):
+                    yield node
+                    break
+    return predicate
+
+
+def _filterPosition(index, fromEnd):
+    def predicate(nodes):
+        nodes = list(nodes)
+        groups = OrderedDict()
+        for node in nodes:
+            parent = node.getParent()
+            group = groups.get(parent)
+            if group is None:
+                group = groups[parent] = []
+            group.append(node)
+        selected = set()
+        for group in groups.values():
+            pos = len(group) - 1 - index if fromEnd else index - 1
+            if 0 <= pos < len(group):
+                selected.add(id(group[pos]))
+        # Groups are in order of their first node, keep the nodes in document order
+        return [node for node in nodes if id(node) in selected]
+    return predicate
+
+
+def _unquote(value):
+    """ Remove quotes around value
+
+    @param value Quoted string or None
+    @returns Unquoted string or None
+    """
+    if value is None:
+        return None
+    return value[1:-1]
+
+
+class CompiledPath(object):
+    """ Parsed path expression, which can be evaluated against any XMLTreeNode
+    """
+
+    def __init__(self, path):
+        """ Parse path, raises ValueError if path is invalid
+
+        @param path Path expression
+        """
+        self.path = path
+        self.absolute = False
+        self.steps = []
+
+        pos = 0
+        if path.startswith('/'):
+            self.absolute = True
+            if not path.startswith('//'):
+                pos = 1
+
+        end = len(path)
+        if pos >= end:
+            self.__invalid()
+
+        while pos < end:
+            descendant = path.startswith('//', pos)
+            if descendant:
+                pos += 2
+            m = _STEP_RE.match(path, pos)
+            if m is None:
+                self.__invalid()
+            pos = m.end()
+
+            self.steps.append((self.__selector(m.group(0), descendant), self.__predicates(path, pos)))
+            while pos < end and path[pos] == '[':
+                pos = _PREDICATE_RE.match(path, pos).end()
+
+            if pos < end:
+                if path[pos] != '/' or pos + 1 == end:
+                    self.__invalid()
+                if not path.startswith('//', pos):
+                    pos += 1
+
+    def __invalid(self):
+        raise ValueError('Invalid path: %s' % (self.path))
+
+    def __selector(self, step, descendant):
+        """ Get selector function for step
+
+        @param step Step name
+        @param descendant True if step is preceded by //
+        @returns Selector function
+        """
+        if descendant:
+            if step == '*':
+                return _selectAllDescendants
+            if step in ('.', '..'):
+                self.__invalid()
+            return _selectDescendants(step)
+
+        if step == '*':
+            return _selectAllChildren
+        if step == '.':
+            return _selectSelf
+        if step == '..':
+            return _selectParent
+        return _selectChildren(step)
+
+    def __predicates(self, path, pos):
+        """ Parse predicates of step
+
+        @param path Path expression
+        @param pos Position after step name
+        @returns List of predicate functions
+        """
+        predicates = []
+        while pos < len(path) and path[pos] == '[':
+            m = _PREDICATE_RE.match(path, pos)
+            if m is None:
+                self.__invalid()
+            pos = m.end()
+            groups = m.groupdict()
+            if groups['attr'] is not None:
+                predicates.append(_filterAttrib(groups['attr'], groups['attrop'], _unquote(groups['attrval'])))
+            elif groups['index'] is not None:
+                index = int(groups['index'])
+                if index < 1:
+                    self.__invalid()
+                predicates.append(_filterPosition(index, False))
+            elif groups['child'] is not None:
+                if groups['child'] == '.' and groups['childop'] is None:
+                    self.__invalid()
+                predicates.append(_filterChild(groups['child'], groups['childop'], _unquote(groups['childval'])))
+            else:
+                predicates.append(_filterPosition(int(groups['last'] or 0), True))
+        return predicates
+
+    def iterate(self, node):
+        """ Evaluate path
+
+        @param node XMLTreeNode to evaluate path from
+        @returns Iterator of matching XMLTreeNode instances in document order
+        """
+        if self.absolute:
+            nodes = [_Document(node.getRoot())]
+        else:
+            nodes = [node]
+
+        for selector, predicates in self.steps:
+            nodes = selector(nodes)
+            for predicate in predicates:
+                nodes = predicate(nodes)
+            nodes = list(nodes)
+            if not nodes:
+                break
+
+        return iter([item for item in nodes if not isinstance(item, _Document)])
+
+
+def isPath(name):
+    """ Check if name is path expression rather than plain tag name
+
+    @param name Tag name or path expression
+    @returns True if name needs to be evaluated as path
+    """
+    if not isinstance(name, string_types):
+        return False
+    if name.startswith('{'):
+        name = name[name.find('}') + 1:]
+    if name in ('.', '..'):
+        return True
+    return _PATH_CHARS_RE.search(name) is not None
+
+
+def compilePath(path):
+    """ Get compiled path, compiled paths are kept in LRU cache
+
+    @param path Path expression
+    @returns CompiledPath instance
+    """
+    try:
+        compiled = _cache.pop(path)
+    except KeyError:
+        compiled = CompiledPath(path)
+        if len(_cache) >= PATH_CACHE_SIZE:
+            _cache.popitem(last=False)
+    _cache[path] = compiled
+    return compiled
+
+
+def clearPathCache():
+    """ Remove all compiled paths from cache
+    """
+    _cache.clear()
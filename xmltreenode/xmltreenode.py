@@ -4,8 +4,16 @@ Has class for special XMLTreeNode for parse tree presentation
 
 from __future__ import print_function
 import copy
+import io
 import sys
 import xml.etree.ElementTree
+from compat import string_types
+from traversal import select, sharedChildren, walk
+from treeindex import TreeIndex
+from xmlpath import compilePath, isPath
+import instrument
+import serializer
+import treehash
 
 use_cetree = True
 if use_cetree:
@@ -17,13 +25,387 @@ if use_cetree:
 else:
     element_tree = xml.etree.ElementTree
 
+# Number of children after which membership checks use identity index
+CHILD_INDEX_LIMIT = 8
+
+
+class XMLTreeNodeChildren(list):
+    """ List of children of XMLTreeNode.
+    Behaves like a normal list, but keeps an identity index of the items
+    so membership checks and removals do not need to scan the whole list.
+    Index is built lazily once the list grows over CHILD_INDEX_LIMIT items.
+
+    Removing an indexed item which is not the last one only marks it removed,
+    instead of moving all the items after it. Marked items are dropped when
+    they outnumber the remaining items, or when the items are accessed by position.
+    While there are marked items the list is _SparseChildren, which skips them.
+    """
+    __slots__ = ('_members', '_removed', '_start')
+
+    def __init__(self, items=()):
+        """ Initialize
+
+        @param items Initial items
+        """
+        list.__init__(self, items)
+        self._members = None
+        # Ids of the items marked removed, and position of the first remaining item
+        self._removed = None
+        self._start = 0
+
+    def __reduce__(self):
+        """ Pickle as plain list of items, index is rebuilt when needed
+
+        @returns Tuple of class and arguments
+        """
+        return (XMLTreeNodeChildren, (list(self), ))
+
+    def __buildIndex(self):
+        """ Build the identity index
+
+        @returns Set of item ids, or None if list contains duplicates
+        """
+        members = set(id(item) for item in self)
+        if len(members) != len(self):
+            return None
+        self._members = members
+        return members
+
+    def _compact(self):
+        """ Drop the items marked removed
+        """
+        # Slot is unset if the list was created without __init__, like by copy or pickle
+        removed = getattr(self, '_removed', None)
+        if not removed:
+            return
+        list.__setitem__(self, slice(None), [
+            item for item in list.__iter__(self) if id(item) not in removed])
+        self._removed = None
+        self._start = 0
+        self.__class__ = XMLTreeNodeChildren
+
+    def _trim(self):
+        """ Drop the items marked removed from the end and skip them at the beginning,
+        so first and last items can be read directly
+        """
+        removed = self._removed
+        while removed and id(list.__getitem__(self, -1)) in removed:
+            removed.remove(id(list.pop(self)))
+        if not removed:
+            self._removed = None
+            self._start = 0
+            self.__class__ = XMLTreeNodeChildren
+            return
+        start = self._start
+        while id(list.__getitem__(self, start)) in removed:
+            start += 1
+        self._start = start
+
+    def __contains__(self, item):
+        """ Check if item is in the list
+
+        @param item Item to search
+        @returns True if found, False otherwise
+        """
+        members = self._members
+        if members is None:
+            if len(self) <= CHILD_INDEX_LIMIT:
+                return list.__contains__(self, item)
+            members = self.__buildIndex()
+            if members is None:
+                return list.__contains__(self, item)
+        return id(item) in members
+
+    def __addMember(self, item):
+        """ Update index before item is added
+
+        @param item Added item
+        """
+        # Slot is unset if the list was created without __init__, like by copy or pickle
+        members = getattr(self, '_members', None)
+        if members is not None:
+            key = id(item)
+            if key in members:
+                # Duplicate items, can't index those
+                self._compact()
+                self._members = None
+                return
+            if self._removed and key in self._removed:
+                # Added again, must not be dropped as removed
+                self._compact()
+            members.add(key)
+
+    def append(self, item):
+        """ Append item to the list
+
+        @param item Item to append
+        """
+        self.__addMember(item)
+        list.append(self, item)
+
+    def insert(self, index, item):
+        """ Insert item to the list
+
+        @param index Position where to insert
+        @param item Item to insert
+        """
+        self.__addMember(item)
+        if self._removed:
+            if index == 0:
+                # Before the first remaining item
+                list.insert(self, self._start, item)
+                return
+            self._compact()
+        list.insert(self, index, item)
+
+    def remove(self, item):
+        """ Remove item from the list, raises ValueError if not found
+
+        @param item Item to remove
+        """
+        members = self._members
+        if members is None and len(self) > CHILD_INDEX_LIMIT:
+            members = self.__buildIndex()
+        if members is None:
+            list.remove(self, item)
+            return
+
+        key = id(item)
+        if key not in members:
+            raise ValueError('list.remove(x): x not in list')
+        members.remove(key)
+
+        # Last item is never marked removed
+        if list.__getitem__(self, -1) is item:
+            list.pop(self)
+            if self._removed:
+                self._trim()
+            return
+
+        removed = self._removed
+        if removed is None:
+            removed = self._removed = set()
+            self.__class__ = _SparseChildren
+        removed.add(key)
+        if len(removed) > len(members):
+            self._compact()
+        else:
+            self._trim()
+
+    def pop(self, index=-1):
+        """ Remove and return item at index
+
+        @param index Position of the item
+        @returns Removed item
+        """
+        if index == 0 and self._members is not None and self:
+            item = self[0]
+            self.remove(item)
+            return item
+        if index != -1:
+            self._compact()
+        item = list.pop(self, index)
+        if self._members is not None:
+            self._members.discard(id(item))
+            if self._removed:
+                self._trim()
+        return item
+
+    def extend(self, items):
+        """ Append all items to the list
+
+        @param items Items to append
+        """
+        self._compact()
+        list.extend(self, items)
+        self._members = None
+
+    def __iadd__(self, items):
+        """ Append all items to the list
+
+        @param items Items to append
+        @returns The list itself
+        """
+        self.extend(items)
+        return self
+
+    def __setitem__(self, index, item):
+        self._compact()
+        list.__setitem__(self, index, item)
+        self._members = None
+
+    def __delitem__(self, index):
+        self._compact()
+        list.__delitem__(self, index)
+        self._members = None
+
+    def __setslice__(self, i, j, items):
+        self._compact()
+        list.__setslice__(self, i, j, items)
+        self._members = None
+
+    def __delslice__(self, i, j):
+        self._compact()
+        list.__delslice__(self, i, j)
+        self._members = None
+
+    def __imul__(self, count):
+        self._compact()
+        list.__imul__(self, count)
+        self._members = None
+        return self
+
+    def sort(self, *args, **kwargs):
+        """ Sort the items in place, takes the same arguments as list.sort
+        """
+        self._compact()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        """ Reverse the items in place
+        """
+        self._compact()
+        list.reverse(self)
+
+    def clear(self):
+        """ Remove all items
+        """
+        del self[:]
+
+
+class _SparseChildren(XMLTreeNodeChildren):
+    """ XMLTreeNodeChildren having items marked removed, which are skipped when read.
+    Reading the items by position or in order drops the marked items first
+    and turns the list back to XMLTreeNodeChildren.
+    """
+    __slots__ = ()
+
+    def __len__(self):
+        return list.__len__(self) - len(self._removed)
+
+    def __iter__(self):
+        self._compact()
+        return list.__iter__(self)
+
+    def __reversed__(self):
+        self._compact()
+        return list.__reversed__(self)
+
+    def __getitem__(self, index):
+        # First and last items are never marked removed
+        if index == -1:
+            return list.__getitem__(self, -1)
+        if index == 0:
+            return list.__getitem__(self, self._start)
+        self._compact()
+        return list.__getitem__(self, index)
+
+    def __getslice__(self, i, j):
+        self._compact()
+        return list.__getslice__(self, i, j)
+
+    def __eq__(self, other):
+        self._compact()
+        return list.__eq__(self, other)
+
+    def __ne__(self, other):
+        self._compact()
+        return list.__ne__(self, other)
+
+    def __lt__(self, other):
+        self._compact()
+        return list.__lt__(self, other)
+
+    def __le__(self, other):
+        self._compact()
+        return list.__le__(self, other)
+
+    def __gt__(self, other):
+        self._compact()
+        return list.__gt__(self, other)
+
+    def __ge__(self, other):
+        self._compact()
+        return list.__ge__(self, other)
+
+    __hash__ = None
+
+    def __add__(self, items):
+        self._compact()
+        return list.__add__(self, items)
+
+    def __radd__(self, items):
+        return list(items) + list(self)
+
+    def __mul__(self, count):
+        self._compact()
+        return list.__mul__(self, count)
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        self._compact()
+        return list.__repr__(self)
+
+    def index(self, item, *args):
+        self._compact()
+        return list.index(self, item, *args)
+
+    def count(self, item):
+        self._compact()
+        return list.count(self, item)
+
+
+class _EmptyAttrib(dict):
+    """ Read-only empty attribute dictionary shared by nodes without attributes
+    """
+    def __readOnly(self, *args, **kwargs):
+        raise TypeError("Shared empty attributes can't be modified")
+
+    __setitem__ = __delitem__ = __readOnly
+    clear = pop = popitem = setdefault = update = __readOnly
+
+
+# Shared placeholders for nodes without attributes or children,
+# replaced with real containers on first modification
+_EMPTY_ATTRIB = _EmptyAttrib()
+_EMPTY_CHILDREN = ()
+
+
+def _slotDescriptors(cls):
+    """ Get descriptors of all slots of class and its base classes
+
+    @param cls Class
+    @returns List of tuples of attribute name and slot descriptor
+    """
+    res = []
+    for base in cls.__mro__:
+        for name in base.__dict__.get('__slots__', ()):
+            if name in ('__dict__', '__weakref__'):
+                continue
+            if name.startswith('__'):
+                name = '_%s%s' % (base.__name__.lstrip('_'), name)
+            res.append((name, base.__dict__[name]))
+    return res
+
 
 class XMLTreeNode(object):
     """ Custom Tree structure, may contain any number of children.
     XMLTreeNode can contain about any value or data,
     any number of children and subchildren.
     Contains definations and parsing capabilities.
+
+    Node data is kept in slots to keep memory usage per node low.
+    Nodes without attributes or children share immutable empty placeholders
+    until the first attribute or child is added.
+    Arbitrary extra attributes can still be set on a node.
     """
+    __slots__ = ('tag', '_attrib', '_children', '_text', '_textChunks', 'tail',
+                 '_index', '_digest', '__parent', '__nodeType', '__dict__', '__weakref__')
+
+    # Template sharing its children with this node, see cowclone
+    _template = None
+
     def __init__(self, tag=None, attrib={}, **extra):
         """ Initialize
 
@@ -32,35 +414,158 @@ class XMLTreeNode(object):
         @param **extra Additional attributes, given as keyword arguments
         """
         self.tag = tag
-        self.attrib = attrib.copy()
-        self.attrib.update(extra)
-        self._children = []
+        if attrib or extra:
+            self._attrib = attrib.copy()
+            self._attrib.update(extra)
+        else:
+            self._attrib = _EMPTY_ATTRIB
+        self._children = _EMPTY_CHILDREN
 
-        self.text = ''
+        self._text = ''
+        self._textChunks = None
         self.tail = ''
 
+        self._index = None
+        self._digest = None
         self.__parent = None
         self.__nodeType = None
 
+    def __getstate__(self):
+        """ Get state for pickling, slots are not pickled automatically with all protocols
+
+        @returns Tuple of instance dictionary and dictionary of slot values
+        """
+        slots = {}
+        for name, descriptor in _slotDescriptors(type(self)):
+            try:
+                slots[name] = descriptor.__get__(self, type(self))
+            except AttributeError:
+                pass
+        # Shared placeholder is restored in __setstate__
+        if slots.get('_attrib') is _EMPTY_ATTRIB:
+            slots['_attrib'] = None
+        return (self.__dict__ or None, slots)
+
+    def __setstate__(self, state):
+        """ Restore state when unpickling, see __getstate__
+
+        @param state Tuple of instance dictionary and dictionary of slot values
+        """
+        instdict, slots = state
+        if instdict:
+            self.__dict__.update(instdict)
+        if slots.get('_attrib', _EMPTY_ATTRIB) is None:
+            slots['_attrib'] = _EMPTY_ATTRIB
+        for name, descriptor in _slotDescriptors(type(self)):
+            if name in slots:
+                descriptor.__set__(self, slots[name])
+
     def deepcopy(self):
         """ Copy this XMLTreeNode. Makes sure everything needed will be copied.
 
         @returns New XMLTreeNode which is copy of the current
         """
         # Custom solution to ensure few things
+        tmp = self.__copyNode()
+
+        # Copy level by level without recursion, new children
+        # can't be duplicates so no need for addChild checks
+        stack = [(self, tmp)]
+        while stack:
+            node, copied = stack.pop()
+            copiedchildren = copied._children = XMLTreeNodeChildren()
+            for c in sharedChildren(node):
+                newch = c.__copyNode()
+                newch.__parent = copied
+                copiedchildren.append(newch)
+                if sharedChildren(c):
+                    stack.append((c, newch))
+
+        return tmp
+
+    def __copyNode(self):
+        """ Copy this XMLTreeNode without children
+
+        @returns New XMLTreeNode
+        """
         tmp = XMLTreeNode()
         tmp.__nodeType = self.__nodeType
         tmp.text = self.text
         tmp.tag = self.tag
-        tmp.__parent = None
-        tmp.attrib = self.attrib.copy()
-
-        for c in self._children:
-            newch = c.deepcopy()
-            tmp.addChild(newch)
+        if self._attrib:
+            tmp._attrib = self._attrib.copy()
 
         return tmp
 
+    def clone(self):
+        """ Copy this XMLTreeNode and its subtree with copy-on-write.
+        Subtrees are copied only when they are modified or returned as nodes of the copy,
+        so cloning is cheap when only few parts of the copy are used.
+        Copy is independent of this node, see cowclone.
+
+        @returns ClonedXMLTreeNode which is copy of the current
+        """
+        from cowclone import clone
+
+        return clone(self)
+
+    def freeze(self):
+        """ Create read-only columnar document of this XMLTreeNode and its subtree.
+        It uses much less memory than the tree, see columnar.
+
+        @returns ColumnarDocument instance
+        """
+        from columnar import ColumnarDocument
+
+        return ColumnarDocument.fromTree(self)
+
+    def flatten(self):
+        """ Flatten the tree to a list of plain tuples, which can be pickled
+        or stored without recursion. See fromFlat.
+
+        @returns List of tuples of parent position, tag, attributes, text and tail in document order
+        """
+        positions = {self: -1}
+        flat = []
+        for node in walk(self):
+            positions[node] = len(flat)
+            flat.append((positions[node.__parent] if node is not self else -1,
+                         node.tag, node._attrib or None, node.text, node.tail))
+        return flat
+
+    @staticmethod
+    def fromFlat(flat):
+        """ Build tree from list created by flatten.
+        Attribute dictionaries of the list are used as is, not copied.
+
+        @param flat List of flattened nodes
+        @returns Root XMLTreeNode of the tree
+        """
+        nodes = []
+        children = []
+        for parent, tag, attrib, text, tail in flat:
+            node = XMLTreeNode(tag)
+            if attrib:
+                node._attrib = attrib
+            if text:
+                node._text = text
+            if tail:
+                node.tail = tail
+            if parent >= 0:
+                node.__parent = nodes[parent]
+                siblings = children[parent]
+                if siblings is None:
+                    siblings = children[parent] = []
+                siblings.append(node)
+            nodes.append(node)
+            children.append(None)
+
+        for node, siblings in zip(nodes, children):
+            if siblings is not None:
+                node._children = XMLTreeNodeChildren(siblings)
+
+        return nodes[0]
+
     def copy(self):
         """ Copy this XMLTreeNode. Makes sure everything needed will be copied.
 
@@ -68,10 +573,70 @@ class XMLTreeNode(object):
         """
         # Let's do a little bit deeper copy, but not that deep
         tmp = copy.copy(self)
-        tmp.attrib = self.attrib.copy()
+        tmp.text = self.text
+        if self._attrib:
+            tmp._attrib = self._attrib.copy()
+        tmp._index = None
+        tmp._digest = None
         tmp.__parent = None
         return tmp
 
+    def __getText(self):
+        """ Get text of the node, joining pending appended chunks
+
+        @returns Text of the node
+        """
+        chunks = self._textChunks
+        if chunks is not None:
+            self._text = ''.join(chunks)
+            self._textChunks = None
+        return self._text
+
+    def __setText(self, value):
+        """ Set text of the node
+
+        @param value Any value
+        """
+        self._text = value
+        self._textChunks = None
+        if self._digest is not None:
+            self.invalidateDigest()
+
+    text = property(__getText, __setText)
+
+    def __getAttrib(self):
+        """ Get attribute dictionary of the node, which can be modified
+
+        @returns Attribute dictionary
+        """
+        attrib = self._attrib
+        if attrib is _EMPTY_ATTRIB:
+            attrib = self._attrib = {}
+        return attrib
+
+    def __setAttrib(self, value):
+        """ Set attribute dictionary of the node
+
+        @param value Attribute dictionary
+        """
+        if self._index is not None:
+            self._index.setAttributes(self, value)
+        self._attrib = value
+        if self._digest is not None:
+            self.invalidateDigest()
+
+    attrib = property(__getAttrib, __setAttrib)
+
+    def __childList(self):
+        """ Get modifiable list of children
+
+        @returns XMLTreeNodeChildren instance
+        """
+        children = self._children
+        if children is _EMPTY_CHILDREN:
+            children = self._children = XMLTreeNodeChildren()
+        return children
+
     def setValue(self, value):
         """ Set value of the Node, or the text
 
@@ -91,7 +656,22 @@ class XMLTreeNode(object):
 
         @param value Any value
         """
-        self.text = "%s%s" % (self.text, value)
+        # Collect chunks and join them only when text is read,
+        # building the string on every append would be quadratic
+        chunks = self._textChunks
+        if chunks is None:
+            text = self._text
+            if not isinstance(text, string_types):
+                text = "%s" % (text)
+            chunks = [text] if text else []
+            self._textChunks = chunks
+        if not isinstance(value, string_types):
+            value = "%s" % (value)
+        chunks.append(value)
+        if self._digest is not None:
+            self.invalidateDigest()
+        if instrument.registry is not None:
+            instrument.registry.count('node.appendValue')
 
     def insertAfterChild(self, afterchild, child, reparent=True):
         """ Add a child node after another child
@@ -121,8 +701,13 @@ class XMLTreeNode(object):
         if reparent:
             child.reparent(self, addchild=False)
 
-        if child not in self._children:
-            self._children.insert(index, child)
+        children = self.__childList()
+        if child not in children:
+            children.insert(index, child)
+            if self._index is not None:
+                self._index.addTree(child)
+            if self._digest is not None:
+                self.invalidateDigest()
 
     def addChild(self, child, reparent=True):
         """ Add a child node, need to be instance of XMLTreeNode
@@ -137,10 +722,15 @@ class XMLTreeNode(object):
             # and do nothing else here.
             child.reparent(self, addchild=False)
 
-        if child not in self._children:
+        children = self.__childList()
+        if child not in children:
             # If we don't have the reparent flag then do the real add...
             # Prevent adding if already there
-            self._children.append(child)
+            children.append(child)
+            if self._index is not None:
+                self._index.addTree(child)
+            if self._digest is not None:
+                self.invalidateDigest()
 
     def append(self, item):
         """ Append item to XMLTreeNode structure, uses addChild to add item as a new child
@@ -169,26 +759,43 @@ class XMLTreeNode(object):
 
         @returns Length of the XMLTreeNode structure, number of children
         """
-        return len(self._children)
+        return len(sharedChildren(self))
 
     def finditer(self, name):
-        """ Find iterative data which has given name as tag
+        """ Find iterative data which has given name as tag,
+        or which matches the given path, see xmlpath for the syntax
 
-        @param name Name of searched iter item
+        @param name Name or path of searched iter item
         @returns Item which matches the searched name
         """
+        if isPath(name):
+            for item in compilePath(name).iterate(self):
+                yield item
+            return
         for item in self._children:
             if item.tag == name:
                 yield item
 
+    @instrument.timed('search.findall')
     def findall(self, name):
-        """ Find all items matching the given name
+        """ Find all items matching the given name or path
 
-        @param name Name to search
+        @param name Name or path to search
         @returns List of items corresponding the searched name
         """
         return list(self.finditer(name))
 
+    @instrument.timed('search.find')
+    def find(self, name):
+        """ Find first item matching the given name or path
+
+        @param name Name or path to search
+        @returns First matching XMLTreeNode or None if not found
+        """
+        for item in self.finditer(name):
+            return item
+        return None
+
     def iter(self, tag=None):
         """ Return a Iterator object
 
@@ -197,25 +804,30 @@ class XMLTreeNode(object):
         """
         if tag == '*':
             tag = None
-        if tag is None or self.tag == tag:
-            yield self
-        for ch in self._children:
-            for e in ch.iter(tag):
+        if tag is not None and self._index is not None:
+            for e in self._index.findByTag(self, tag):
                 yield e
+            return
+        if tag is None:
+            for e in walk(self):
+                yield e
+            return
+        for e in select(self, lambda node: node.tag == tag):
+            yield e
 
     def items(self):
         """ Get all attribute items
 
         @returns List of all attribute items
         """
-        return self.attrib.items()
+        return self._attrib.items()
 
     def numChildren(self):
         """ Return the number of children under this XMLTreeNode
 
         @returns Number of children
         """
-        return len(self._children)
+        return len(sharedChildren(self))
 
     def getChildren(self):
         """ Get list of children
@@ -224,21 +836,26 @@ class XMLTreeNode(object):
         """
         # Make copy of the list to prevent weird
         # reference manipulating errors...
-        return self._children[:]
+        return list(self._children)
 
     def getChildrenRef(self):
         """ Get list of children, don't make copy just get reference
 
         @returns List of all children under this XMLTreeNode
         """
-        return self._children
+        return self.__childList()
 
     def setData(self, data):
         """ Set node data, can be anything
 
         @param data Any data to set under this XMLTreeNode
         """
+        oldtag = self.tag
         self.tag = data
+        if self._index is not None:
+            self._index.retag(self, oldtag, data)
+        if self._digest is not None:
+            self.invalidateDigest()
 
     def getData(self):
         """ Get the data under this XMLTreeNode
@@ -284,46 +901,66 @@ class XMLTreeNode(object):
 
         child.__parent = None
 
+        children = self._children
+        if not children:
+            return False
+
         # If out children does not have defined child this will fail,
         # that's why catching up ValueError and passing as nothing happened
         try:
-            self._children.remove(child)
+            children.remove(child)
         except ValueError:
             return False
 
+        if self._index is not None:
+            self._index.removeTree(child)
+        if self._digest is not None:
+            self.invalidateDigest()
+
         return True
 
     def addAttrib(self, key, val):
         """ Add or overwrite attribute
         """
-        self.attrib[key] = val
+        attrib = self._attrib
+        if attrib is _EMPTY_ATTRIB:
+            attrib = self._attrib = {}
+        if self._index is not None:
+            self._index.setAttrib(self, key, val)
+        attrib[key] = val
+        if self._digest is not None:
+            self.invalidateDigest()
 
     def isAttrib(self, key):
         """ Checks if this node contains attribute
         @param key Attribute name
         @returns True if found, False otherwise
         """
-        return (key in self.attrib)
+        return (key in self._attrib)
 
     def getAttrib(self, key):
         """ Get attribute value by name
         @param key Attribute name
         @returns Attribute value or raises error
         """
-        return self.attrib[key]
+        return self._attrib[key]
 
     def getAttribSafe(self, key):
         """ Get attribute value by name or None if not found
         @param key Attribute name
         @returns Attribute value or None
         """
-        return self.attrib.get(key, None)
+        return self._attrib.get(key, None)
 
     def delAttrib(self, key):
         """ Remove attribute
         @param key Attribute name
         """
+        if self._index is not None:
+            self._index.delAttrib(self, key)
         del self.attrib[key]
+        if self._digest is not None:
+            self.invalidateDigest()
 
     def getAttributes(self):
         """ Get all attributes as a dictionary
@@ -331,6 +968,84 @@ class XMLTreeNode(object):
         """
         return self.attrib
 
+    def enableIndex(self, attributes=()):
+        """ Index this node and its subtree for fast lookups.
+        Once enabled, getSubTreeNodesByName, getSelfAndSubTreeNodesByName,
+        getTreeNodeByName and iter with tag use the index instead of walking the tree.
+        Values of the given attributes are indexed as well for getNodesByAttrib.
+        Index is kept up to date by addChild, insertChild, insertAfterChild,
+        removeChild, reparent, setData, addAttrib and delAttrib.
+        Changes made by assigning tag directly, or by modifying containers
+        from getChildrenRef or getAttributes are not noticed.
+        Maintaining the index slows down modifications, see disableIndex.
+
+        @param attributes Names of the attributes to index by value, can be extended by calling again
+        @returns TreeIndex instance
+        """
+        if self._index is not None:
+            if self._index.root is self:
+                self._index.addAttributes(attributes)
+                return self._index
+            raise ValueError('Node is already part of indexed tree')
+
+        return TreeIndex(self, attributes)
+
+    def disableIndex(self):
+        """ Drop index from this node and its subtree, for example before heavy modifications
+        """
+        if self._index is not None and self._index.root is self:
+            self._index.clear()
+
+    def isIndexed(self):
+        """ Checks if node is part of indexed tree
+
+        @returns True if indexed, False otherwise
+        """
+        return self._index is not None
+
+    def digest(self, ordered=True):
+        """ Get structural hash of this node and its subtree, covering tags,
+        attributes, text and tail of every node. Equal trees have equal digests.
+        Digests are cached in the nodes and dropped by addChild, insertChild,
+        insertAfterChild, removeChild, reparent, setData, addAttrib, delAttrib,
+        appendValue and by setting text or attrib.
+        Changes made by assigning tag or tail directly, or by modifying containers
+        from getChildrenRef or getAttributes are not noticed, call invalidateDigest after those.
+
+        @param ordered If True, order of children matters, otherwise children are compared as a set
+        @returns SHA-1 digest as bytes
+        """
+        return treehash.update(self, ordered)
+
+    def invalidateDigest(self):
+        """ Drop cached digest of this node and its ancestors
+        """
+        # Nodes with cached digest have cached digests in the whole subtree,
+        # so ancestors of node without digest have none either
+        node = self
+        while node is not None and node._digest is not None:
+            node._digest = None
+            node = node.__parent
+
+    def isEqual(self, other, ordered=True):
+        """ Compare this subtree to another by digests
+
+        @param other XMLTreeNode instance
+        @param ordered If True, order of children matters
+        @returns True if trees are equal, False otherwise
+        """
+        return self.digest(ordered) == other.digest(ordered)
+
+    def diff(self, other, ordered=True):
+        """ Find differences to another tree, see treehash.diff.
+        Only subtrees with different digests are visited.
+
+        @param other XMLTreeNode instance
+        @param ordered If True, order of children matters
+        @returns List of tuples of change, node of this tree and node of the other tree
+        """
+        return treehash.diff(self, other, ordered)
+
     def getRoot(self):
         """ Get the root node
         @returns Root node instance or None if not found
@@ -350,6 +1065,7 @@ class XMLTreeNode(object):
         """
         return self.__parent
 
+    @instrument.timed('search.getSubTreeNodesByName')
     def getSubTreeNodesByName(self, name):
         """ Get ALL nodes and their subtrees which contains certain named value as list of XMLTreeNodes.
         This allows future manipulation or queries to the tree. Also identifying each node's parent is easy with getParent()
@@ -396,14 +1112,30 @@ class XMLTreeNode(object):
         We get only the named node and it's subtree, no parents or what so ever
 
         """
-        trees = []
-        for child in self._children:
-            if child.isData(name):
-                trees.append(child)
-            if child._children:
-                trees += child.getSubTreeNodesByName(name)
-        return trees
+        if self._index is not None:
+            return self._index.findByTag(self, name, includeSelf=False)
+
+        return list(select(self, lambda node: node.tag == name, includeSelf=False))
+
+    @instrument.timed('search.getNodesByAttrib')
+    def getNodesByAttrib(self, name, value):
+        """ Get this node and all nodes in its subtree which have attribute with given value.
+        Uses index if the attribute is indexed, see enableIndex.
 
+        @param name Attribute name
+        @param value Attribute value
+        @returns List of XMLTreeNode instances in document order
+        """
+        if self._index is not None and name in self._index.attributes:
+            return self._index.findByAttrib(self, name, value)
+
+        def match(node):
+            attrib = node._attrib
+            return name in attrib and attrib[name] == value
+
+        return list(select(self, match))
+
+    @instrument.timed('search.getSelfAndSubTreeNodesByName')
     def getSelfAndSubTreeNodesByName(self, name):
         """ Check also if self/root matches for the name,
         after that take the subtree nodes
@@ -411,28 +1143,26 @@ class XMLTreeNode(object):
         @param name Value to be search for
         @returns List of CustomXMLParser of the corresponding child trees
         """
-        trees = []
-        if self.isData(name):
-            trees.append(self)
+        if self._index is not None:
+            return self._index.findByTag(self, name)
 
-        trees += self.getSubTreeNodesByName(name)
-        return trees
+        return list(select(self, lambda node: node.tag == name))
 
+    @instrument.timed('search.getTreeNodeByName')
     def getTreeNodeByName(self, name):
         """ This is like getSubTreeNodesByName but return just FIRST matching subtree
 
         @param name Value to be search for
         @returns Corresponding child tree item
         """
-        if self.isData(name):
-            return self
+        if self._index is not None:
+            found = self._index.findByTag(self, name)
+            if found:
+                return found[0]
+            return None
 
-        for child in self._children:
-            if child.isData(name):
-                return child
-            tmp = child.getTreeNodeByName(name)
-            if tmp is not None:
-                return tmp
+        for node in select(self, lambda node: node.tag == name):
+            return node
         return None
 
     def __contains__(self, index):
@@ -449,7 +1179,7 @@ class XMLTreeNode(object):
             if child.isData(index):
                 return True
 
-        if index in self.attrib:
+        if index in self._attrib:
             return True
 
         return False
@@ -578,8 +1308,8 @@ class XMLTreeNode(object):
             else:
                 return res
 
-        if index in self.attrib:
-            return self.attrib[index]
+        if index in self._attrib:
+            return self._attrib[index]
         return None
 
     def indent(self, elem, level=0):
@@ -588,43 +1318,69 @@ class XMLTreeNode(object):
         @param elem Element
         @param level Level of indent
         """
-        i = '\n' + level * '  '
-        if elem:
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "  "
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                self.indent(elem, level + 1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-        else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
+        # Last child gets indent of its parent as tail, others their own
+        stack = [(elem, level, None)]
+        while stack:
+            elem, level, tail = stack.pop()
+            i = '\n' + level * '  '
+            if tail is None:
+                tail = i
+            children = elem._children
+            if children:
+                if not elem.text or not elem.text.strip():
+                    elem.text = i + "  "
+                if not elem.tail or not elem.tail.strip():
+                    elem.tail = tail
+                last = len(children) - 1
+                for pos, child in enumerate(children):
+                    stack.append((child, level + 1, i if pos == last else None))
+            else:
+                if level and (not elem.tail or not elem.tail.strip()):
+                    elem.tail = tail
+
+    def write(self, out, encoding='us-ascii', bufferSize=serializer.DEFAULT_BUFFER_SIZE, doctype='', indent=None):
+        """ Write XML presentation of the tree incrementally to a file, socket
+        or any other object having write or sendall method.
+        Pretty printing with indent does not modify the tree.
+
+        @param out Object to write to
+        @param encoding Output encoding, or 'unicode' to write strings without encoding
+        @param bufferSize Amount of characters buffered before writing out
+        @param doctype Documentation type written in the beginning of the output
+        @param indent Number of spaces per level for pretty printing, None to write as is
+        """
+        serializer.write(self, out, encoding, bufferSize, doctype, indent)
 
-    def toSimpleString(self):
-        """ Convert to XML string, does not do any formatting
+    def __serialize(self, doctype='', indent=None):
+        """ Serialize the tree to a string
 
+        @param doctype Documentation type added in the beginning of the return string
+        @param indent Number of spaces per level for pretty printing, None to write as is
         @returns XML presentation of the tree
         """
-        res = element_tree.tostring(self)
+        out = io.BytesIO()
+        serializer.write(self, out, doctype=doctype, indent=indent)
+        res = out.getvalue()
         if sys.version >= '3':
             res = res.decode('utf-8', 'replace')
         return res
 
-    def toString(self, doctype=''):
-        """ Convert to XML string. Does formatting to a pretty presentation.
-        Performance hit because copying the tree...
+    def toSimpleString(self):
+        """ Convert to XML string, does not do any formatting
 
-        @param doctype Documentation type added in the beginning of the return string
         @returns XML presentation of the tree
         """
-        self.indent(self)
-        res = element_tree.tostring(self)
-        if sys.version >= '3':
-            res = res.decode('utf-8', 'replace')
+        return self.__serialize()
 
-        return '%s%s' % (doctype, res)
+    def toString(self, doctype='', indent=2):
+        """ Convert to XML string. Does formatting to a pretty presentation,
+        the tree itself is not modified.
+
+        @param doctype Documentation type added in the beginning of the return string
+        @param indent Number of spaces per level of indent
+        @returns XML presentation of the tree
+        """
+        return self.__serialize(doctype, indent)
 
     def toSortString(self):
         """ Get sortable string presentation
@@ -635,13 +1391,13 @@ class XMLTreeNode(object):
         if type(s) != str:
             return s
 
-        sortedkeys = self.attrib.keys()
+        sortedkeys = self._attrib.keys()
         sortedkeys = sorted(sortedkeys)
         arr = ""
         for key in sortedkeys:
             if arr:
                 arr += ","
-            arr += "'%s':'%s'" % (key, self.attrib[key])
+            arr += "'%s':'%s'" % (key, self._attrib[key])
 
         s += "{%s}" % (arr)
         s = s.replace(" ", "")
@@ -652,13 +1408,14 @@ class XMLTreeNode(object):
 
         @returns Sortable string presentation of this object and it's children
         """
-        s = "%s%s" % (self.getData(), self.attrib)
-        data = self.getChildren()
-        data = sorted(data, key=lambda k: k.toSortString())
-        for i in data:
-            s += i.toRecursiveSortString()
-        s = s.replace(" ", "")
-        return s
+        s = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            s.append("%s%s" % (node.getData(), node._attrib))
+            data = sorted(node._children, key=lambda k: k.toSortString())
+            stack.extend(reversed(data))
+        return "".join(s).replace(" ", "")
 
     def __str__(self):
         """ String presentation of this object
@@ -672,6 +1429,6 @@ class XMLTreeNode(object):
 
         @returns String presentation of this object
         """
-        return "%x %s" % (id(self), "%s %s" % (("%s" % self.getData()).replace(" ", "").replace("'", ""), self.attrib))
+        return "%x %s" % (id(self), "%s %s" % (("%s" % self.getData()).replace(" ", "").replace("'", ""), self._attrib))
 
 # vi: tabstop=8 expandtab shiftwidth=4 softtabstop=4